@@ -0,0 +1,188 @@
+# api_client.py - Pooled HTTP client with timeouts, rate-limit aware retries and a response cache
+import re
+import json
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from database import get_db_connection
+
+CONNECT_TIMEOUT = 3.05     # Seconds to establish a connection
+READ_TIMEOUT = 10          # Seconds to wait for response bytes
+MAX_RETRIES = 3            # Extra attempts after a 429, 5xx or connection error
+BACKOFF_BASE = 0.5         # First backoff in seconds, doubled per attempt (with jitter)
+MAX_RETRY_WAIT = 30        # Never sleep longer than this on a Retry-After
+POOL_SIZE = 20             # Keep-alive connections per host
+MEMORY_CACHE_SIZE = 1000   # Responses also kept in process, in front of SQLite
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def shared_session(name):
+    """Process-wide pooled session per API, so TCP/TLS connections are reused across instances"""
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[name] = session
+        return session
+
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class ApiClient:
+    """Thin wrapper over a shared session: timeouts on every call, backoff on 429 and 5xx"""
+
+    def __init__(self, name, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_retries=MAX_RETRIES):
+        self.session = shared_session(name)
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def request(self, method, url, **kwargs):
+        """Send a request, retrying transient failures; raises on the final failure"""
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                response.raise_for_status()
+                return response
+
+            wait = retry_after_seconds(response)
+            if wait is None:
+                wait = self._backoff(attempt)
+            elif wait > MAX_RETRY_WAIT:
+                # The API asked for a long pause: fail fast instead of stalling a worker
+                response.raise_for_status()
+            response.close()
+            time.sleep(wait)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _backoff(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, BACKOFF_BASE * 2 ** attempt)
+
+
+def normalize_query(query):
+    """Cache key form of a search query: case and spacing differences hit the same entry"""
+    return re.sub(r'\s+', ' ', str(query)).strip().lower()
+
+
+class ResponseCache:
+    """TTL cache of decoded API responses in SQLite, fronted by a small in-process dict"""
+
+    def __init__(self, namespace, ttl_seconds):
+        self.namespace = namespace
+        self.ttl = ttl_seconds
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get_many(self, keys):
+        """{key: value} for every key with an unexpired entry"""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(self._key(key))
+                if entry and entry[1] > now:
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+        if not missing:
+            return found
+
+        conn = get_db_connection()
+        try:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(missing), 500):
+                chunk = [self._key(key) for key in missing[start:start + 500]]
+                rows = conn.execute(f'''
+                    SELECT cache_key, response, expires_at FROM api_response_cache
+                    WHERE cache_key IN ({','.join('?' * len(chunk))}) AND expires_at > ?
+                ''', chunk + [now]).fetchall()
+                for row in rows:
+                    value = json.loads(row['response'])
+                    found[row['cache_key'][len(self.namespace) + 1:]] = value
+                    self._remember(row['cache_key'], value, row['expires_at'])
+        finally:
+            conn.close()
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items):
+        """Store {key: value} with this cache's TTL"""
+        if not items:
+            return
+        expires_at = time.time() + self.ttl
+        rows = [(self._key(key), json.dumps(value), expires_at) for key, value in items.items()]
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO api_response_cache (cache_key, response, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        response = excluded.response, expires_at = excluded.expires_at
+                ''', rows)
+        finally:
+            conn.close()
+        for (cache_key, _, _), value in zip(rows, items.values()):
+            self._remember(cache_key, value, expires_at)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def _remember(self, cache_key, value, expires_at):
+        with self._lock:
+            if len(self._memory) >= MEMORY_CACHE_SIZE:
+                self._memory.pop(next(iter(self._memory)))
+            self._memory[cache_key] = (value, expires_at)
+
+
+def purge_expired_responses():
+    """Delete expired cache rows (nightly job)"""
+    conn = get_db_connection()
+    try:
+        with conn:
+            deleted = conn.execute('DELETE FROM api_response_cache WHERE expires_at <= ?', (time.time(),)).rowcount
+    finally:
+        conn.close()
+    print(f"🧹 Purged {deleted} expired API responses")
+    return deleted
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory, redirect, session
+from flask import Flask, request, jsonify, redirect, session, abort
 from flask_cors import CORS
 import os, librosa, numpy as np, joblib, tempfile, torch
 from pydub import AudioSegment
@@ -12,12 +12,28 @@ from analytics_engine import AnalyticsEngine
 from predictive_engine import PredictiveEngine
 from digital_twin import DigitalTwin
 from content_library import ContentLibrary
+from content_index import content_index
+from content_ranker import content_ranker, session_reward
+from therapy_session_log import therapy_session_log, purge_stale_sessions
 from therapeutic_engine import TherapeuticEngine
-from audio_player import AudioPlayer
 from soundscape_generator import SoundscapeGenerator
+from stem_cache import stem_cache, STEM_VERSION
+from soundscape_renderer import SoundscapeRenderer, save_plan, load_plan, RENDER_VERSION, MAX_DURATION_MINUTES, prune_plans
+from audio_delivery import send_audio_file, range_response
+from static_assets import static_assets
+from entry_export import export_response
+from mood_timeseries import mood_timeseries
+from playback_progress import progress_buffer
 from quest_system import QuestSystem
 from youtube_integration import YouTubeIntegration
 from spotify_integration import SpotifyIntegration
+from content_providers import content_aggregator
+from api_client import purge_expired_responses
+from catalog import refresh_catalog_job
+from life_ingestion import LifeDataIngestor, INTEGRATION_TYPES
+from scheduler import nightly_jobs
+from leaderboard import leaderboards, get_display_names, week_key
+from ledger import PointsLedger
 
 from database import (
     get_db_connection,
@@ -27,13 +43,18 @@ from database import (
     get_user_by_email,
     create_mindmirror_entry,
     get_user_mindmirror_entries,
+    get_entries_page,
+    get_entry_count,
     create_user_baseline,
     get_user_baseline,
     create_user_pattern,
     get_user_patterns,
     create_burnout_risk,
     create_digital_twin_rule,
-    create_user_prediction
+    create_user_prediction,
+    create_playback_session,
+    get_open_playback_session,
+    complete_therapy_session
 )
 
 app = Flask(__name__)
@@ -47,6 +68,56 @@ UPLOAD_DIR = "uploads"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
+# ✅ NIGHTLY BATCH JOBS
+def pregenerate_quests_job():
+    """Generate tomorrow's quests for all active users"""
+    quest_system = QuestSystem()
+    try:
+        quest_system.pregenerate_daily_quests()
+    finally:
+        quest_system.close()
+
+def streak_rollover_job():
+    """Fold yesterday's activity into every user's streak"""
+    quest_system = QuestSystem()
+    try:
+        quest_system.rollover_streaks()
+    finally:
+        quest_system.close()
+
+def ledger_maintenance_job():
+    """Snapshot balances, compact old ledger rows and verify for drift"""
+    ledger = PointsLedger()
+    try:
+        ledger.run_maintenance()
+    finally:
+        ledger.close()
+
+nightly_jobs.register('pregenerate_quests', pregenerate_quests_job, hour=23, minute=30)
+nightly_jobs.register('streak_rollover', streak_rollover_job, hour=0, minute=5)
+nightly_jobs.register('ledger_maintenance', ledger_maintenance_job, hour=3, minute=0)
+nightly_jobs.register('api_cache_cleanup', purge_expired_responses, hour=4, minute=0)
+nightly_jobs.register('catalog_refresh', refresh_catalog_job, hour=4, minute=30)
+nightly_jobs.register('soundscape_plan_prune', prune_plans, hour=4, minute=45)
+nightly_jobs.register('therapy_session_purge', purge_stale_sessions, hour=5, minute=0)
+
+_background_started = False
+
+@app.before_request
+def start_background_jobs():
+    """Start the scheduler and stem warm-up in whichever process serves requests.
+
+    Covers debug-off runs and WSGI servers; the debug reloader's parent never serves, so it never starts them.
+    Set DISABLE_NIGHTLY_JOBS=1 when the jobs run from cron instead (python app.py --run-job <name>).
+    """
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+    if os.environ.get('DISABLE_NIGHTLY_JOBS') != '1':
+        nightly_jobs.start()
+    stem_cache.warm_up_async()
+
 # Debug route to check file existence
 @app.route('/debug/files')
 def debug_files():
@@ -61,6 +132,7 @@ TEXT_MODEL_NAME = "cardiffnlp/twitter-roberta-base-emotion"
 TEXT_EMOTION_LABELS = ['anger','joy','optimism','sadness','disgust','fear','love']
 SAMPLE_RATE = 22050
 CONF_THRESHOLD = 0.4
+MAX_ENTRIES_PAGE = 200   # Largest history page /api/get_entries will return
 
 # Load models
 audio_model = joblib.load(AUDIO_MODEL_PATH)
@@ -152,22 +224,23 @@ def calculate_mood_score(emotion, confidence):
 
 @app.route("/uploads/<filename>")
 def serve_audio(filename):
-    return send_from_directory(UPLOAD_DIR, filename)
+    # Byte ranges and validators so players can seek without downloading the whole file
+    return send_audio_file(UPLOAD_DIR, filename)
 
 # ✅ ADD THESE MISSING STATIC FILE ROUTES
 @app.route('/mic_test.html')
 def serve_mic_test():
-    return send_from_directory('.', 'mic_test.html')
+    return static_assets.response('mic_test.html')
 
 # Serve all CSS files
 @app.route('/<filename>.css')
 def serve_css(filename):
-    return send_from_directory('.', f'{filename}.css')
+    return static_assets.response(f'{filename}.css')
 
 # Serve all JS files  
 @app.route('/<filename>.js')
 def serve_js(filename):
-    return send_from_directory('.', f'{filename}.js')
+    return static_assets.response(f'{filename}.js')
 
 # Serve favicon to prevent 404 errors
 @app.route('/favicon.ico')
@@ -284,39 +357,21 @@ def landing():
     """Serve the landing page - redirect to dashboard if already logged in"""
     if 'user_id' in session:
         return redirect('/dashboard')
-    
-    try:
-        with open('landing.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Landing page not found. Error: {str(e)}", 404
+    return static_assets.response('landing.html', "Landing page not found")
 
 @app.route('/dashboard')
 def dashboard():
     """Serve the main dashboard - redirect to landing if not logged in"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('dashboard.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Dashboard not found. Error: {str(e)}", 404
+    return static_assets.response('dashboard.html', "Dashboard not found")
 
 @app.route('/history')
 def history():
     """Serve the history page - redirect to landing if not logged in"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('history.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"History page not found. Error: {str(e)}", 404
+    return static_assets.response('history.html', "History page not found")
 
 @app.route('/logout')
 def logout():
@@ -329,13 +384,7 @@ def profile():
     """Serve the profile hub page - redirect to landing if not logged in"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('profile.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Profile page not found. Error: {str(e)}", 404
+    return static_assets.response('profile.html', "Profile page not found")
 
 # ✅ NEW: DEDICATED PAGES FOR FEATURES
 @app.route('/insights')
@@ -343,115 +392,79 @@ def insights():
     """Serve the insights page"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('insights.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Insights page not found. Error: {str(e)}", 404
+    return static_assets.response('insights.html', "Insights page not found")
 
 @app.route('/burnout')
 def burnout():
     """Serve the burnout assessment page"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('burnout.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Burnout page not found. Error: {str(e)}", 404
+    return static_assets.response('burnout.html', "Burnout page not found")
 
 @app.route('/simulator')
 def simulator():
     """Serve the digital twin simulator page"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('simulator.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Simulator page not found. Error: {str(e)}", 404
+    return static_assets.response('simulator.html', "Simulator page not found")
 
 @app.route('/forecast')
 def forecast():
     """Serve the mood forecast page"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('forecast.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Forecast page not found. Error: {str(e)}", 404
+    return static_assets.response('forecast.html', "Forecast page not found")
 
 @app.route('/therapy')
 def therapy():
     """Serve the therapy hub page"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('therapy.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Therapy page not found. Error: {str(e)}", 404
+    return static_assets.response('therapy.html', "Therapy page not found")
 
 @app.route('/quests')
 def quests():
     """Serve the quests page"""
     if 'user_id' not in session:
         return redirect('/')
-    
-    try:
-        with open('quests.html', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-    except Exception as e:
-        return f"Quests page not found. Error: {str(e)}", 404
+    return static_assets.response('quests.html', "Quests page not found")
 
 # ✅ STATIC FILE ROUTES
 @app.route('/auth.css')
 def serve_auth_css():
-    return send_from_directory('.', 'auth.css')
+    return static_assets.response('auth.css')
 
 @app.route('/auth.js')
 def serve_auth_js():
-    return send_from_directory('.', 'auth.js')
+    return static_assets.response('auth.js')
 
 @app.route('/style.css')
 def serve_style_css():
-    return send_from_directory('.', 'style.css')
+    return static_assets.response('style.css')
 
 @app.route('/script.js')
 def serve_script_js():
-    return send_from_directory('.', 'script.js')
+    return static_assets.response('script.js')
 
 @app.route('/history.css')
 def serve_history_css():
-    return send_from_directory('.', 'history.css')
+    return static_assets.response('history.css')
 
 @app.route('/history.js')
 def serve_history_js():
-    return send_from_directory('.', 'history.js')
+    return static_assets.response('history.js')
 
 @app.route('/profile.js')
 def serve_profile_js():
-    return send_from_directory('.', 'profile.js')
+    return static_assets.response('profile.js')
 
 @app.route('/therapy.js')
 def serve_therapy_js():
-    return send_from_directory('.', 'therapy.js')
+    return static_assets.response('therapy.js')
 
 @app.route('/quests.js')
 def serve_quests_js():
-    return send_from_directory('.', 'quests.js')
+    return static_assets.response('quests.js')
 
 # ✅ API ROUTES
 @app.route('/api/generate_user_id', methods=['GET'])
@@ -550,43 +563,83 @@ def api_recover_id():
 # ✅ UPDATED API ENDPOINT: Get user's analysis history
 @app.route('/api/get_entries', methods=['GET'])
 def api_get_entries():
-    """Get mindmirror entries for the logged-in user"""
+    """Get one page of mindmirror entries for the logged-in user (latest first)"""
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'User not logged in'}), 401
 
     user_id = session['user_id']
-    get_all = request.args.get('all', 'false').lower() == 'true'  # ✅ CHECK IF ALL RECORDS REQUESTED
     conn = get_db_connection()
-    
+
     try:
-        if get_all:
-            # ✅ GET ALL RECORDS FOR CSV DOWNLOAD
-            entries = get_user_mindmirror_entries(conn, user_id, limit=0)  # 0 = no limit
+        if request.args.get('all', 'false').lower() == 'true':
+            # Legacy full dump; the history page now streams /api/export_entries instead
+            entries, next_cursor = get_user_mindmirror_entries(conn, user_id, limit=0), None
         else:
-            # ✅ GET ONLY LATEST 5 FOR TABLE DISPLAY
-            entries = get_user_mindmirror_entries(conn, user_id, limit=5)
-        
-        # Get total count for UI
-        total_count = conn.execute(
-            'SELECT COUNT(*) FROM mindmirror_entries WHERE user_id = ?', 
-            (user_id,)
-        ).fetchone()[0]
-        
-        # Convert to dictionaries
-        entries_list = [dict(entry) for entry in entries]
-        
+            # ✅ KEYSET PAGINATION: ?limit=&cursor=&start_date=&end_date=
+            limit = max(1, min(request.args.get('limit', 5, type=int), MAX_ENTRIES_PAGE))
+            entries, next_cursor = get_entries_page(
+                conn, user_id, limit=limit,
+                cursor=request.args.get('cursor'),
+                start_date=request.args.get('start_date'),
+                end_date=request.args.get('end_date')
+            )
+
         return jsonify({
             'success': True,
-            'entries': entries_list,
-            'total_count': total_count
+            'entries': [dict(entry) for entry in entries],
+            'total_count': get_entry_count(conn, user_id),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
-        
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid cursor or date (use YYYY-MM-DD): {e}'}), 400
     except Exception as e:
         print(f"Error fetching entries: {e}")
         return jsonify({'success': False, 'message': 'Could not fetch entries'}), 500
     finally:
         conn.close()
 
+# ✅ MOOD TIMELINE: BUCKETED + DOWNSAMPLED SERIES FOR THE HISTORY CHART
+@app.route('/api/mood_timeseries', methods=['GET'])
+def api_mood_timeseries():
+    """Mood and emotion mix per day/week/month, reduced to at most `points` chart points"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+
+    user_id = session['user_id']
+    conn = get_db_connection()
+
+    try:
+        series = mood_timeseries.get_series(
+            conn, user_id,
+            bucket=request.args.get('bucket', 'auto'),
+            points=request.args.get('points', 120, type=int),
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date')
+        )
+        return jsonify({'success': True, 'total_count': get_entry_count(conn, user_id), **series})
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error building mood timeseries: {e}")
+        return jsonify({'success': False, 'message': 'Could not build mood timeline'}), 500
+    finally:
+        conn.close()
+
+# ✅ STREAMING HISTORY EXPORT (CSV / NDJSON)
+@app.route('/api/export_entries', methods=['GET'])
+def api_export_entries():
+    """Stream the logged-in user's full history as a download, gzipped when the client accepts it"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+
+    response = export_response(session['user_id'], request.args.get('format', 'csv').lower())
+    if response is None:
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    return response
+
 # ✅ NEW API ENDPOINT: Update user profile
 @app.route('/api/update_profile', methods=['POST'])
 def api_update_profile():
@@ -765,6 +818,44 @@ def api_learn_rules():
     finally:
         digital_twin.close()
 
+# ✅ NEW: Import local life data exports (sleep, calendar, activity, weather)
+@app.route('/api/import_life_data', methods=['POST'])
+def api_import_life_data():
+    """Bulk import an uploaded CSV/JSON/ICS export into life integrations"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    user_id = session['user_id']
+    upload = request.files.get('file')
+    integration_type = request.form.get('integration_type', '')
+    
+    if not upload or integration_type not in INTEGRATION_TYPES:
+        return jsonify({'success': False, 'message': 'File and valid integration_type required'}), 400
+    
+    ingestor = LifeDataIngestor()
+    try:
+        # Parse straight from the upload stream, never holding the whole file
+        summary = ingestor.ingest_stream(
+            user_id, upload.stream, integration_type,
+            os.path.splitext(upload.filename)[1],
+            date_field=request.form.get('date_field'),
+            value_field=request.form.get('value_field'),
+            value_scale=float(request.form.get('value_scale', 1.0)),
+            source=upload.filename
+        )
+        return jsonify({
+            'success': True,
+            'import': summary
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error importing life data: {e}")
+        return jsonify({'success': False, 'message': 'Could not import life data'}), 500
+    finally:
+        ingestor.close()
+
 # ✅ NEW: Get mood forecast
 @app.route('/api/mood_forecast', methods=['GET'])
 def api_mood_forecast():
@@ -792,9 +883,9 @@ def api_init_content_library():
     """Initialize therapeutic content library (run once)"""
     try:
         content_lib = ContentLibrary()
-        content_lib.initialize_default_content()
+        added = content_lib.initialize_default_content()
         content_lib.close()
-        return jsonify({'success': True, 'message': 'Content library initialized successfully!'})
+        return jsonify(dict(added, success=True, message='Content library initialized successfully!'))
     except Exception as e:
         print(f"Error initializing content library: {e}")
         return jsonify({'success': False, 'message': 'Could not initialize content library'}), 500
@@ -812,9 +903,10 @@ def api_get_therapy_recommendations():
     if not current_emotion:
         return jsonify({'success': False, 'message': 'No emotion provided'}), 400
     
+    mood_intensity = data.get('intensity', 'medium')
     therapeutic_engine = TherapeuticEngine()
     try:
-        therapy_plan = therapeutic_engine.generate_therapy_plan(user_id, current_emotion)
+        therapy_plan = therapeutic_engine.generate_therapy_plan(user_id, current_emotion, mood_intensity)
         return jsonify({
             'success': True,
             'therapy_plan': therapy_plan
@@ -825,6 +917,38 @@ def api_get_therapy_recommendations():
     finally:
         therapeutic_engine.close()
 
+@app.route('/api/complete_therapy_session', methods=['POST'])
+def api_complete_therapy_session():
+    """Record how a recommended item worked (mood before/after on 0-100, rating 1-5) and update the ranker"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+
+    user_id = session['user_id']
+    data = request.get_json() or {}
+    try:
+        content_id = int(data['content_id'])
+        outcome = {key: (None if data.get(key) is None else int(data[key]))
+                   for key in ('mood_before', 'mood_after', 'feedback_rating')}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'content_id and numeric mood/rating values required'}), 400
+
+    # Load history first: loading after the commit would read this row and count it twice
+    content_ranker.ensure_loaded()
+    conn = get_db_connection()
+    try:
+        if not complete_therapy_session(conn, user_id, content_id, **outcome):
+            # The session row may still be waiting in the background writer
+            therapy_session_log.flush()
+            if not complete_therapy_session(conn, user_id, content_id, **outcome):
+                return jsonify({'success': False, 'message': 'No open session for this content'}), 404
+        content_ranker.update(user_id, content_id, session_reward(**outcome))
+        return jsonify({'success': True})
+    except Exception as e:
+        print(f"Error completing therapy session: {e}")
+        return jsonify({'success': False, 'message': 'Could not record session outcome'}), 500
+    finally:
+        conn.close()
+
 @app.route('/api/get_immediate_relief', methods=['POST'])
 def api_get_immediate_relief():
     """Get immediate relief recommendations only"""
@@ -834,17 +958,11 @@ def api_get_immediate_relief():
     data = request.get_json()
     current_emotion = data.get('emotion', '').lower()
     
-    content_lib = ContentLibrary()
     try:
-        recommendations = content_lib.get_therapeutic_recommendations(current_emotion, ['exercise', 'video'], 1)
-        
+        # Short interventions come straight from the shared content index's duration buckets
         immediate_relief = []
-        for content_type, items in recommendations.items():
-            if items:
-                # Filter for short interventions
-                short_items = [item for item in items if item.get('duration_minutes', 30) <= 10]
-                if short_items:
-                    immediate_relief.extend(short_items[:2])  # Max 2 items
+        for content_type in ['exercise', 'video']:
+            immediate_relief.extend(content_index.get_content(current_emotion, content_type, 2, max_duration=10))
         
         return jsonify({
             'success': True,
@@ -853,8 +971,33 @@ def api_get_immediate_relief():
     except Exception as e:
         print(f"Error getting immediate relief: {e}")
         return jsonify({'success': False, 'message': 'Could not get immediate relief'}), 500
-    finally:
-        content_lib.close()
+
+@app.route('/api/get_streaming_content', methods=['POST'])
+def api_get_streaming_content():
+    """Spotify tracks and YouTube videos for an emotion, fetched concurrently under one deadline"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+
+    data = request.get_json() or {}
+    emotion = data.get('emotion', '').lower()
+    if not emotion:
+        return jsonify({'success': False, 'message': 'No emotion provided'}), 400
+
+    try:
+        limit = max(1, min(int(data.get('limit', 5)), 20))
+        content = content_aggregator.fetch(emotion, limit)
+        # Partial results still succeed; 'providers' says which source was slow, failing or skipped
+        return jsonify(dict(content, success=True))
+    except Exception as e:
+        print(f"Error fetching streaming content: {e}")
+        return jsonify({'success': False, 'message': 'Could not fetch streaming content'}), 500
+
+@app.route('/api/provider_stats', methods=['GET'])
+def api_provider_stats():
+    """Latency, error rate and circuit state for each external content provider"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    return jsonify({'success': True, 'providers': content_aggregator.get_stats()})
 
 # ✅ PHASE 3B: SONIC THERAPY ENDPOINTS
 @app.route('/api/generate_soundscape', methods=['POST'])
@@ -867,18 +1010,47 @@ def api_generate_soundscape():
     emotion = data.get('emotion', '').lower()
     intensity = data.get('intensity', 'medium')
     duration = data.get('duration', 15)
+    # Bounded before planning: the duration sizes the WAV stream, whose header only holds 32-bit sizes
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or not duration > 0:
+        return jsonify({'success': False, 'message': 'duration must be a positive number of minutes'}), 400
+    duration = min(duration, MAX_DURATION_MINUTES)
     
     soundscape_gen = SoundscapeGenerator()
     try:
         soundscape = soundscape_gen.generate_soundscape(emotion, intensity, duration)
+        soundscape_id = save_plan(soundscape)
         return jsonify({
             'success': True,
-            'soundscape': soundscape
+            'soundscape': soundscape,
+            'soundscape_id': soundscape_id,
+            'audio_url': f'/api/soundscape_audio/{soundscape_id}'
         })
     except Exception as e:
         print(f"Soundscape generation error: {e}")
         return jsonify({'success': False, 'message': 'Could not generate soundscape'}), 500
 
+@app.route('/api/soundscape_audio/<soundscape_id>', methods=['GET', 'HEAD'])
+def api_soundscape_audio(soundscape_id):
+    """Stream a generated soundscape as WAV, rendered on the fly from the seek point"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    plan, path = load_plan(soundscape_id)
+    if plan is None:
+        abort(404)
+    
+    renderer = SoundscapeRenderer(stem_cache=stem_cache)
+    try:
+        renderer.wav_header(plan)      # Fail before the 200 is sent, not inside the stream
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    # The same plan always renders the same bytes for a given renderer and stem synthesis version
+    etag = f"{soundscape_id}-r{RENDER_VERSION}-s{STEM_VERSION}"
+    last_modified = datetime.utcfromtimestamp(int(os.path.getmtime(path)))
+    return range_response(renderer.wav_length(plan),
+                          lambda start, end: renderer.iter_wav_range(plan, start, end),
+                          'audio/wav', etag, last_modified)
+
 @app.route('/api/start_playback', methods=['POST'])
 def api_start_playback():
     """Start audio playback session"""
@@ -890,21 +1062,28 @@ def api_start_playback():
     
     # Get content from database
     conn = get_db_connection()
-    content = conn.execute(
-        'SELECT * FROM therapeutic_content WHERE id = ?', 
-        (content_id,)
-    ).fetchone()
-    conn.close()
-    
-    if not content:
-        return jsonify({'success': False, 'message': 'Content not found'}), 404
-    
-    content_dict = dict(content)
+    try:
+        content = conn.execute(
+            'SELECT * FROM therapeutic_content WHERE id = ?', 
+            (content_id,)
+        ).fetchone()
+        
+        if not content:
+            return jsonify({'success': False, 'message': 'Content not found'}), 404
+        
+        content_dict = dict(content)
+        
+        # Progress pings send this id back so they update only this play
+        session_id = create_playback_session(conn, session['user_id'], content_id,
+                                             content_dict.get('content_type'), content_dict.get('duration_minutes'))
+    finally:
+        conn.close()
     
     # Start playback (in a real app, this would interface with actual audio player)
     return jsonify({
         'success': True,
         'message': 'Playback started',
+        'session_id': session_id,
         'content': content_dict
     })
 
@@ -918,24 +1097,20 @@ def api_playback_progress():
     content_id = data.get('content_id')
     progress_seconds = data.get('progress_seconds', 0)
     completed = data.get('completed', False)
+    session_id = data.get('session_id')
     
-    # Log progress to database
-    conn = get_db_connection()
-    if completed:
-        conn.execute('''
-        UPDATE user_playback_sessions 
-        SET completed = 1, progress_seconds = ?, ended_at = datetime('now')
-        WHERE user_id = ? AND content_id = ? AND completed = 0
-        ''', (progress_seconds, session['user_id'], content_id))
-    else:
-        conn.execute('''
-        UPDATE user_playback_sessions 
-        SET progress_seconds = ?
-        WHERE user_id = ? AND content_id = ? AND completed = 0
-        ''', (progress_seconds, session['user_id'], content_id))
+    # Older clients send only content_id: target the latest open play of it
+    if not isinstance(session_id, int) or isinstance(session_id, bool):
+        conn = get_db_connection()
+        try:
+            session_id = get_open_playback_session(conn, session['user_id'], content_id)
+        finally:
+            conn.close()
+        if session_id is None:
+            return jsonify({'success': False, 'message': 'No open playback session'}), 404
     
-    conn.commit()
-    conn.close()
+    # Latest position per session is buffered and written in batches; completions are written now
+    progress_buffer.record(session_id, session['user_id'], progress_seconds, bool(completed))
     
     return jsonify({'success': True})
 
@@ -950,7 +1125,6 @@ def api_get_lifestyle_recommendations():
     emotion = data.get('emotion', '').lower()
     time_of_day = data.get('time_of_day', '')
     
-    content_lib = ContentLibrary()
     try:
         # If no specific time provided, determine based on current time
         if not time_of_day:
@@ -962,17 +1136,15 @@ def api_get_lifestyle_recommendations():
             else:
                 time_of_day = 'evening'
         
-        recommendations = content_lib.get_lifestyle_recommendations(emotion, time_of_day)
+        recommendations = content_index.get_lifestyle(emotion, time_of_day)
         return jsonify({
             'success': True,
-            'recommendations': [dict(rec) for rec in recommendations],
+            'recommendations': recommendations,
             'time_of_day': time_of_day
         })
     except Exception as e:
         print(f"Lifestyle recommendations error: {e}")
         return jsonify({'success': False, 'message': 'Could not get lifestyle recommendations'}), 500
-    finally:
-        content_lib.close()
 
 # ✅ PHASE 3D: QUEST SYSTEM ENDPOINTS
 @app.route('/api/get_daily_quests', methods=['GET'])
@@ -985,7 +1157,7 @@ def api_get_daily_quests():
     quest_system = QuestSystem()
     
     try:
-        quests = quest_system.generate_daily_quests(user_id)
+        quests = quest_system.get_daily_quests(user_id)
         return jsonify({
             'success': True,
             'quests': quests
@@ -1043,6 +1215,78 @@ def api_get_user_progress():
     finally:
         quest_system.close()
 
+# ✅ LEADERBOARD ENDPOINTS
+def _leaderboard_rows(entries, user_id):
+    """Shape leaderboard entries with display names instead of user ids"""
+    conn = get_db_connection()
+    try:
+        names = get_display_names(conn, [entry[0] for entry in entries])
+    finally:
+        conn.close()
+    return [
+        {
+            'rank': rank,
+            'name': names.get(entry_user, 'Anonymous'),
+            'points': points,
+            'is_you': entry_user == user_id
+        }
+        for entry_user, points, rank in entries
+    ]
+
+@app.route('/api/leaderboard', methods=['GET'])
+def api_leaderboard():
+    """Get the global points leaderboard (top K)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    try:
+        return jsonify({
+            'success': True,
+            'leaderboard': _leaderboard_rows(leaderboards.top(limit), session['user_id'])
+        })
+    except Exception as e:
+        print(f"Leaderboard error: {e}")
+        return jsonify({'success': False, 'message': 'Could not load leaderboard'}), 500
+
+@app.route('/api/leaderboard/me', methods=['GET'])
+def api_leaderboard_me():
+    """Get the user's rank and the players ranked around them"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    user_id = session['user_id']
+    radius = min(max(request.args.get('radius', 2, type=int), 0), 25)
+    try:
+        return jsonify({
+            'success': True,
+            'standing': leaderboards.user_rank(user_id),
+            'neighbors': _leaderboard_rows(leaderboards.around(user_id, radius), user_id)
+        })
+    except Exception as e:
+        print(f"Leaderboard rank error: {e}")
+        return jsonify({'success': False, 'message': 'Could not load rank'}), 500
+
+@app.route('/api/leaderboard/weekly', methods=['GET'])
+def api_leaderboard_weekly():
+    """Get the weekly leaderboard from the points ledger (week=YYYY-Www, default current)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    week = request.args.get('week') or week_key()
+    try:
+        return jsonify({
+            'success': True,
+            'week': week,
+            'leaderboard': _leaderboard_rows(leaderboards.weekly_top(limit, week), session['user_id'])
+        })
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid week, expected YYYY-Www'}), 400
+    except Exception as e:
+        print(f"Weekly leaderboard error: {e}")
+        return jsonify({'success': False, 'message': 'Could not load weekly leaderboard'}), 500
+
 # ✅ NEW: Helper function for insights
 def generate_insights(baseline, patterns):
     """Generate human-readable insights from data"""
@@ -1144,7 +1388,21 @@ def generate_mood_forecast(user_id):
     }
 
 if __name__=="__main__":
+    import sys
+    if len(sys.argv) == 3 and sys.argv[1] == '--run-job':
+        # Cron entry point, e.g. "5 0 * * * cd Backend && python app.py --run-job streak_rollover"
+        if sys.argv[2] not in nightly_jobs.jobs:
+            print(f"Unknown job {sys.argv[2]}; jobs: {', '.join(nightly_jobs.jobs)}")
+            sys.exit(1)
+        nightly_jobs.run_now(sys.argv[2])
+        sys.exit(0)
     print("✅ Starting MindMirror server on port 5000...")
     print("📁 Current directory:", os.getcwd())
     print("📁 Files found:", [f for f in os.listdir('.') if f.endswith(('.html', '.css', '.js'))])
+    print(f"🗂️ Static assets cached: {static_assets.load()} files")
+    # With the debug reloader, only the child process runs background jobs (started eagerly here,
+    # otherwise by start_background_jobs on the first request)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_jobs()
+        static_assets.start_watching()     # Edited pages and assets are served without a restart
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
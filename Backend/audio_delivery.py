@@ -0,0 +1,110 @@
+# audio_delivery.py - Range requests, conditional GETs and streaming for audio responses
+import os
+import hashlib
+import mimetypes
+from datetime import datetime, timezone
+from flask import request, Response, abort
+from werkzeug.http import http_date, parse_range_header
+from werkzeug.security import safe_join
+
+READ_CHUNK = 64 * 1024      # Bytes read from disk per yielded chunk
+AUDIO_CACHE_CONTROL = 'private, max-age=3600'
+
+mimetypes.add_type('audio/webm', '.webm')
+mimetypes.add_type('audio/wav', '.wav')
+
+
+def file_etag(stat):
+    """Strong validator from size and modification time, so replaced files get a new tag"""
+    return hashlib.sha1(f"{stat.st_ino}-{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()[:20]
+
+
+def _not_modified(etag, last_modified):
+    """Evaluate If-None-Match, then If-Modified-Since (RFC 9110 precedence)"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag) or request.if_none_match.star_tag
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def _requested_range(total_length, etag, last_modified):
+    """(start, end) inclusive for a satisfiable single Range, None for the whole body, or 'invalid'"""
+    header = request.headers.get('Range')
+    if not header or total_length == 0:
+        return None
+    # If-Range: only honour the range when the client's copy is still current
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and (not last_modified or last_modified.replace(microsecond=0) > if_range.date):
+        return None
+
+    ranges = parse_range_header(header)
+    if ranges is None or len(ranges.ranges) != 1:
+        # Malformed or multipart ranges: a full 200 response is always allowed
+        return None
+    bounds = ranges.range_for_length(total_length)
+    if bounds is None:
+        return 'invalid'
+    return bounds[0], bounds[1] - 1
+
+
+def range_response(total_length, read_range, mimetype, etag, last_modified=None,
+                   cache_control=AUDIO_CACHE_CONTROL):
+    """Stream a body through read_range(start, end), honouring Range and conditional headers"""
+    if last_modified is not None and last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': f'"{etag}"',
+        'Cache-Control': cache_control
+    }
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified)
+
+    if _not_modified(etag, last_modified):
+        return Response(status=304, headers=headers)
+
+    bounds = _requested_range(total_length, etag, last_modified)
+    if bounds == 'invalid':
+        headers['Content-Range'] = f'bytes */{total_length}'
+        return Response(status=416, headers=headers)
+
+    if bounds is None:
+        start, end, status = 0, total_length - 1, 200
+    else:
+        start, end = bounds
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{total_length}'
+    headers['Content-Length'] = str(end - start + 1)
+
+    if request.method == 'HEAD' or total_length == 0:
+        return Response(status=status, headers=headers, mimetype=mimetype)
+    return Response(read_range(start, end), status=status, headers=headers, mimetype=mimetype,
+                    direct_passthrough=True)
+
+
+def _read_file_range(path, start, end):
+    """Yield a byte range of a file in fixed-size chunks"""
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = stream.read(min(READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def send_audio_file(directory, filename):
+    """Serve a file from directory with byte ranges and validators, never reading it whole"""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    stat = os.stat(path)
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return range_response(stat.st_size, lambda start, end: _read_file_range(path, start, end),
+                          mimetype, file_etag(stat), last_modified)
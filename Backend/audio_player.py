@@ -1,128 +1,297 @@
 # audio_player.py - Advanced audio playback system
-import os
 import time
+import heapq
+import itertools
 import threading
-from datetime import datetime
 
 try:
-    from database import get_db_connection
+    from database import get_db_connection, create_playback_session
 except ImportError:
     # Fallback for testing
     def get_db_connection():
         return None
 
+PROGRESS_INTERVAL = 1.0     # Seconds between on_progress callbacks
+IDLE_TTL = 600.0            # Seconds a paused or finished session is kept before it is dropped
+CALLBACK_EVENTS = ('on_start', 'on_pause', 'on_stop', 'on_progress', 'on_complete')
+
+
+class PlaybackSession:
+    """Compact playback record: position is derived from timestamps, never ticked"""
+    __slots__ = ('session_id', 'user_id', 'content', 'duration', 'offset', 'started_at',
+                 'playing', 'completed', 'version', 'callbacks')
+
+    def __init__(self, session_id, user_id, content, callbacks):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.content = content
+        self.duration = content.get('duration_minutes', 10) * 60
+        self.offset = 0.0           # Position when playback last (re)started
+        self.started_at = None      # Monotonic time of that (re)start, None while paused
+        self.playing = False
+        self.completed = False
+        self.version = 0            # Bumped on every state change; stale heap entries are skipped
+        self.callbacks = callbacks
+
+    def position(self, now):
+        if self.playing:
+            return min(self.duration, self.offset + now - self.started_at)
+        return self.offset
+
+
+class PlaybackEngine:
+    """One scheduler thread for every playback session, driven by a due-time heap"""
+
+    def __init__(self, progress_interval=PROGRESS_INTERVAL, clock=time.monotonic, idle_ttl=IDLE_TTL):
+        self.progress_interval = progress_interval
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._sessions = {}
+        self._heap = []             # (due, seq, session_id, version, event)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def play(self, content_item, user_id=None, callbacks=None):
+        """Start a session and return its id"""
+        session = PlaybackSession(next(self._ids), user_id, content_item, callbacks or {})
+        with self._cond:
+            self._ensure_thread()
+            self._sessions[session.session_id] = session
+            self._start(session, self.clock())
+        self._fire(session, 'on_start', content_item)
+        return session.session_id
+
+    def pause(self, session_id):
+        """Freeze a session at its current position"""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if not session or not session.playing:
+                return False
+            now = self.clock()
+            session.offset = session.position(now)
+            session.playing, session.started_at = False, None
+            session.version += 1
+            self._push(now + self.idle_ttl, session, 'expire')
+            position = session.offset
+        self._fire(session, 'on_pause', session.content, position)
+        return True
+
+    def resume(self, session_id):
+        """Continue a paused session from where it stopped"""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if not session or session.playing or session.completed:
+                return False
+            self._start(session, self.clock())
+        return True
+
+    def seek(self, session_id, position_seconds):
+        """Move a session to a new position, keeping its play/pause state"""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if not session:
+                return False
+            now = self.clock()
+            session.offset = min(session.duration, max(0, position_seconds))
+            session.completed = False
+            if session.playing:
+                self._start(session, now)
+            else:
+                session.version += 1
+                self._push(now + self.idle_ttl, session, 'expire')
+        return True
+
+    def stop(self, session_id):
+        """End a session and forget it"""
+        with self._cond:
+            session = self._sessions.pop(session_id, None)
+            if not session:
+                return False
+            position = session.position(self.clock())
+            session.playing = False
+            session.version += 1
+        self._fire(session, 'on_stop', session.content, position)
+        return True
+
+    def info(self, session_id):
+        """Snapshot of a session's state, or None"""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if not session:
+                return None
+            position = session.position(self.clock())
+            return {
+                'session_id': session.session_id,
+                'user_id': session.user_id,
+                'track': session.content,
+                'is_playing': session.playing,
+                'position': position,
+                'duration': session.duration,
+                'progress_percent': (position / session.duration) * 100 if session.duration else 100
+            }
+
+    def active_count(self):
+        """Sessions currently playing"""
+        with self._cond:
+            return sum(1 for session in self._sessions.values() if session.playing)
+
+    def _start(self, session, now):
+        """Mark playing from session.offset and schedule its next events (caller holds the lock)"""
+        session.playing, session.started_at = True, now
+        session.version += 1
+        remaining = session.duration - session.offset
+        self._push(now + remaining, session, 'complete')
+        # Progress ticks only for sessions that asked for them (the callback itself may be set later)
+        if 'on_progress' in session.callbacks and remaining > self.progress_interval:
+            self._push(now + self.progress_interval, session, 'progress')
+
+    def _push(self, due, session, event):
+        heapq.heappush(self._heap, (due, next(self._seq), session.session_id, session.version, event))
+        if self._heap[0][2] == session.session_id:
+            self._cond.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name='playback-engine', daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        """Sleep until the earliest due event, then fire whatever is due"""
+        while True:
+            fired = []
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                now = self.clock()
+                if self._heap[0][0] > now:
+                    self._cond.wait(self._heap[0][0] - now)
+                    continue
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, session_id, version, event = heapq.heappop(self._heap)
+                    session = self._sessions.get(session_id)
+                    if not session or session.version != version:
+                        continue
+                    if event == 'expire':
+                        # Idle (paused or finished) and untouched since: forget it so the table stays bounded
+                        del self._sessions[session_id]
+                        continue
+                    if not session.playing:
+                        continue
+                    if event == 'complete':
+                        session.offset, session.playing, session.started_at = session.duration, False, None
+                        session.completed = True
+                        session.version += 1
+                        self._push(now + self.idle_ttl, session, 'expire')
+                        fired.append((session, 'on_complete', (session.content,)))
+                    else:
+                        position = session.position(now)
+                        fired.append((session, 'on_progress',
+                                      ((position / session.duration) * 100, position)))
+                        if session.duration - position > self.progress_interval:
+                            heapq.heappush(self._heap, (due + self.progress_interval, next(self._seq),
+                                                        session_id, version, 'progress'))
+            # Callbacks run outside the lock so they may call back into the engine
+            for session, name, args in fired:
+                self._fire(session, name, *args)
+
+    def _fire(self, session, name, *args):
+        callback = session.callbacks.get(name)
+        if callback:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Playback callback error ({name}): {e}")
+
+
+# One engine for the whole process
+playback_engine = PlaybackEngine()
+
+
 class AudioPlayer:
-    def __init__(self):
-        self.current_track = None
-        self.is_playing = False
-        self.playback_position = 0
-        self.playback_start_time = None
-        self.playback_thread = None
-        self.playback_callbacks = {
-            'on_start': None,
-            'on_pause': None,
-            'on_stop': None,
-            'on_progress': None,
-            'on_complete': None
-        }
-    
+    """Single-track player facade over the shared playback engine"""
+
+    def __init__(self, engine=None):
+        self.engine = engine or playback_engine
+        self.session_id = None
+        self.playback_callbacks = {event: None for event in CALLBACK_EVENTS}
+
+    @property
+    def current_track(self):
+        info = self.engine.info(self.session_id) if self.session_id else None
+        return info['track'] if info else None
+
+    @property
+    def is_playing(self):
+        info = self.engine.info(self.session_id) if self.session_id else None
+        return bool(info and info['is_playing'])
+
+    @property
+    def playback_position(self):
+        info = self.engine.info(self.session_id) if self.session_id else None
+        return info['position'] if info else 0
+
     def play_content(self, content_item, user_id=None):
         """Play audio/video content with progress tracking"""
-        if self.is_playing:
+        if self.session_id:
             self.stop_playback()
-        
-        self.current_track = content_item
-        self.is_playing = True
-        self.playback_position = 0
-        self.playback_start_time = datetime.now()
-        
-        # Start playback thread
-        self.playback_thread = threading.Thread(target=self._playback_worker)
-        self.playback_thread.start()
-        
-        # Call start callback
-        if self.playback_callbacks['on_start']:
-            self.playback_callbacks['on_start'](content_item)
-        
+
+        # The engine reads this dict at fire time, so set_callback after play still applies
+        self.session_id = self.engine.play(content_item, user_id, self.playback_callbacks)
+
         # Log playback start
         if user_id:
             self._log_playback_start(user_id, content_item)
-    
-    def _playback_worker(self):
-        """Simulate playback progress"""
-        duration = self.current_track.get('duration_minutes', 10) * 60  # Convert to seconds
-        
-        while self.is_playing and self.playback_position < duration:
-            time.sleep(1)  # Update every second
-            self.playback_position += 1
-            
-            # Call progress callback
-            if self.playback_callbacks['on_progress']:
-                progress_percent = (self.playback_position / duration) * 100
-                self.playback_callbacks['on_progress'](progress_percent, self.playback_position)
-        
-        # Playback complete
-        if self.is_playing and self.playback_position >= duration:
-            self.is_playing = False
-            if self.playback_callbacks['on_complete']:
-                self.playback_callbacks['on_complete'](self.current_track)
-    
+
     def pause_playback(self):
         """Pause current playback"""
-        if self.is_playing:
-            self.is_playing = False
-            if self.playback_callbacks['on_pause']:
-                self.playback_callbacks['on_pause'](self.current_track, self.playback_position)
-    
+        if self.session_id:
+            self.engine.pause(self.session_id)
+
     def resume_playback(self):
         """Resume paused playback"""
-        if not self.is_playing and self.current_track:
-            self.is_playing = True
-            self.playback_thread = threading.Thread(target=self._playback_worker)
-            self.playback_thread.start()
-    
+        if self.session_id:
+            self.engine.resume(self.session_id)
+
     def stop_playback(self):
         """Stop playback completely"""
-        self.is_playing = False
-        if self.playback_callbacks['on_stop']:
-            self.playback_callbacks['on_stop'](self.current_track, self.playback_position)
-        self.current_track = None
-        self.playback_position = 0
-    
+        if self.session_id:
+            self.engine.stop(self.session_id)
+            self.session_id = None
+
     def seek_playback(self, position_seconds):
         """Seek to specific position"""
-        if self.current_track:
-            self.playback_position = max(0, position_seconds)
-    
+        if self.session_id:
+            self.engine.seek(self.session_id, position_seconds)
+
     def get_playback_info(self):
         """Get current playback information"""
-        if not self.current_track:
+        info = self.engine.info(self.session_id) if self.session_id else None
+        if not info:
             return None
-        
+
         return {
-            'track': self.current_track,
-            'is_playing': self.is_playing,
-            'position': self.playback_position,
-            'duration': self.current_track.get('duration_minutes', 10) * 60,
-            'progress_percent': (self.playback_position / (self.current_track.get('duration_minutes', 10) * 60)) * 100
+            'track': info['track'],
+            'is_playing': info['is_playing'],
+            'position': info['position'],
+            'duration': info['duration'],
+            'progress_percent': info['progress_percent']
         }
-    
+
     def set_callback(self, event, callback_function):
         """Set callback function for playback events"""
         if event in self.playback_callbacks:
             self.playback_callbacks[event] = callback_function
-    
+
     def _log_playback_start(self, user_id, content_item):
         """Log playback session to database"""
         try:
             conn = get_db_connection()
-            conn.execute('''
-            INSERT INTO user_playback_sessions 
-            (user_id, content_id, content_type, started_at, duration_planned)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, content_item.get('id'), content_item.get('content_type'), 
-                  datetime.now(), content_item.get('duration_minutes', 10)))
-            conn.commit()
-            conn.close()
+            try:
+                create_playback_session(conn, user_id, content_item.get('id'), content_item.get('content_type'),
+                                        content_item.get('duration_minutes', 10))
+            finally:
+                conn.close()
         except Exception as e:
-            print(f"Playback logging error: {e}")
\ No newline at end of file
+            print(f"Playback logging error: {e}")
@@ -0,0 +1,434 @@
+# catalog.py - Offline snapshot of music/video search results with a local inverted index
+import os
+import re
+import io
+import glob
+import json
+import time
+import threading
+import numpy as np
+
+CATALOG_DIR = os.environ.get('CATALOG_DIR', os.path.join('uploads', 'catalog'))
+SNAPSHOT_FILE = 'catalog.npz'
+SEGMENT_PATTERN = re.compile(r'^catalog-delta-(\d+)\.npz$')     # Changed items of one version, on top of the base
+MAX_SEGMENTS = 14              # Deltas replayed on load before a refresh folds them into the base
+REFRESH_RESULTS = 20           # Live results pulled per seed query on refresh
+FEATURES = ('valence', 'energy')
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = {'a', 'an', 'and', 'the', 'of', 'for', 'to', 'in', 'on', 'with', 'by', 'ft', 'feat'}
+
+
+def tokenize(text):
+    """Lowercase word tokens used both for indexing and for queries"""
+    return [token for token in TOKEN_PATTERN.findall(str(text or '').lower()) if token not in STOPWORDS]
+
+
+def _rank(items, pos):
+    """Posting order: most popular first, then oldest entry first"""
+    return -items[pos]['popularity'], pos
+
+
+def _describe(kind, data):
+    """(id, title, artist) of a provider-shaped track or video dict"""
+    if kind == 'track':
+        return data['track_id'], data.get('name', ''), data.get('artist', '')
+    return data['video_id'], data.get('title', ''), data.get('channel', '')
+
+
+class CatalogSnapshot:
+    """Immutable view searched by readers; refreshes build a new one and swap it in"""
+
+    def __init__(self, items, features, postings, version, updated_at):
+        self.items = items            # [{'kind', 'id', 'moods', 'popularity', 'data'}]
+        self.features = features      # float32 (n, len(FEATURES)), NaN when unknown
+        self.postings = postings      # token -> (positions ordered by rank, frozenset of the same)
+        self.version = version
+        self.updated_at = updated_at
+        self.positions = {(item['kind'], item['id']): pos for pos, item in enumerate(items)}
+
+    def search(self, query, kind, limit, feature_ranges=None):
+        """Top items of one kind matching every query token (or the most tokens when none match all)"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        mask = self._feature_mask(feature_ranges)
+        lists = [self.postings.get(token) for token in tokens]
+
+        results = []
+        if all(lists):
+            # Walk the shortest posting list in rank order and stop as soon as the page is full
+            lists.sort(key=lambda posting: len(posting[0]))
+            others = [posting[1] for posting in lists[1:]]
+            for pos in lists[0][0]:
+                if self.items[pos]['kind'] != kind or (mask is not None and not mask[pos]):
+                    continue
+                if all(pos in other for other in others):
+                    results.append(pos)
+                    if len(results) == limit:
+                        break
+        if not results:
+            hits = {}
+            for posting in lists:
+                for pos in (posting[0] if posting else ()):
+                    hits[pos] = hits.get(pos, 0) + 1
+            candidates = [pos for pos in hits
+                          if self.items[pos]['kind'] == kind and (mask is None or mask[pos])]
+            candidates.sort(key=lambda pos: (-hits[pos],) + _rank(self.items, pos))
+            results = candidates[:limit]
+        return [self._result(pos) for pos in results]
+
+    def _feature_mask(self, feature_ranges):
+        if not feature_ranges or not len(self.items):
+            return None
+        mask = np.ones(len(self.items), dtype=bool)
+        for name, (low, high) in feature_ranges.items():
+            column = self.features[:, FEATURES.index(name)]
+            mask &= (column >= low) & (column <= high)    # NaN (unknown) never matches a range
+        return mask
+
+    def _result(self, pos):
+        result = dict(self.items[pos]['data'])
+        for column, name in enumerate(FEATURES):
+            value = self.features[pos, column]
+            if not np.isnan(value):
+                result[name] = round(float(value), 3)
+        result['moods'] = list(self.items[pos]['moods'])
+        return result
+
+
+def _empty_snapshot():
+    return CatalogSnapshot([], np.zeros((0, len(FEATURES)), dtype=np.float32), {}, 0, None)
+
+
+class Catalog:
+    """Loads, searches and incrementally refreshes the on-disk catalog snapshot"""
+
+    def __init__(self, directory=CATALOG_DIR):
+        self.directory = directory
+        self.import_dir = os.path.join(directory, 'imports')   # Local JSON dumps dropped here are ingested
+        self._snapshot = None
+        self._compact = False             # Set when a delta could not be replayed: the next save rewrites the base
+        self._lock = threading.Lock()     # Serializes loading and refreshes; searches never take it
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load()
+                snapshot = self._snapshot
+        return snapshot
+
+    def search_tracks(self, query, max_results=10, valence=None, energy=None):
+        """Tracks shaped like SpotifyIntegration.search_tracks results"""
+        return self.snapshot.search(query, 'track', max_results, self._ranges(valence, energy))
+
+    def search_videos(self, query, max_results=5):
+        """Videos shaped like YouTubeIntegration.search_videos results"""
+        return self.snapshot.search(query, 'video', max_results)
+
+    def _ranges(self, valence, energy):
+        ranges = {name: bounds for name, bounds in zip(FEATURES, (valence, energy)) if bounds}
+        return ranges or None
+
+    # Persistence
+    def _path(self):
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    def _segments(self):
+        """[(version, path)] of the delta files, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        segments = []
+        for name in names:
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                segments.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _load(self):
+        """Base snapshot with its stored postings, then every newer delta replayed in order"""
+        path = self._path()
+        snapshot = _empty_snapshot()
+        if os.path.exists(path):
+            try:
+                with np.load(path) as stored:
+                    meta = json.loads(stored['meta'].tobytes().decode('utf-8'))
+                    features = stored['features'].astype(np.float32)
+                    postings = None
+                    if 'posting_offsets' in stored:
+                        postings = self._read_postings(meta['tokens'], stored['posting_offsets'],
+                                                       stored['posting_positions'])
+                items = meta['items']
+                if postings is None:     # Written before postings were stored
+                    postings = self._build_postings(items)
+                    self._compact = True
+                snapshot = CatalogSnapshot(items, features, postings, meta['version'], meta['updated_at'])
+            except Exception as e:
+                print(f"⚠️ Could not load catalog snapshot: {e}")
+                return _empty_snapshot()
+
+        for version, segment_path in self._segments():
+            if version <= snapshot.version:
+                continue        # Already folded into the base
+            try:
+                if version != snapshot.version + 1:
+                    raise ValueError(f"expected v{snapshot.version + 1}")
+                with np.load(segment_path) as stored:
+                    meta = json.loads(stored['meta'].tobytes().decode('utf-8'))
+                    rows = stored['features'].astype(np.float32).tolist()
+                    positions = stored['positions'].tolist()
+                changes = {pos: (item, row) for pos, item, row in zip(positions, meta['items'], rows)}
+                snapshot = self._apply(snapshot, changes, version, meta['updated_at'])
+            except Exception as e:
+                print(f"⚠️ Could not replay catalog delta {segment_path}: {e}")
+                self._compact = True
+                break
+        return snapshot
+
+    def _write_npz(self, path, **arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as handle:
+            handle.write(buffer.getvalue())
+        os.replace(temp_path, path)
+
+    def _save(self, snapshot):
+        """Rewrite the base with its postings (as offsets into one positions array) and drop the deltas"""
+        tokens = list(snapshot.postings)
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum([len(snapshot.postings[token][0]) for token in tokens], out=offsets[1:])
+        positions = np.fromiter((pos for token in tokens for pos in snapshot.postings[token][0]),
+                                dtype=np.int32, count=int(offsets[-1]))
+        meta = json.dumps({'version': snapshot.version, 'updated_at': snapshot.updated_at,
+                           'items': snapshot.items, 'tokens': tokens}, separators=(',', ':')).encode('utf-8')
+        self._write_npz(self._path(), meta=np.frombuffer(meta, dtype=np.uint8), features=snapshot.features,
+                        posting_offsets=offsets, posting_positions=positions)
+        # Deltas at or below the base version are ignored on load, so a crash here is harmless
+        for _, segment_path in self._segments():
+            os.remove(segment_path)
+        self._compact = False
+
+    def _save_delta(self, snapshot, changes):
+        """Write only the changed items of this version"""
+        order = sorted(changes)
+        meta = json.dumps({'version': snapshot.version, 'updated_at': snapshot.updated_at,
+                           'items': [changes[pos][0] for pos in order]}, separators=(',', ':')).encode('utf-8')
+        rows = np.asarray([changes[pos][1] for pos in order], dtype=np.float32).reshape(-1, len(FEATURES))
+        self._write_npz(os.path.join(self.directory, f"catalog-delta-{snapshot.version}.npz"),
+                        meta=np.frombuffer(meta, dtype=np.uint8), features=rows,
+                        positions=np.asarray(order, dtype=np.int64))
+
+    def _persist(self, snapshot, changes):
+        if self._compact or not os.path.exists(self._path()) or len(self._segments()) >= MAX_SEGMENTS:
+            self._save(snapshot)
+        else:
+            self._save_delta(snapshot, changes)
+
+    # Indexing
+    def _item_tokens(self, item):
+        _, title, artist = _describe(item['kind'], item['data'])
+        return set(tokenize(title)) | set(tokenize(artist)) | set(tokenize(' '.join(item['moods'])))
+
+    def _read_postings(self, tokens, offsets, positions):
+        bounds, flat = offsets.tolist(), positions.tolist()
+        postings = {}
+        for i, token in enumerate(tokens):
+            ranked = tuple(flat[bounds[i]:bounds[i + 1]])
+            postings[token] = (ranked, frozenset(ranked))
+        return postings
+
+    def _build_postings(self, items):
+        lists = {}
+        for pos, item in enumerate(items):
+            for token in self._item_tokens(item):
+                lists.setdefault(token, []).append(pos)
+        postings = {}
+        for token, positions in lists.items():
+            positions.sort(key=lambda pos: _rank(items, pos))
+            postings[token] = (tuple(positions), frozenset(positions))
+        return postings
+
+    # Refresh
+    def upsert(self, entries):
+        """Merge [(kind, data, moods, features)] into a new snapshot; returns how many items changed"""
+        with self._lock:
+            current = self._snapshot if self._snapshot is not None else self._load()
+            snapshot, changes = self._merge(current, entries)
+            if changes:
+                self._persist(snapshot, changes)
+                self._snapshot = snapshot
+            elif self._snapshot is None:
+                self._snapshot = current
+            return len(changes)
+
+    def _collapse(self, entries):
+        """One entry per item: the last data seen wins, moods and known features accumulate"""
+        collapsed = {}
+        for kind, data, moods, values in entries:
+            key = (kind, _describe(kind, data)[0])
+            if key in collapsed:
+                _, _, seen_moods, seen_values = collapsed[key]
+                moods = list(seen_moods) + list(moods or ())
+                values = dict(seen_values, **{name: value for name, value in values.items() if value is not None})
+            collapsed[key] = (kind, data, moods, values)
+        return collapsed.values()
+
+    def _merge(self, current, entries):
+        """New snapshot plus {position: (item, feature row)} of the items that changed or were added"""
+        changes = {}
+        next_pos = len(current.items)
+        for kind, data, moods, values in self._collapse(entries):
+            item_id, _, _ = _describe(kind, data)
+            pos = current.positions.get((kind, item_id))
+            previous = current.items[pos] if pos is not None else None
+            merged_moods = sorted(set(previous['moods'] if previous else ()) | set(moods or ()))
+            item = {'kind': kind, 'id': item_id, 'moods': merged_moods,
+                    'popularity': int(data.get('popularity') or 0), 'data': data}
+            row = [np.nan if values.get(name) is None else values[name] for name in FEATURES]
+            if previous is not None:
+                old_row = current.features[pos].tolist()
+                # Keep known features when the new source does not carry them
+                row = [old if np.isnan(new) else new for old, new in zip(old_row, row)]
+                if previous == item and np.array_equal(np.float32(old_row), np.float32(row), equal_nan=True):
+                    continue
+            else:
+                pos = next_pos
+                next_pos += 1
+            changes[pos] = (item, row)
+
+        if not changes:
+            return current, {}
+        snapshot = self._apply(current, changes, current.version + 1, time.strftime('%Y-%m-%dT%H:%M:%S'))
+        return snapshot, changes
+
+    def _apply(self, current, changes, version, updated_at):
+        """Copy-on-write update: only the posting lists of touched tokens are rebuilt"""
+        items = list(current.items)
+        postings = dict(current.postings)
+        new_rows, updated_rows, touched, item_tokens = [], {}, {}, {}
+
+        for pos in sorted(changes):
+            item, row = changes[pos]
+            if pos < len(current.items):
+                for token in self._item_tokens(items[pos]):
+                    touched.setdefault(token, set()).add(pos)
+                items[pos] = item
+                updated_rows[pos] = row
+            elif pos == len(items):
+                items.append(item)
+                new_rows.append(row)
+            else:
+                raise ValueError(f"catalog position {pos} skips past {len(items)} items")
+            item_tokens[pos] = self._item_tokens(item)
+            for token in item_tokens[pos]:
+                touched.setdefault(token, set()).add(pos)
+
+        features = np.vstack([current.features, np.asarray(new_rows, dtype=np.float32).reshape(-1, len(FEATURES))])
+        for pos, row in updated_rows.items():
+            features[pos] = row
+
+        for token, moved in touched.items():
+            kept = [pos for pos in postings.get(token, ((), None))[0] if pos not in moved]
+            kept.extend(pos for pos in moved if token in item_tokens[pos])
+            # kept is already ordered apart from the moved tail, which timsort merges in linear time
+            kept.sort(key=lambda pos: _rank(items, pos))
+            if kept:
+                postings[token] = (tuple(kept), frozenset(kept))
+            else:
+                postings.pop(token, None)
+
+        return CatalogSnapshot(items, features, postings, version, updated_at)
+
+    def ingest_dump(self, path):
+        """Entries from a local JSON dump: {"tracks": [...], "videos": [...]} in provider result shape"""
+        with open(path, 'r', encoding='utf-8') as handle:
+            dump = json.load(handle)
+        entries = []
+        for kind, key in (('track', 'tracks'), ('video', 'videos')):
+            for record in dump.get(key, []):
+                record = dict(record)
+                moods = record.pop('moods', [])
+                values = {name: record.pop(name, None) for name in FEATURES}
+                entries.append((kind, record, moods, values))
+        return entries
+
+    def refresh(self, live=True):
+        """Ingest new dumps and, when online, re-run the seed searches; only changes are written"""
+        entries = []
+        state_path = os.path.join(self.directory, 'refresh_state.json')
+        try:
+            with open(state_path, 'r', encoding='utf-8') as handle:
+                state = json.load(handle)
+        except (OSError, ValueError):
+            state = {}
+
+        imported = state.get('imported', {})
+        for path in sorted(glob.glob(os.path.join(self.import_dir, '*.json'))):
+            mtime = os.path.getmtime(path)
+            if imported.get(os.path.basename(path)) == mtime:
+                continue
+            try:
+                entries.extend(self.ingest_dump(path))
+                imported[os.path.basename(path)] = mtime
+            except Exception as e:
+                print(f"⚠️ Skipping catalog dump {path}: {e}")
+
+        if live:
+            entries.extend(self._live_entries())
+
+        changed = self.upsert(entries)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(state_path, 'w', encoding='utf-8') as handle:
+            json.dump({'imported': imported}, handle)
+        print(f"📚 Catalog refresh: {len(entries)} entries seen, {changed} changed, "
+              f"{len(self.snapshot.items)} items (v{self.snapshot.version})")
+        return changed
+
+    def _live_entries(self):
+        """Seed searches per emotion through the live providers, tagged with that emotion"""
+        from content_providers import EMOTION_QUERIES
+        from spotify_integration import SpotifyIntegration
+        from youtube_integration import YouTubeIntegration
+        spotify, youtube = SpotifyIntegration(), YouTubeIntegration()
+        entries, known = [], self.snapshot.positions
+
+        for emotion, queries in EMOTION_QUERIES.items():
+            try:
+                tracks = spotify.search_tracks(queries['spotify'], REFRESH_RESULTS, strict=True)
+                # Audio features never change: only fetch them for tracks not yet in the catalog
+                fresh = [track['track_id'] for track in tracks if ('track', track['track_id']) not in known]
+                features = {row['id']: row for row in spotify.get_audio_features(fresh) if row}
+                for track in tracks:
+                    row = features.get(track['track_id'], {})
+                    entries.append(('track', track, [emotion], {name: row.get(name) for name in FEATURES}))
+            except Exception as e:
+                print(f"⚠️ Catalog refresh skipped Spotify for {emotion}: {e}")
+            try:
+                videos = youtube.search_videos(queries['youtube'], REFRESH_RESULTS, with_durations=True, strict=True)
+                entries.extend(('video', video, [emotion], {}) for video in videos)
+            except Exception as e:
+                print(f"⚠️ Catalog refresh skipped YouTube for {emotion}: {e}")
+        return entries
+
+    def get_status(self):
+        snapshot = self.snapshot
+        kinds = [item['kind'] for item in snapshot.items]
+        return {'version': snapshot.version, 'updated_at': snapshot.updated_at,
+                'tracks': kinds.count('track'), 'videos': kinds.count('video'), 'tokens': len(snapshot.postings),
+                'delta_segments': len(self._segments())}
+
+
+# Shared by the integrations and the nightly refresh job
+content_catalog = Catalog()
+
+
+def refresh_catalog_job():
+    """Nightly incremental refresh (seed searches are skipped when OFFLINE_CATALOG is set)"""
+    return content_catalog.refresh(live=os.getenv('OFFLINE_CATALOG', '0') != '1')
@@ -0,0 +1,104 @@
+# content_benchmark.py - Recommendation latency at catalog scale: snapshot index vs ORDER BY RANDOM()
+# Usage: python content_benchmark.py [--items 100000] [--requests 2000]
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+import database
+from database import init_db, get_db_connection
+
+EMOTIONS = ['sadness', 'anxiety', 'anger', 'joy', 'neutral']
+CATEGORIES = ['immediate_relief', 'daily_practice', 'deep_work']
+DURATIONS = [2, 4, 5, 8, 10, 12, 15, 20, 25, 30, 45, 60, None]
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+    return f"p50 {pick(0.5):.3f} ms  p95 {pick(0.95):.3f} ms  p99 {pick(0.99):.3f} ms"
+
+
+def run_benchmark(num_items, num_requests):
+    db_dir = tempfile.mkdtemp(prefix='mindmirror_content_')
+    database.DATABASE_PATH = os.path.join(db_dir, 'content.db')
+    init_db()
+
+    from content_library import ContentLibrary, CONTENT_TYPES
+    from content_index import content_index
+    library = ContentLibrary()
+    first = library.initialize_default_content()
+    again = library.initialize_default_content()
+    print(f"Seeding is idempotent: {first} then {again}")
+
+    rng = random.Random(7)
+    rows = [(rng.choice(CONTENT_TYPES), rng.choice(EMOTIONS), f"Synthetic item {i}", '', f"/content/{i}",
+             rng.choice(DURATIONS), 'gentle', rng.choice(CATEGORIES), '') for i in range(num_items)]
+    conn = get_db_connection()
+    started = time.perf_counter()
+    with conn:
+        conn.executemany('''
+            INSERT INTO therapeutic_content
+            (content_type, emotion_target, title, description, content_url,
+             duration_minutes, intensity_level, content_category, scientific_basis)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    print(f"Inserted {num_items} items in {time.perf_counter() - started:.2f}s")
+
+    content_index.invalidate()
+    started = time.perf_counter()
+    content_index.snapshot()
+    print(f"Snapshot load: {time.perf_counter() - started:.2f}s {content_index.get_status()}")
+
+    emotions = [rng.choice(EMOTIONS) for _ in range(num_requests)]
+    timings = []
+    for emotion in emotions:
+        started = time.perf_counter()
+        library.get_therapeutic_recommendations(emotion)
+        timings.append(time.perf_counter() - started)
+    print(f"Snapshot full recommendations ({len(CONTENT_TYPES)} types + lifestyle): {percentiles(timings)}")
+
+    timings = []
+    for emotion in emotions:
+        started = time.perf_counter()
+        content_index.get_content(emotion, 'exercise', 2, max_duration=10)
+        timings.append(time.perf_counter() - started)
+    print(f"Snapshot immediate relief (<= 10 min):  {percentiles(timings)}")
+
+    # The old path: one ORDER BY RANDOM() query per content type
+    timings = []
+    for emotion in emotions[:max(1, num_requests // 10)]:
+        started = time.perf_counter()
+        for content_type in CONTENT_TYPES:
+            conn.execute('''
+                SELECT * FROM therapeutic_content
+                WHERE emotion_target = ? AND content_type = ?
+                ORDER BY RANDOM() LIMIT ?
+            ''', (emotion, content_type, 3)).fetchall()
+        timings.append(time.perf_counter() - started)
+    print(f"ORDER BY RANDOM() baseline:             {percentiles(timings)}")
+
+    # Hot reload: a write shows up after the next version check
+    conn.execute('''
+        INSERT INTO therapeutic_content (content_type, emotion_target, title, content_url, duration_minutes,
+                                         content_category)
+        VALUES ('exercise', 'benchmark', 'Reload probe', '/probe', 3, 'immediate_relief')
+    ''')
+    conn.commit()
+    content_index.invalidate()
+    reloaded = [item['title'] for item in library.get_therapeutic_recommendations('benchmark')['exercise']]
+    conn.close()
+    library.close()
+    return reloaded == ['Reload probe'] and again == {'content_added': 0, 'lifestyle_added': 0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    ok = run_benchmark(args.items, args.requests)
+    print('✅ Seeding idempotent and snapshot reloads on change' if ok else '❌ Check failed')
+    sys.exit(0 if ok else 1)
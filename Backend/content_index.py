@@ -0,0 +1,199 @@
+# content_index.py - Process-wide in-memory index of therapeutic and lifestyle content
+import math
+import time
+import heapq
+import random
+import threading
+from bisect import bisect_right
+from database import get_db_connection
+
+RELOAD_CHECK_SECONDS = 2.0    # How often readers look at content_versions for table changes
+
+# Upper bound in minutes -> bucket label (same vocabulary as lifestyle_recommendations.duration)
+DURATION_BUCKETS = ((5, '5min'), (15, '15min'), (30, '30min'), (None, '1h+'))
+
+
+def duration_bucket(minutes):
+    """Bucket label for a duration; NULL durations get their own bucket"""
+    if minutes is None:
+        return 'unknown'
+    for upper, label in DURATION_BUCKETS:
+        if upper is None or minutes <= upper:
+            return label
+
+
+def _bucket_fits(label, max_duration):
+    """'all', 'some' or 'none' of a duration bucket's rows can be <= max_duration"""
+    if max_duration is None:
+        return 'all'
+    if label == 'unknown':
+        return 'none'
+    lower = 0
+    for upper, bucket in DURATION_BUCKETS:
+        if bucket == label:
+            if upper is not None and upper <= max_duration:
+                return 'all'
+            return 'some' if lower < max_duration else 'none'
+        lower = upper
+
+
+def weighted_sample(rows, k, weight=None, rng=random):
+    """Weighted reservoir sampling without replacement (Efraimidis-Spirakis A-Res), one pass, heap of k"""
+    if k <= 0:
+        return []
+    reservoir = []
+    for row in rows:
+        w = weight(row) if weight else 1.0
+        if w <= 0:
+            continue
+        # Larger keys win; log(u) / w is the numerically stable form of u ** (1 / w)
+        key = math.log(1.0 - rng.random()) / w
+        if len(reservoir) < k:
+            heapq.heappush(reservoir, (key, id(row), row))
+        elif key > reservoir[0][0]:
+            heapq.heapreplace(reservoir, (key, id(row), row))
+    reservoir.sort(reverse=True)
+    return [row for _, _, row in reservoir]
+
+
+def sample_segments(segments, k, weight=None, rng=random):
+    """k rows from [(rows, count)] prefixes: O(k) uniform draw by position, reservoir pass when weighted"""
+    if weight:
+        return weighted_sample((row for rows, count in segments for row in rows[:count]), k, weight, rng)
+    offsets, total = [], 0
+    for _, count in segments:
+        total += count
+        offsets.append(total)
+    picked = []
+    for position in rng.sample(range(total), min(k, total)):
+        segment = bisect_right(offsets, position)
+        picked.append(segments[segment][0][position - (offsets[segment - 1] if segment else 0)])
+    return picked
+
+
+class ContentSnapshot:
+    """Rows of both content tables grouped into buckets; never mutated once built"""
+
+    def __init__(self, content_rows, lifestyle_rows, version):
+        self.version = version
+        self.by_id = {row['id']: row for row in content_rows}
+        # emotion -> {(content_type, content_category, duration bucket): rows sorted by duration}
+        self.content_buckets = {}
+        for row in content_rows:
+            key = (row['content_type'], row['content_category'], duration_bucket(row['duration_minutes']))
+            self.content_buckets.setdefault(row['emotion_target'], {}).setdefault(key, []).append(row)
+        # Per bucket durations, so a max_duration cut inside a bucket is one bisect
+        self.durations = {}
+        for buckets in self.content_buckets.values():
+            for rows in buckets.values():
+                rows.sort(key=lambda row: (row['duration_minutes'] or 0, row['id']))
+                self.durations[id(rows)] = [row['duration_minutes'] or 0 for row in rows]
+        # emotion -> {(time_of_day, category): rows}
+        self.lifestyle_buckets = {}
+        for row in lifestyle_rows:
+            key = (row['time_of_day'], row['category'])
+            self.lifestyle_buckets.setdefault(row['emotion_target'], {}).setdefault(key, []).append(row)
+        self.content_count = len(content_rows)
+        self.lifestyle_count = len(lifestyle_rows)
+
+    def content_candidates(self, emotion, content_type=None, category=None, max_duration=None):
+        """Matching rows as [(bucket rows, matching prefix length)], touching only buckets that can match"""
+        segments = []
+        for (row_type, row_category, label), rows in self.content_buckets.get(emotion, {}).items():
+            if content_type and row_type != content_type or category and row_category != category:
+                continue
+            fits = _bucket_fits(label, max_duration)
+            if fits == 'all':
+                segments.append((rows, len(rows)))
+            elif fits == 'some':
+                segments.append((rows, bisect_right(self.durations[id(rows)], max_duration)))
+        return segments
+
+    def lifestyle_candidates(self, emotion, time_of_day=None, category=None):
+        return [(rows, len(rows)) for (row_time, row_category), rows in self.lifestyle_buckets.get(emotion, {}).items()
+                if not (time_of_day and row_time != time_of_day or category and row_category != category)]
+
+
+class ContentIndex:
+    """Loads both content tables once per process and reloads them when content_versions changes"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _read_version(self, conn):
+        rows = conn.execute('SELECT table_name, version FROM content_versions ORDER BY table_name').fetchall()
+        return tuple(tuple(row) for row in rows)
+
+    def _build(self, conn):
+        # One read transaction so the version matches the rows loaded (unless the caller already holds one)
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN')
+        try:
+            version = self._read_version(conn)
+            content_rows = [dict(row) for row in conn.execute('SELECT * FROM therapeutic_content ORDER BY id')]
+            lifestyle_rows = [dict(row) for row in conn.execute('SELECT * FROM lifestyle_recommendations ORDER BY id')]
+        finally:
+            if own_transaction:
+                conn.commit()
+        return ContentSnapshot(content_rows, lifestyle_rows, version)
+
+    def snapshot(self, conn=None):
+        """Current snapshot, reloaded first if the tables changed since the last check"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < RELOAD_CHECK_SECONDS:
+            return snapshot
+        # Single flight: while one thread reloads, the others keep serving the previous snapshot
+        if not self._reload_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < RELOAD_CHECK_SECONDS:
+                return self._snapshot
+            own_conn = conn is None
+            conn = conn or get_db_connection()
+            try:
+                if self._snapshot is None or self._read_version(conn) != self._snapshot.version:
+                    self._snapshot = self._build(conn)
+                    print(f"📚 Content index loaded: {self._snapshot.content_count} items, "
+                          f"{self._snapshot.lifestyle_count} lifestyle recommendations")
+            finally:
+                if own_conn:
+                    conn.close()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+        finally:
+            self._reload_lock.release()
+
+    def invalidate(self):
+        """Force a version check on the next read (after writes made by this process)"""
+        self._checked_at = 0.0
+
+    def get_content(self, emotion, content_type=None, limit=5, category=None, max_duration=None,
+                    weights=None, conn=None):
+        """Random therapeutic content for an emotion; weights maps content id -> relative weight"""
+        snapshot = self.snapshot(conn)
+        weight = (lambda row: weights.get(row['id'], 1.0)) if weights else None
+        rows = sample_segments(snapshot.content_candidates(emotion, content_type, category, max_duration),
+                               limit, weight)
+        return [dict(row) for row in rows]
+
+    def get_lifestyle(self, emotion, time_of_day=None, category=None, limit=3, conn=None):
+        """Random lifestyle recommendations for an emotion"""
+        rows = sample_segments(self.snapshot(conn).lifestyle_candidates(emotion, time_of_day, category), limit)
+        return [dict(row) for row in rows]
+
+    def get_by_id(self, content_id):
+        row = self.snapshot().by_id.get(content_id)
+        return dict(row) if row else None
+
+    def get_status(self):
+        snapshot = self.snapshot()
+        return {'content_items': snapshot.content_count, 'lifestyle_items': snapshot.lifestyle_count,
+                'buckets': sum(len(buckets) for buckets in snapshot.content_buckets.values()),
+                'version': dict(snapshot.version)}
+
+
+# Shared by every request handler in the process
+content_index = ContentIndex()
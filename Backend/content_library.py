@@ -0,0 +1,188 @@
+# content_library.py - Therapeutic content library: default seed content and snapshot-served recommendations
+from database import get_db_connection
+from content_index import content_index
+
+CONTENT_TYPES = ['music', 'video', 'exercise', 'meditation']
+
+# (content_type, emotion_target, title, description, content_url, duration_minutes,
+#  intensity_level, content_category, scientific_basis)
+DEFAULT_THERAPEUTIC_CONTENT = [
+    # Sadness
+    ('exercise', 'sadness', 'Self-Compassion Break', 'Name the feeling, remember you are not alone, offer yourself kindness.',
+     'https://www.youtube.com/results?search_query=self+compassion+break', 5, 'gentle', 'immediate_relief',
+     'Self-compassion practice reduces depressive symptoms (Neff & Germer, 2013)'),
+    ('video', 'sadness', 'Guided Loving-Kindness Meditation', 'A short loving-kindness practice to soften low mood.',
+     'https://www.youtube.com/results?search_query=loving+kindness+meditation+10+minutes', 10, 'gentle',
+     'immediate_relief', 'Loving-kindness meditation increases positive emotions (Fredrickson et al., 2008)'),
+    ('music', 'sadness', 'Comforting Acoustic Playlist', 'Warm, slow acoustic songs that gradually lift in tempo.',
+     'https://open.spotify.com/search/comforting%20acoustic', 20, 'gentle', 'daily_practice',
+     'Mood-matching then gradually uplifting music supports mood repair (iso principle)'),
+    ('exercise', 'sadness', 'Behavioral Activation Walk', 'A 15-minute walk outside with one small, pleasant goal.',
+     'https://www.youtube.com/results?search_query=behavioral+activation', 15, 'moderate', 'daily_practice',
+     'Behavioral activation is an effective treatment for depression (Cuijpers et al., 2007)'),
+    ('meditation', 'sadness', 'Body Scan for Heavy Days', 'Gentle attention through the body without trying to fix anything.',
+     'https://www.youtube.com/results?search_query=body+scan+meditation', 20, 'gentle', 'deep_work',
+     'Mindfulness-based cognitive therapy reduces depressive relapse (Kuyken et al., 2016)'),
+    # Anxiety
+    ('exercise', 'anxiety', 'Box Breathing', 'Inhale 4, hold 4, exhale 4, hold 4 - repeat for a few minutes.',
+     'https://www.youtube.com/results?search_query=box+breathing', 4, 'gentle', 'immediate_relief',
+     'Slow paced breathing increases vagal tone and lowers arousal (Zaccaro et al., 2018)'),
+    ('exercise', 'anxiety', '5-4-3-2-1 Grounding', 'Notice five things you see, four you feel, three you hear, two you smell, one you taste.',
+     'https://www.youtube.com/results?search_query=54321+grounding+technique', 5, 'gentle', 'immediate_relief',
+     'Sensory grounding redirects attention away from anxious rumination'),
+    ('video', 'anxiety', 'Guided Breathing for Anxiety', 'Follow-along breathing with a slow visual pacer.',
+     'https://www.youtube.com/results?search_query=breathing+exercise+for+anxiety', 8, 'gentle', 'immediate_relief',
+     'Extended exhalation activates the parasympathetic nervous system'),
+    ('music', 'anxiety', 'Calm Ambient Soundscape', 'Slow ambient music around 60 BPM with no sudden changes.',
+     'https://open.spotify.com/search/calm%20ambient', 30, 'gentle', 'daily_practice',
+     'Relaxing music lowers cortisol and self-reported anxiety (de Witte et al., 2020)'),
+    ('meditation', 'anxiety', 'Progressive Muscle Relaxation', 'Tense and release each muscle group from feet to face.',
+     'https://www.youtube.com/results?search_query=progressive+muscle+relaxation', 15, 'gentle', 'daily_practice',
+     'Progressive muscle relaxation reduces anxiety symptoms (Manzoni et al., 2008)'),
+    # Anger
+    ('exercise', 'anger', 'Physiological Sigh', 'Two short inhales through the nose, one long exhale through the mouth.',
+     'https://www.youtube.com/results?search_query=physiological+sigh', 2, 'gentle', 'immediate_relief',
+     'Cyclic sighing rapidly reduces physiological arousal (Balban et al., 2023)'),
+    ('exercise', 'anger', 'Brisk Movement Break', 'Ten minutes of brisk walking or stairs to burn off the surge.',
+     'https://www.youtube.com/results?search_query=10+minute+cardio', 10, 'intense', 'immediate_relief',
+     'Aerobic exercise dampens anger responses (Thayer et al., 1994)'),
+    ('video', 'anger', 'Cooling Down Guided Relaxation', 'A short guided relaxation for letting anger pass.',
+     'https://www.youtube.com/results?search_query=anger+release+guided+relaxation', 10, 'moderate',
+     'immediate_relief', 'Relaxation training reduces anger expression (Del Vecchio & O\'Leary, 2004)'),
+    ('music', 'anger', 'Steady Instrumental Focus', 'Instrumental tracks that start energetic and slowly settle.',
+     'https://open.spotify.com/search/calming%20instrumental', 20, 'moderate', 'daily_practice',
+     'Music with decreasing tempo supports emotional down-regulation'),
+    ('exercise', 'anger', 'Reappraisal Journal', 'Write what happened, what you assumed, and one other explanation.',
+     '/history', 15, 'moderate', 'daily_practice',
+     'Cognitive reappraisal lowers anger without suppressing it (Gross, 2002)'),
+    # Joy
+    ('exercise', 'joy', 'Savoring Pause', 'Stop for two minutes and replay what went well in detail.',
+     'https://www.youtube.com/results?search_query=savoring+exercise', 3, 'gentle', 'immediate_relief',
+     'Savoring prolongs positive emotion (Bryant & Veroff, 2007)'),
+    ('video', 'joy', 'Gratitude Meditation', 'A short guided gratitude practice.',
+     'https://www.youtube.com/results?search_query=gratitude+meditation', 10, 'gentle', 'immediate_relief',
+     'Gratitude practices increase well-being (Emmons & McCullough, 2003)'),
+    ('music', 'joy', 'Feel-Good Upbeat Playlist', 'Upbeat tracks to move to and share.',
+     'https://open.spotify.com/search/feel%20good', 25, 'moderate', 'daily_practice',
+     'Upbeat music sustains positive affect and energy'),
+    ('exercise', 'joy', 'Three Good Things', 'Each evening, write down three good things and why they happened.',
+     '/history', 10, 'gentle', 'daily_practice',
+     'Three good things increases happiness for months (Seligman et al., 2005)'),
+    # Neutral
+    ('exercise', 'neutral', 'Mindful Check-In', 'One minute each for body, breath, thoughts and needs.',
+     'https://www.youtube.com/results?search_query=mindful+check+in', 4, 'gentle', 'immediate_relief',
+     'Brief mindfulness improves emotional awareness'),
+    ('video', 'neutral', 'Mindfulness Meditation', 'A ten-minute beginner mindfulness meditation.',
+     'https://www.youtube.com/results?search_query=mindfulness+meditation+10+minutes', 10, 'gentle',
+     'immediate_relief', 'Mindfulness training improves attention and well-being (Khoury et al., 2015)'),
+    ('music', 'neutral', 'Lo-fi Focus Playlist', 'Low-distraction beats for focused work.',
+     'https://open.spotify.com/search/lofi%20focus', 30, 'gentle', 'daily_practice',
+     'Background music without lyrics can support sustained attention'),
+    ('meditation', 'neutral', 'Open Awareness Sit', 'Rest attention on whatever arises without following it.',
+     'https://www.youtube.com/results?search_query=open+awareness+meditation', 20, 'gentle', 'deep_work',
+     'Open monitoring meditation supports cognitive flexibility'),
+]
+
+# (emotion_target, time_of_day, category, recommendation, duration, difficulty, scientific_basis)
+DEFAULT_LIFESTYLE_RECOMMENDATIONS = [
+    ('sadness', 'morning', 'exercise', 'Get 10 minutes of daylight on a short walk', '15min', 'easy',
+     'Morning light exposure improves mood and circadian rhythm'),
+    ('sadness', 'afternoon', 'social', 'Send a message to someone you trust', '5min', 'easy',
+     'Social connection buffers low mood'),
+    ('sadness', 'evening', 'diet', 'Have a warm, balanced meal with protein and vegetables', '30min', 'easy',
+     'Regular nutritious meals stabilize energy and mood'),
+    ('sadness', 'evening', 'mindfulness', 'Write down one thing you handled well today', '5min', 'easy',
+     'Self-affirmation reduces rumination'),
+    ('anxiety', 'morning', 'diet', 'Swap the second coffee for water or herbal tea', '5min', 'easy',
+     'High caffeine intake increases anxiety symptoms'),
+    ('anxiety', 'afternoon', 'exercise', 'Take a 20-minute brisk walk', '30min', 'medium',
+     'Aerobic exercise reduces anxiety sensitivity'),
+    ('anxiety', 'evening', 'mindfulness', 'Write tomorrow\'s worries on paper, then close the notebook', '15min', 'easy',
+     'Scheduled worry time reduces intrusive worry'),
+    ('anxiety', 'evening', 'sleep', 'Dim screens an hour before bed', '1h+', 'medium',
+     'Evening light exposure delays sleep onset'),
+    ('anger', 'morning', 'exercise', 'Do a short strength or cardio session', '30min', 'medium',
+     'Exercise lowers baseline irritability'),
+    ('anger', 'afternoon', 'mindfulness', 'Pause for three slow breaths before replying to messages', '5min', 'easy',
+     'A brief pause interrupts reactive responses'),
+    ('anger', 'evening', 'social', 'Talk it through with someone neutral', '30min', 'medium',
+     'Constructive expression reduces lingering anger'),
+    ('joy', 'morning', 'social', 'Share your good news with a friend', '5min', 'easy',
+     'Capitalizing on positive events amplifies them (Gable et al., 2004)'),
+    ('joy', 'afternoon', 'exercise', 'Try a dance or movement break', '15min', 'easy',
+     'Movement sustains positive energy'),
+    ('joy', 'evening', 'mindfulness', 'Note three things that went well today', '5min', 'easy',
+     'Three good things exercise increases happiness'),
+    ('neutral', 'morning', 'mindfulness', 'Set one intention for the day', '5min', 'easy',
+     'Implementation intentions support goal pursuit'),
+    ('neutral', 'afternoon', 'diet', 'Drink a glass of water and have a fruit snack', '5min', 'easy',
+     'Mild dehydration lowers mood and focus'),
+    ('neutral', 'evening', 'sleep', 'Keep a consistent bedtime tonight', '1h+', 'medium',
+     'Regular sleep timing supports emotional regulation'),
+]
+
+
+class ContentLibrary:
+    """Seeds the content tables and serves recommendations from the shared content index"""
+
+    def __init__(self, conn=None):
+        # Reads never touch the database, so the connection is only opened when seeding
+        self.conn = conn
+        self._owns_conn = conn is None
+
+    def _connection(self):
+        if self.conn is None:
+            self.conn = get_db_connection()
+        return self.conn
+
+    def initialize_default_content(self):
+        """Insert any default content not already present (safe to call repeatedly)"""
+        conn = self._connection()
+        existing_content = {tuple(row) for row in conn.execute(
+            'SELECT content_type, emotion_target, title FROM therapeutic_content')}
+        existing_lifestyle = {tuple(row) for row in conn.execute(
+            'SELECT emotion_target, category, recommendation FROM lifestyle_recommendations')}
+
+        content = [row for row in DEFAULT_THERAPEUTIC_CONTENT if row[:3] not in existing_content]
+        lifestyle = [row for row in DEFAULT_LIFESTYLE_RECOMMENDATIONS
+                     if (row[0], row[2], row[3]) not in existing_lifestyle]
+        with conn:
+            conn.executemany('''
+                INSERT INTO therapeutic_content
+                (content_type, emotion_target, title, description, content_url,
+                 duration_minutes, intensity_level, content_category, scientific_basis)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', content)
+            conn.executemany('''
+                INSERT INTO lifestyle_recommendations
+                (emotion_target, time_of_day, category, recommendation, duration, difficulty, scientific_basis)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', lifestyle)
+        content_index.invalidate()
+        print(f"📚 Content library: {len(content)} items and {len(lifestyle)} lifestyle tips added")
+        return {'content_added': len(content), 'lifestyle_added': len(lifestyle)}
+
+    def get_therapeutic_recommendations(self, emotion, content_types=None, limit=3):
+        """{content_type: [items]} for an emotion; the full set also includes 'lifestyle' tips"""
+        emotion = (emotion or '').lower()
+        recommendations = {
+            content_type: content_index.get_content(emotion, content_type, limit, conn=self.conn)
+            for content_type in (content_types or CONTENT_TYPES)
+        }
+        if content_types is None:
+            recommendations['lifestyle'] = content_index.get_lifestyle(emotion, conn=self.conn)
+        return recommendations
+
+    def get_lifestyle_recommendations(self, emotion, time_of_day=None, category=None, limit=3):
+        """Lifestyle tips for an emotion, optionally for one time of day or category"""
+        return content_index.get_lifestyle((emotion or '').lower(), time_of_day, category, limit, conn=self.conn)
+
+    def content_version(self):
+        """Version of the snapshot recommendations are served from (changes whenever the tables do)"""
+        return dict(content_index.snapshot(self.conn).version)
+
+    def close(self):
+        """Close database connection"""
+        if self._owns_conn and self.conn:
+            self.conn.close()
+            self.conn = None
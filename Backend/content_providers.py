@@ -0,0 +1,171 @@
+# content_providers.py - Concurrent fan-out to Spotify and YouTube with deadlines and circuit breakers
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from spotify_integration import SpotifyIntegration
+from youtube_integration import YouTubeIntegration
+
+DEFAULT_DEADLINE = 2.5        # Seconds the caller waits for all providers together
+FAILURE_THRESHOLD = 3         # Consecutive failures that open a provider's circuit
+COOLDOWN_SECONDS = 30         # How long an open circuit skips the provider
+LATENCY_WINDOW = 200          # Recent calls kept for latency percentiles
+MAX_WORKERS = 8
+
+# Search phrasing per emotion for each provider
+EMOTION_QUERIES = {
+    'sadness': {'spotify': 'comforting uplifting acoustic', 'youtube': 'self compassion meditation'},
+    'anxiety': {'spotify': 'calm ambient relaxation', 'youtube': 'breathing exercise for anxiety'},
+    'anger': {'spotify': 'calming instrumental', 'youtube': 'anger release guided relaxation'},
+    'joy': {'spotify': 'happy upbeat feel good', 'youtube': 'gratitude meditation'},
+    'neutral': {'spotify': 'focus lo-fi', 'youtube': 'mindfulness meditation 10 minutes'}
+}
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial after the cool-down"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        """Whether a call may go out now (one trial call at a time once the cool-down ends)"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class ProviderStats:
+    """Call counts and latency for one provider"""
+
+    def __init__(self):
+        self.calls = self.errors = self.timeouts = self.skipped = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.latencies.append(latency)
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            ordered = sorted(self.latencies)
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1) if ordered else None
+        return {
+            'calls': self.calls, 'errors': self.errors, 'timeouts': self.timeouts, 'skipped': self.skipped,
+            'error_rate': round(self.errors / self.calls, 3) if self.calls else 0.0,
+            'latency_p50_ms': percentile(0.5), 'latency_p95_ms': percentile(0.95)
+        }
+
+
+class ContentAggregator:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='content-provider')
+        # One client per provider; their HTTP sessions and token caches are already shared and thread-safe
+        self.spotify = SpotifyIntegration()
+        self.youtube = YouTubeIntegration()
+        self.providers = {
+            'spotify': lambda query, limit: self.spotify.search_tracks(query, limit, strict=True),
+            'youtube': lambda query, limit: self.youtube.search_videos(query, limit, with_durations=True, strict=True)
+        }
+        self.breakers = {name: CircuitBreaker() for name in self.providers}
+        self.stats = {name: ProviderStats() for name in self.providers}
+
+    def _call(self, name, query, limit, deadline):
+        """Run one provider call and feed its breaker and stats, however late it finishes"""
+        started = time.perf_counter()
+        try:
+            result = self.providers[name](query, limit)
+        except Exception:
+            self.stats[name].record(time.perf_counter() - started, error=True)
+            self.breakers[name].record_failure()
+            raise
+        elapsed = time.perf_counter() - started
+        self.stats[name].record(elapsed)
+        # A late answer was already counted against the breaker when the deadline passed
+        if elapsed <= deadline:
+            self.breakers[name].record_success()
+        return result
+
+    def fetch(self, emotion, limit=5, deadline=DEFAULT_DEADLINE):
+        """Query every provider at once; whatever has not answered by the deadline is left out"""
+        queries = EMOTION_QUERIES.get(emotion, EMOTION_QUERIES['neutral'])
+        results, status, futures = {}, {}, {}
+        for name in self.providers:
+            if not self.breakers[name].allow():
+                self.stats[name].count('skipped')
+                status[name] = 'circuit_open'
+                results[name] = []
+                continue
+            futures[self._executor.submit(self._call, name, queries[name], limit, deadline)] = name
+
+        done, pending = wait(futures, timeout=deadline)
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = future.result()
+                status[name] = 'ok'
+            except Exception as e:
+                print(f"⚠️ {name} provider error: {e}")
+                results[name] = []
+                status[name] = 'error'
+        for future in pending:
+            # The call keeps running and still reports to stats; the caller just stops waiting
+            name = futures[future]
+            self.stats[name].count('timeouts')
+            self.breakers[name].record_failure()
+            results[name] = []
+            status[name] = 'timeout'
+
+        return {
+            'results': results,
+            'providers': status,
+            'partial': any(value != 'ok' for value in status.values())
+        }
+
+    def get_stats(self):
+        """Latency, error and circuit state per provider"""
+        return {
+            name: dict(self.stats[name].snapshot(), circuit=self.breakers[name].state)
+            for name in self.providers
+        }
+
+
+# Shared by the content routes
+content_aggregator = ContentAggregator()
@@ -0,0 +1,192 @@
+# content_ranker.py - Incremental content-effectiveness bandit over therapy session mood deltas
+import math
+import threading
+import numpy as np
+from database import get_db_connection
+
+PRIOR_COUNT = 2.0           # Pseudo-sessions at reward 0 behind every content estimate
+USER_PRIOR_COUNT = 3.0      # Shrinkage of a user's own deviation towards the global estimate
+MIN_REWARD_STD = 0.1
+UCB_EXPLORATION = 1.0
+INITIAL_CAPACITY = 1024
+
+
+def session_reward(mood_before, mood_after, feedback_rating):
+    """Reward in [-1, 1]: mood change on the 0-100 scale and/or a 1-5 rating, averaged when both exist"""
+    parts = []
+    if mood_before is not None and mood_after is not None:
+        parts.append(max(-1.0, min(1.0, (mood_after - mood_before) / 50.0)))
+    if feedback_rating is not None:
+        parts.append(max(-1.0, min(1.0, (feedback_rating - 3) / 2.0)))
+    return sum(parts) / len(parts) if parts else None
+
+
+class UserEffects:
+    """One user's sessions: content ids kept sorted so lookups for a candidate vector are one searchsorted"""
+
+    __slots__ = ('ids', 'count', 'total')
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0)
+        self.total = np.zeros(0)
+
+    def add(self, content_id, reward):
+        pos = int(np.searchsorted(self.ids, content_id))
+        if pos < len(self.ids) and self.ids[pos] == content_id:
+            self.count[pos] += 1
+            self.total[pos] += reward
+        else:
+            self.ids = np.insert(self.ids, pos, content_id)
+            self.count = np.insert(self.count, pos, 1.0)
+            self.total = np.insert(self.total, pos, reward)
+
+    def gather(self, content_ids):
+        """(count, total) aligned with content_ids, zeros where the user has no sessions"""
+        count = np.zeros(len(content_ids))
+        total = np.zeros(len(content_ids))
+        if len(self.ids):
+            pos = np.minimum(np.searchsorted(self.ids, content_ids), len(self.ids) - 1)
+            hit = self.ids[pos] == content_ids
+            count[hit] = self.count[pos[hit]]
+            total[hit] = self.total[pos[hit]]
+        return count, total
+
+
+class ContentRanker:
+    """Global per-content reward sums in dense arrays indexed by content id, plus sparse per-user sums"""
+
+    def __init__(self, strategy='thompson', seed=None):
+        self.strategy = strategy
+        self.count = np.zeros(INITIAL_CAPACITY)
+        self.total = np.zeros(INITIAL_CAPACITY)
+        self.users = {}
+        self.sessions = 0
+        self.reward_sum = 0.0
+        self.reward_sq_sum = 0.0
+        self.loaded = False
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _ensure_capacity(self, content_id):
+        if content_id >= len(self.count):
+            size = max(content_id + 1, 2 * len(self.count))
+            self.count = np.concatenate([self.count, np.zeros(size - len(self.count))])
+            self.total = np.concatenate([self.total, np.zeros(size - len(self.total))])
+
+    def update(self, user_id, content_id, reward):
+        """Fold one completed session in: O(1) globally, O(sessions of this user) for the user's arrays"""
+        if content_id is None or reward is None:
+            return
+        content_id = int(content_id)
+        with self._lock:
+            self._ensure_capacity(content_id)
+            self.count[content_id] += 1
+            self.total[content_id] += reward
+            self.users.setdefault(user_id, UserEffects()).add(content_id, reward)
+            self.sessions += 1
+            self.reward_sum += reward
+            self.reward_sq_sum += reward * reward
+
+    def reward_std(self):
+        if self.sessions < 2:
+            return 0.5
+        mean = self.reward_sum / self.sessions
+        return max(MIN_REWARD_STD, math.sqrt(max(0.0, self.reward_sq_sum / self.sessions - mean * mean)))
+
+    def scores(self, user_id, content_ids, strategy=None):
+        """One score per candidate id; higher is better (Thompson draws are random by design)"""
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        with self._lock:
+            inside = content_ids < len(self.count)
+            count = np.where(inside, self.count[np.minimum(content_ids, len(self.count) - 1)], 0.0)
+            total = np.where(inside, self.total[np.minimum(content_ids, len(self.total) - 1)], 0.0)
+            user = self.users.get(user_id)
+            user_count, user_total = user.gather(content_ids) if user else (np.zeros(len(content_ids)),) * 2
+            sessions, sigma = self.sessions, self.reward_std()
+
+        # Global posterior mean with a prior at 0, and the user's shrunk deviation from it
+        mean = total / (count + PRIOR_COUNT)
+        deviation = (user_total - user_count * mean) / (user_count + USER_PRIOR_COUNT)
+        strategy = strategy or self.strategy
+        if strategy == 'ucb':
+            return mean + deviation + UCB_EXPLORATION * sigma * np.sqrt(np.log(sessions + 2.0) / (count + PRIOR_COUNT))
+        if strategy == 'random':
+            return self._rng.random(len(content_ids))
+        spread = sigma * np.sqrt(1.0 / (count + PRIOR_COUNT) + 1.0 / (user_count + USER_PRIOR_COUNT))
+        return self._rng.normal(mean + deviation, spread)
+
+    def top(self, user_id, content_ids, k, avoid=(), strategy=None):
+        """Indices into content_ids of the k best candidates, items in avoid only after all the others"""
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        if k <= 0 or not len(content_ids):
+            return []
+        scores = self.scores(user_id, content_ids, strategy)
+        if avoid:
+            scores = scores - 1e6 * np.isin(content_ids, list(avoid))
+        k = min(k, len(content_ids))
+        best = np.argpartition(-scores, k - 1)[:k]
+        return best[np.argsort(-scores[best])].tolist()
+
+    def load(self, conn=None):
+        """Fold in every completed, rated session once at startup"""
+        own_conn = conn is None
+        conn = conn or get_db_connection()
+        try:
+            rows = conn.execute('''
+                SELECT user_id, content_id, mood_before, mood_after, feedback_rating
+                FROM user_therapy_sessions
+                WHERE completed = 1 AND content_id IS NOT NULL
+                ORDER BY id
+            ''').fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+        for user_id, content_id, mood_before, mood_after, feedback_rating in rows:
+            self.update(user_id, content_id, session_reward(mood_before, mood_after, feedback_rating))
+        self.loaded = True
+        print(f"🎯 Content ranker loaded {self.sessions} rated sessions")
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._load_lock:
+                if not self.loaded:
+                    self.load()
+
+    def get_status(self):
+        with self._lock:
+            rated = int(np.count_nonzero(self.count))
+            return {'strategy': self.strategy, 'sessions': self.sessions, 'content_rated': rated,
+                    'users': len(self.users), 'reward_std': round(self.reward_std(), 3)}
+
+
+def replay_evaluate(sessions, candidates_for, strategy='thompson', seed=0):
+    """Offline replay (Li et al., 2011) over logged sessions in time order.
+
+    sessions: iterable of (user_id, emotion, content_id, reward); candidates_for(emotion, content_id)
+    returns the candidate ids the policy chooses from. Only events where the policy's pick matches the
+    logged item count and update the model, so the result estimates the policy's average reward.
+    """
+    ranker = ContentRanker(strategy, seed=seed)
+    matched, reward_total, logged_total, logged = 0, 0.0, 0.0, 0
+    for user_id, emotion, content_id, reward in sessions:
+        if reward is None:
+            continue
+        logged += 1
+        logged_total += reward
+        candidates = candidates_for(emotion, content_id)
+        if content_id not in candidates:
+            continue
+        pick = candidates[ranker.top(user_id, candidates, 1)[0]]
+        if pick == content_id:
+            matched += 1
+            reward_total += reward
+            ranker.update(user_id, content_id, reward)
+    return {'strategy': strategy, 'logged_sessions': logged, 'matched': matched,
+            'policy_reward': round(reward_total / matched, 4) if matched else None,
+            'logged_reward': round(logged_total / logged, 4) if logged else None}
+
+
+# Shared by plan generation and the session completion route
+content_ranker = ContentRanker()
@@ -1,9 +1,10 @@
 import sqlite3
 import os
 import uuid
-from datetime import datetime
+import base64
+import binascii
+from datetime import datetime, timedelta
 import json
-import timedelta
 
 # Database file path (in the same directory as your app)
 DATABASE_PATH = "mindmirror.db"
@@ -14,10 +15,19 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row  # This enables name-based access to columns
     return conn
 
+def _add_column_if_missing(conn, table, column, definition):
+    """Add a column to an existing table (CREATE TABLE IF NOT EXISTS won't)"""
+    columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
 def init_db():
     """Initialize the database with required tables"""
     conn = get_db_connection()
     try:
+        # WAL lets readers proceed while quest completions and imports write
+        conn.execute('PRAGMA journal_mode=WAL')
+        
         # Create users table (EXACTLY like your diabetes project)
         conn.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -77,7 +87,7 @@ def init_db():
         CREATE TABLE IF NOT EXISTS life_integrations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id TEXT NOT NULL,
-            integration_type TEXT NOT NULL,  -- 'sleep', 'weather', 'calendar'
+            integration_type TEXT NOT NULL,  -- 'sleep', 'weather', 'calendar', 'activity'
             data_point TEXT NOT NULL,
             mood_correlation REAL,
             recorded_date DATE DEFAULT CURRENT_DATE,
@@ -109,6 +119,137 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (user_id)
     )
 ''')
+        # One rule per (user_id, rule_type): drop legacy duplicates before the unique index
+        conn.execute('''
+    DELETE FROM digital_twin_rules WHERE id NOT IN (
+        SELECT MAX(id) FROM digital_twin_rules GROUP BY user_id, rule_type
+    )
+''')
+        conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_digital_twin_rules_user_type
+    ON digital_twin_rules (user_id, rule_type)
+''')
+
+# Digital twin rule-mining state (running sufficient statistics per user)
+        conn.execute('''
+    CREATE TABLE IF NOT EXISTS digital_twin_state (
+        user_id TEXT PRIMARY KEY,
+        last_mood_date DATE,             -- last fully processed mood day
+        stats TEXT NOT NULL,             -- JSON of accumulated matrices
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_mindmirror_entries_user_time
+    ON mindmirror_entries (user_id, timestamp)
+''')
+        # Per-user entry counts kept by triggers, so history pages never run COUNT(*)
+        counted = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_mindmirror_entries_count_insert'"
+        ).fetchone()
+        conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_entry_counts (
+        user_id TEXT PRIMARY KEY,
+        entry_count INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+''')
+        conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_mindmirror_entries_count_insert
+    AFTER INSERT ON mindmirror_entries
+    BEGIN
+        INSERT INTO user_entry_counts (user_id, entry_count) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET entry_count = entry_count + 1;
+    END
+''')
+        conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_mindmirror_entries_count_delete
+    AFTER DELETE ON mindmirror_entries
+    BEGIN
+        UPDATE user_entry_counts SET entry_count = entry_count - 1 WHERE user_id = OLD.user_id;
+    END
+''')
+        conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_mindmirror_entries_count_move
+    AFTER UPDATE OF user_id ON mindmirror_entries WHEN OLD.user_id IS NOT NEW.user_id
+    BEGIN
+        UPDATE user_entry_counts SET entry_count = entry_count - 1 WHERE user_id = OLD.user_id;
+        INSERT INTO user_entry_counts (user_id, entry_count) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET entry_count = entry_count + 1;
+    END
+''')
+        # version moves on any change to rows already written (edits, deletes, back-dated inserts),
+        # so caches of past history can tell when they are stale even if the count is unchanged
+        _add_column_if_missing(conn, 'user_entry_counts', 'version', 'INTEGER NOT NULL DEFAULT 0')
+        bump_version = '''
+        INSERT INTO user_entry_counts (user_id, entry_count, version) VALUES ({row}.user_id, 0, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+'''
+        for name, event, rows in (
+            ('backdated_insert', "INSERT ON mindmirror_entries WHEN NEW.timestamp < date('now')", ('NEW',)),
+            ('edit', 'UPDATE OF user_id, timestamp, final_emotion, mood_score ON mindmirror_entries', ('OLD', 'NEW')),
+            ('delete', 'DELETE ON mindmirror_entries', ('OLD',)),
+        ):
+            conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_mindmirror_entries_version_{name}
+    AFTER {event}
+    BEGIN
+        {''.join(bump_version.format(row=row) for row in rows)}
+    END
+''')
+        if not counted:
+            # First run with the triggers: count existing history once
+            conn.execute('''
+    INSERT OR REPLACE INTO user_entry_counts (user_id, entry_count)
+    SELECT user_id, COUNT(*) FROM mindmirror_entries GROUP BY user_id
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_life_integrations_user_date
+    ON life_integrations (user_id, recorded_date)
+''')
+        # One daily value per signal: drop legacy duplicates before the unique index
+        conn.execute('''
+    DELETE FROM life_integrations WHERE id NOT IN (
+        SELECT MAX(id) FROM life_integrations GROUP BY user_id, integration_type, recorded_date
+    )
+''')
+        conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_life_integrations_user_type_date
+    ON life_integrations (user_id, integration_type, recorded_date)
+''')
+        # Earliest signal day written since rule mining last ran, so back-dated imports trigger a recount
+        tracked = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'life_signal_changes'"
+        ).fetchone()
+        conn.execute('''
+    CREATE TABLE IF NOT EXISTS life_signal_changes (
+        user_id TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 1,
+        earliest_date TEXT NOT NULL
+    ) WITHOUT ROWID
+''')
+        mark_change = '''
+        INSERT INTO life_signal_changes (user_id, version, earliest_date)
+        VALUES ({row}.user_id, 1, COALESCE({row}.recorded_date, ''))
+        ON CONFLICT (user_id) DO UPDATE SET
+            version = version + 1,
+            earliest_date = MIN(earliest_date, excluded.earliest_date);
+'''
+        for operation, rows in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+            conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_life_integrations_{operation.lower()}_change
+    AFTER {operation} ON life_integrations
+    BEGIN
+        {''.join(mark_change.format(row=row) for row in rows)}
+    END
+''')
+        if not tracked:
+            # Signals may have been imported after the last mining run: recount every mined user once
+            conn.execute('''
+    INSERT OR IGNORE INTO life_signal_changes (user_id, version, earliest_date)
+    SELECT user_id, 1, '' FROM digital_twin_state
+''')
 
 # NEW: User predictions and forecasts
         conn.execute('''
@@ -156,6 +297,11 @@ def init_db():
         FOREIGN KEY (content_id) REFERENCES therapeutic_content (id)
     )
 ''')
+        # complete_therapy_session: latest open session for (user, content) without a scan
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_therapy_sessions_user_content_open
+    ON user_therapy_sessions (user_id, content_id, completed, id)
+''')
 
 # Lifestyle recommendations
         conn.execute('''
@@ -171,6 +317,61 @@ def init_db():
         created_date DATETIME DEFAULT CURRENT_TIMESTAMP
     )
 ''')
+        # Change counters for the content tables, so the in-memory content index knows when to reload
+        conn.execute('''
+    CREATE TABLE IF NOT EXISTS content_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+''')
+        for table in ('therapeutic_content', 'lifestyle_recommendations'):
+            conn.execute('INSERT OR IGNORE INTO content_versions (table_name, version) VALUES (?, 0)', (table,))
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_version
+    AFTER {operation} ON {table}
+    BEGIN
+        UPDATE content_versions SET version = version + 1 WHERE table_name = '{table}';
+    END
+''')
+
+        # Playback sessions (progress arrives through the write-behind buffer in playback_progress.py)
+        conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_playback_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        content_id INTEGER,
+        content_type TEXT,
+        started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        duration_planned INTEGER,
+        progress_seconds INTEGER DEFAULT 0,
+        completed BOOLEAN DEFAULT 0,
+        ended_at DATETIME,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_playback_sessions_user_content
+    ON user_playback_sessions (user_id, content_id, completed)
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_playback_sessions_user_started
+    ON user_playback_sessions (user_id, started_at)
+''')
+
+        # External API responses (YouTube/Spotify) cached across restarts
+        conn.execute('''
+    CREATE TABLE IF NOT EXISTS api_response_cache (
+        cache_key TEXT PRIMARY KEY,
+        response TEXT NOT NULL,
+        expires_at REAL NOT NULL         -- Unix time
+    )
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_api_response_cache_expires
+    ON api_response_cache (expires_at)
+''')
+
         # Quest system tables
         conn.execute('''
 CREATE TABLE IF NOT EXISTS user_quests (
@@ -187,8 +388,24 @@ CREATE TABLE IF NOT EXISTS user_quests (
     completed BOOLEAN DEFAULT FALSE,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     completed_at DATETIME,
+    quest_date DATE,
     FOREIGN KEY (user_id) REFERENCES users (user_id)
 )
+''')
+        _add_column_if_missing(conn, 'user_quests', 'quest_date', 'DATE')
+        conn.execute("UPDATE user_quests SET quest_date = date(created_at) WHERE quest_date IS NULL")
+        conn.execute('''
+    DELETE FROM user_quests WHERE id NOT IN (
+        SELECT MAX(id) FROM user_quests GROUP BY user_id, quest_id
+    )
+''')
+        conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_user_quests_user_quest
+    ON user_quests (user_id, quest_id)
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_quests_user_date
+    ON user_quests (user_id, quest_date)
 ''')
 
         conn.execute('''
@@ -197,11 +414,33 @@ CREATE TABLE IF NOT EXISTS user_progress (
     user_id TEXT UNIQUE NOT NULL,
     points INTEGER DEFAULT 0,
     level INTEGER DEFAULT 1,
-    streak_days INTEGER DEFAULT 0,
+    streak_days INTEGER DEFAULT 0,   -- consecutive active days ending at streak_through
+    streak_through DATE,             -- last day folded in by the nightly streak rollover
+    total_quests_completed INTEGER DEFAULT 0,
+    quests_completed_today INTEGER DEFAULT 0,
+    completed_today_date DATE,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users (user_id)
 )
 ''')
+        # Denormalized quest counters: added NULL on old databases, then backfilled once
+        _add_column_if_missing(conn, 'user_progress', 'total_quests_completed', 'INTEGER')
+        _add_column_if_missing(conn, 'user_progress', 'quests_completed_today', 'INTEGER')
+        _add_column_if_missing(conn, 'user_progress', 'completed_today_date', 'DATE')
+        today = datetime.now().date().isoformat()
+        conn.execute('''
+    UPDATE user_progress SET
+        total_quests_completed = (
+            SELECT COUNT(*) FROM user_quests q
+            WHERE q.user_id = user_progress.user_id AND q.completed = 1
+        ),
+        quests_completed_today = (
+            SELECT COUNT(*) FROM user_quests q
+            WHERE q.user_id = user_progress.user_id AND q.completed = 1 AND q.quest_date = ?
+        ),
+        completed_today_date = ?
+    WHERE total_quests_completed IS NULL
+''', (today, today))
 
         conn.execute('''
 CREATE TABLE IF NOT EXISTS point_transactions (
@@ -209,11 +448,78 @@ CREATE TABLE IF NOT EXISTS point_transactions (
     user_id TEXT NOT NULL,
     points INTEGER NOT NULL,
     reason TEXT NOT NULL,
+    ref TEXT,                        -- idempotency key, e.g. 'quest:<user>:<quest_id>'
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users (user_id)
 )
+''')
+        _add_column_if_missing(conn, 'point_transactions', 'ref', 'TEXT')
+        conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_point_transactions_ref
+    ON point_transactions (ref) WHERE ref IS NOT NULL
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_point_transactions_created
+    ON point_transactions (created_at)
+''')
+
+        # Streaks: one row per user per active day, rolled into user_progress nightly
+        conn.execute('''
+CREATE TABLE IF NOT EXISTS user_activity_days (
+    user_id TEXT NOT NULL,
+    activity_date DATE NOT NULL,
+    PRIMARY KEY (user_id, activity_date)
+) WITHOUT ROWID
+''')
+        _add_column_if_missing(conn, 'user_progress', 'streak_through', 'DATE')
+        if not conn.execute('SELECT 1 FROM user_activity_days LIMIT 1').fetchone():
+            conn.execute('''
+    INSERT OR IGNORE INTO user_activity_days (user_id, activity_date)
+    SELECT DISTINCT user_id, date(timestamp) FROM mindmirror_entries WHERE timestamp IS NOT NULL
+    UNION
+    SELECT DISTINCT user_id, quest_date FROM user_quests WHERE completed = 1 AND quest_date IS NOT NULL
+''')
+        # Rows from before the rollover existed: seed them so its first pass extends instead of restarting
+        if conn.execute('SELECT 1 FROM user_progress WHERE streak_through IS NULL LIMIT 1').fetchone():
+            seed_streaks(conn, (datetime.now().date() - timedelta(days=1)).isoformat())
+
+        # Ledger snapshots: balance per user as of a ledger checkpoint id
+        conn.execute('''
+CREATE TABLE IF NOT EXISTS point_balance_snapshots (
+    user_id TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL,
+    checkpoint_id INTEGER NOT NULL,  -- last point_transactions.id included
+    snapshot_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+)
 ''')
 
+        conn.execute('''
+CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    checkpoint_id INTEGER NOT NULL,
+    users_updated INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+''')
+
+        # Compacted history: old point_transactions folded into daily totals
+        conn.execute('''
+CREATE TABLE IF NOT EXISTS point_transaction_rollups (
+    user_id TEXT NOT NULL,
+    day DATE NOT NULL,
+    points INTEGER NOT NULL,
+    transactions INTEGER NOT NULL,
+    first_id INTEGER,
+    last_id INTEGER,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+)
+''')
+        conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_point_rollups_day
+    ON point_transaction_rollups (day)
+''')
 
         
         conn.commit()
@@ -271,12 +577,71 @@ def create_mindmirror_entry(conn, user_id, journal_text, text_emotion, text_conf
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (user_id, journal_text, text_emotion, text_confidence,
               audio_emotion, audio_confidence, final_emotion, audio_file_path, mood_score))
+        record_activity_day(conn, user_id)
         conn.commit()
         return True
     except Exception as e:
         print(f"Error creating mindmirror entry: {e}")
         return False
 
+def create_playback_session(conn, user_id, content_id, content_type, duration_planned):
+    """Open a playback session row that progress updates will target; returns its id"""
+    session_id = conn.execute('''
+        INSERT INTO user_playback_sessions (user_id, content_id, content_type, started_at, duration_planned)
+        VALUES (?, ?, ?, datetime('now'), ?)
+    ''', (user_id, content_id, content_type, duration_planned)).lastrowid
+    conn.commit()
+    return session_id
+
+def get_open_playback_session(conn, user_id, content_id):
+    """Id of the user's latest open playback session for this content, or None"""
+    row = conn.execute('''
+        SELECT id FROM user_playback_sessions
+        WHERE user_id = ? AND content_id = ? AND completed = 0
+        ORDER BY id DESC LIMIT 1
+    ''', (user_id, content_id)).fetchone()
+    return row[0] if row else None
+
+def record_activity_day(conn, user_id, activity_date=None):
+    """Mark a user active on a day for streaks (caller commits)"""
+    conn.execute(
+        'INSERT OR IGNORE INTO user_activity_days (user_id, activity_date) VALUES (?, ?)',
+        (user_id, activity_date or datetime.now().date().isoformat())
+    )
+
+def seed_streaks(conn, through_date):
+    """Set streaks lagging behind through_date from the activity history in one pass (caller commits)"""
+    # Consecutive days share julianday - row number, so the run ending at through_date is one island
+    conn.execute('''
+        WITH runs AS (
+            SELECT user_id, activity_date,
+                   julianday(activity_date) - ROW_NUMBER() OVER (
+                       PARTITION BY user_id ORDER BY activity_date) AS island
+            FROM user_activity_days
+            WHERE activity_date <= :day
+        ),
+        current_runs AS (
+            SELECT r.user_id, COUNT(*) AS days, MIN(r.activity_date) AS run_start
+            FROM runs r
+            JOIN runs last ON last.user_id = r.user_id AND last.island = r.island
+                          AND last.activity_date = :day
+            GROUP BY r.user_id
+        )
+        UPDATE user_progress SET
+            streak_days = COALESCE((
+                SELECT CASE
+                    -- Never rolled over and active since the first recorded day: the legacy
+                    -- counter may cover days from before activity was recorded, keep the larger
+                    WHEN user_progress.streak_through IS NULL AND c.run_start = (
+                        SELECT MIN(activity_date) FROM user_activity_days a WHERE a.user_id = c.user_id)
+                    THEN MAX(c.days, COALESCE(user_progress.streak_days, 0))
+                    ELSE c.days
+                END
+                FROM current_runs c WHERE c.user_id = user_progress.user_id), 0),
+            streak_through = :day
+        WHERE streak_through IS NULL OR streak_through < :day
+    ''', {'day': through_date})
+
 def get_user_mindmirror_entries(conn, user_id, limit=5):
     """Get mental health entries for a user (latest first)"""
     if limit == 0:
@@ -294,6 +659,58 @@ def get_user_mindmirror_entries(conn, user_id, limit=5):
             ORDER BY timestamp DESC 
             LIMIT ?
         ''', (user_id, limit)).fetchall()
+def get_entry_count(conn, user_id):
+    """Total entries for a user from the trigger-maintained counter"""
+    row = conn.execute('SELECT entry_count FROM user_entry_counts WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+def get_entry_counter(conn, user_id):
+    """(entry count, change version) for a user from the trigger-maintained counter"""
+    row = conn.execute('SELECT entry_count, version FROM user_entry_counts WHERE user_id = ?', (user_id,)).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+def encode_entry_cursor(entry):
+    """Opaque keyset cursor for the position after this entry"""
+    raw = json.dumps([entry['timestamp'], entry['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_entry_cursor(cursor):
+    """(timestamp, id) from encode_entry_cursor; ValueError if it was tampered with"""
+    try:
+        timestamp, entry_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(timestamp, str) or not isinstance(entry_id, int):
+        raise ValueError('Invalid cursor')
+    return timestamp, entry_id
+
+def get_entries_page(conn, user_id, limit=20, cursor=None, start_date=None, end_date=None):
+    """One page of entries, latest first, by keyset on (timestamp, id).
+
+    Each page is an index range seek from the cursor, so page 1000 costs the same as page 1.
+    Dates are inclusive YYYY-MM-DD bounds compared as strings so the index still applies.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    clauses, params = ['user_id = ?'], [user_id]
+    if start_date:
+        clauses.append('timestamp >= ?')
+        params.append(datetime.strptime(start_date, '%Y-%m-%d').strftime('%Y-%m-%d'))
+    if end_date:
+        clauses.append('timestamp < ?')
+        params.append((datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+    if cursor:
+        clauses.append('(timestamp, id) < (?, ?)')
+        params.extend(decode_entry_cursor(cursor))
+    rows = conn.execute(f'''
+        SELECT * FROM mindmirror_entries
+        WHERE {' AND '.join(clauses)}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], encode_entry_cursor(rows[limit - 1])
+    return rows, None
+
 def get_entries_by_date_range(conn, user_id, start_date, end_date):
     """Get entries for a specific date range"""
     return conn.execute('''
@@ -381,6 +798,10 @@ def create_digital_twin_rule(conn, user_id, rule_type, condition, outcome, confi
         conn.execute('''
             INSERT INTO digital_twin_rules (user_id, rule_type, condition, outcome, confidence)
             VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, rule_type) DO UPDATE SET
+                condition = excluded.condition,
+                outcome = excluded.outcome,
+                confidence = excluded.confidence
         ''', (user_id, rule_type, condition, outcome, confidence))
         conn.commit()
         return True
@@ -388,6 +809,24 @@ def create_digital_twin_rule(conn, user_id, rule_type, condition, outcome, confi
         print(f"Error creating digital twin rule: {e}")
         return False
 
+def upsert_digital_twin_rules(conn, user_id, rules):
+    """Insert or update digital twin rules keyed by (user_id, rule_type)"""
+    try:
+        conn.executemany('''
+            INSERT INTO digital_twin_rules (user_id, rule_type, condition, outcome, confidence)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, rule_type) DO UPDATE SET
+                condition = excluded.condition,
+                outcome = excluded.outcome,
+                confidence = excluded.confidence
+        ''', [(user_id, rule['type'], rule['condition'], rule['outcome'], rule['confidence'])
+              for rule in rules])
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error upserting digital twin rules: {e}")
+        return False
+
 def get_digital_twin_rules(conn, user_id, rule_type=None):
     """Get digital twin rules for a user"""
     if rule_type:
@@ -445,25 +884,17 @@ def create_therapeutic_content(conn, content_type, emotion_target, title, descri
         ''', (content_type, emotion_target, title, description, content_url,
               duration_minutes, intensity_level, content_category, scientific_basis))
         conn.commit()
+        from content_index import content_index
+        content_index.invalidate()
         return True
     except Exception as e:
         print(f"Error creating therapeutic content: {e}")
         return False
 
 def get_content_by_emotion(conn, emotion_target, content_type=None, limit=5):
-    """Get therapeutic content for specific emotion"""
-    if content_type:
-        return conn.execute('''
-            SELECT * FROM therapeutic_content 
-            WHERE emotion_target = ? AND content_type = ?
-            ORDER BY RANDOM() LIMIT ?
-        ''', (emotion_target, content_type, limit)).fetchall()
-    else:
-        return conn.execute('''
-            SELECT * FROM therapeutic_content 
-            WHERE emotion_target = ?
-            ORDER BY RANDOM() LIMIT ?
-        ''', (emotion_target, limit)).fetchall()
+    """Get therapeutic content for specific emotion (random sample from the in-memory content index)"""
+    from content_index import content_index
+    return content_index.get_content(emotion_target, content_type, limit, conn=conn)
 
 def create_therapy_session(conn, user_id, emotion_detected, content_id=None, session_type='immediate_relief'):
     """Record therapy session"""
@@ -479,22 +910,24 @@ def create_therapy_session(conn, user_id, emotion_detected, content_id=None, ses
         print(f"Error creating therapy session: {e}")
         return False
 
+def complete_therapy_session(conn, user_id, content_id, mood_before=None, mood_after=None, feedback_rating=None):
+    """Close the user's latest open session for this content with its outcome; False if none is open"""
+    updated = conn.execute('''
+        UPDATE user_therapy_sessions
+        SET completed = 1, mood_before = ?, mood_after = ?, feedback_rating = ?
+        WHERE id = (
+            SELECT id FROM user_therapy_sessions
+            WHERE user_id = ? AND content_id = ? AND completed = 0
+            ORDER BY id DESC LIMIT 1
+        )
+    ''', (mood_before, mood_after, feedback_rating, user_id, content_id)).rowcount
+    conn.commit()
+    return updated > 0
+
 def get_lifestyle_recommendations(conn, emotion_target, time_of_day=None, category=None):
-    """Get lifestyle recommendations"""
-    query = 'SELECT * FROM lifestyle_recommendations WHERE emotion_target = ?'
-    params = [emotion_target]
-    
-    if time_of_day:
-        query += ' AND time_of_day = ?'
-        params.append(time_of_day)
-    
-    if category:
-        query += ' AND category = ?'
-        params.append(category)
-    
-    query += ' ORDER BY RANDOM() LIMIT 3'
-    
-    return conn.execute(query, params).fetchall()
+    """Get lifestyle recommendations (random sample from the in-memory content index)"""
+    from content_index import content_index
+    return content_index.get_lifestyle(emotion_target, time_of_day, category, conn=conn)
 
 # Initialize the database when this module is imported
 init_db()
\ No newline at end of file
@@ -3,6 +3,7 @@
 import json
 from datetime import datetime, timedelta
 from database import get_db_connection
+from rule_miner import RuleMiner, MIN_SAMPLES
 
 class DigitalTwin:
     def __init__(self):
@@ -72,51 +73,20 @@ class DigitalTwin:
         print(f"✅ Simulation complete: {base_mood} → {simulation_results['predicted_mood']}")
         return simulation_results
     
-    def learn_user_rules(self, user_id):
-        """Learn personalized rules from user data"""
+    def learn_user_rules(self, user_id, full_rebuild=False):
+        """Learn personalized rules from user data and life integration signals"""
         print(f"🧠 Learning rules for user {user_id}")
         
-        entries = self.conn.execute('''
-            SELECT * FROM mindmirror_entries 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC LIMIT 50
-        ''', (user_id,)).fetchall()
+        miner = RuleMiner(self.conn)
+        rules, days_analyzed = miner.mine_rules(user_id, full_rebuild=full_rebuild)
         
-        if len(entries) < 10:
+        if not rules and days_analyzed < MIN_SAMPLES:
             return {"message": "Need more data to learn patterns"}
         
-        rules = []
-        
-        # Example rule learning (simplified)
-        # In a real system, this would use ML to detect correlations
-        
-        rules.append({
-            'type': 'consistency_boost',
-            'condition': 'Regular daily entries',
-            'outcome': 'Mood stability +10 points',
-            'confidence': 0.75
-        })
-        
-        rules.append({
-            'type': 'weekend_effect',
-            'condition': 'Friday to Monday transition',
-            'outcome': 'Typical mood variation detected',
-            'confidence': 0.65
-        })
-        
-        # Store learned rules
-        for rule in rules:
-            self.conn.execute('''
-                INSERT OR REPLACE INTO digital_twin_rules 
-                (user_id, rule_type, condition, outcome, confidence)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, rule['type'], rule['condition'], rule['outcome'], rule['confidence']))
-        
-        self.conn.commit()
-        
         return {
             'rules_learned': len(rules),
             'rules': rules,
+            'days_analyzed': days_analyzed,
             'message': f"Learned {len(rules)} personalized patterns"
         }
     
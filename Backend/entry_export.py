@@ -0,0 +1,105 @@
+# entry_export.py - Streaming CSV/NDJSON export of a user's journal history, gzipped on the fly
+import io
+import csv
+import json
+import zlib
+from datetime import datetime
+from flask import request, Response
+from database import get_db_connection
+
+FETCH_CHUNK = 500           # Rows pulled from the cursor per yielded chunk
+GZIP_LEVEL = 6
+
+# (CSV header, column). Unlike the old browser-built CSV (7 columns, confidences as percentages), this
+# adds the text and audio emotions and keeps confidences as raw 0-1 values, as stored
+EXPORT_COLUMNS = [
+    ('Date', 'timestamp'),
+    ('Journal Text', 'journal_text'),
+    ('Final Emotion', 'final_emotion'),
+    ('Text Emotion', 'text_emotion'),
+    ('Text Confidence', 'text_confidence'),
+    ('Audio Emotion', 'audio_emotion'),
+    ('Audio Confidence', 'audio_confidence'),
+    ('Mood Score', 'mood_score'),
+    ('Audio File', 'audio_file_path'),
+]
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    """Spreadsheet-safe cell: journal text starting with = or + must not run as a formula"""
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_entry_rows(user_id, chunk_size=FETCH_CHUNK):
+    """Yield lists of up to chunk_size rows, latest first, from one read so the export is consistent"""
+    conn = get_db_connection()
+    try:
+        columns = ', '.join(column for _, column in EXPORT_COLUMNS)
+        cursor = conn.execute(f'''
+            SELECT {columns} FROM mindmirror_entries
+            WHERE user_id = ?
+            ORDER BY timestamp DESC, id DESC
+        ''', (user_id,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def _csv_chunks(user_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for rows in iter_entry_rows(user_id):
+        writer.writerows([_csv_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')     # Header only: the user has no entries
+
+
+def _ndjson_chunks(user_id):
+    keys = [column for _, column in EXPORT_COLUMNS]
+    for rows in iter_entry_rows(user_id):
+        yield ''.join(json.dumps(dict(zip(keys, row)), ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+
+def _gzip_stream(chunks):
+    """Compress as we go; a sync flush per chunk lets the browser start writing the file immediately"""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)     # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(user_id, export_format='csv'):
+    """Streaming attachment response; memory use is one fetch chunk whatever the history size"""
+    if export_format not in EXPORT_FORMATS:
+        return None
+    chunks = _csv_chunks(user_id) if export_format == 'csv' else _ndjson_chunks(user_id)
+    filename = f"mindmirror_full_history_{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'private, no-store',
+        'Vary': 'Accept-Encoding',
+        'X-Content-Type-Options': 'nosniff',
+    }
+    if request.accept_encodings['gzip'] > 0:
+        chunks = _gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, headers=headers, content_type=EXPORT_FORMATS[export_format])
@@ -0,0 +1,324 @@
+# leaderboard.py - Points leaderboards backed by an in-memory order-statistics index
+import threading
+from datetime import datetime, timedelta
+from database import get_db_connection
+
+WEEKS_CACHED = 4    # Weekly boards kept in memory (current week plus recent history)
+
+
+class _Ties:
+    """Users sharing one score: a sparse Fenwick tree over user ordinals, O(log n) per operation"""
+
+    __slots__ = ('tree', 'size')
+
+    def __init__(self):
+        self.tree = {}      # Fenwick node -> count; only nodes covering a member are stored
+        self.size = 0
+
+    def add(self, ordinal, delta, capacity):
+        i = ordinal + 1
+        while i <= capacity:
+            count = self.tree.get(i, 0) + delta
+            if count:
+                self.tree[i] = count
+            else:
+                del self.tree[i]
+            i += i & -i
+        self.size += delta
+
+    def before(self, ordinal):
+        """Members ordered ahead of ordinal"""
+        i = ordinal
+        count = 0
+        while i > 0:
+            count += self.tree.get(i, 0)
+            i -= i & -i
+        return count
+
+    def kth(self, k, capacity):
+        """Ordinal of the k-th member (1-based), by binary lifting"""
+        pos = 0
+        step = capacity
+        while step:
+            count = self.tree.get(pos + step, 0)
+            if pos + step <= capacity and count < k:
+                pos += step
+                k -= count
+            step //= 2
+        return pos
+
+
+class RankIndex:
+    """Fenwick tree over point values; ties are ordered by a stable per-user ordinal (first seen)"""
+
+    def __init__(self, size=1024):
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+        self.total = 0
+        self.scores = {}
+        self.buckets = {}       # score -> _Ties
+        self.ordinals = {}      # key -> tie-break ordinal, kept when the key moves or leaves
+        self.keys = []          # ordinal -> key
+        self.ordinal_size = 1024
+        self.watermark = 0      # Highest ledger id already reflected in the scores
+
+    def _add(self, value, delta):
+        """Adjust the count stored for one point value"""
+        i = value + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _count_at_most(self, value):
+        """Number of users with score <= value"""
+        i = min(value, self.size - 1) + 1
+        count = 0
+        while i > 0:
+            count += self.tree[i]
+            i -= i & -i
+        return count
+
+    def _kth_smallest(self, k):
+        """Score of the k-th smallest entry (1-based), by binary lifting"""
+        pos = 0
+        step = self.size
+        while step:
+            if pos + step <= self.size and self.tree[pos + step] < k:
+                pos += step
+                k -= self.tree[pos]
+            step //= 2
+        return pos
+
+    def _grow(self, value):
+        """Double capacity until value fits, rebuilding the tree in linear time"""
+        while self.size <= value:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+        for score, bucket in self.buckets.items():
+            self.tree[score + 1] += bucket.size
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def _ordinal(self, key):
+        """Stable ordinal for a key; doubling the capacity only adds the new root node"""
+        ordinal = self.ordinals.get(key)
+        if ordinal is None:
+            ordinal = self.ordinals[key] = len(self.keys)
+            self.keys.append(key)
+            while self.ordinal_size <= ordinal:
+                for bucket in self.buckets.values():
+                    if self.ordinal_size in bucket.tree:
+                        bucket.tree[self.ordinal_size * 2] = bucket.tree[self.ordinal_size]
+                self.ordinal_size *= 2
+        return ordinal
+
+    def set(self, key, score):
+        """Insert or move a user to a new score"""
+        score = max(0, int(score))
+        old = self.scores.get(key)
+        if old == score:
+            return
+        if old is not None:
+            self.remove(key)
+        if score >= self.size:
+            self._grow(score)
+        self.scores[key] = score
+        bucket = self.buckets.get(score)
+        if bucket is None:
+            bucket = self.buckets[score] = _Ties()
+        bucket.add(self._ordinal(key), 1, self.ordinal_size)
+        self._add(score, 1)
+        self.total += 1
+
+    def add(self, key, delta):
+        """Increase a user's score by delta"""
+        self.set(key, self.scores.get(key, 0) + delta)
+
+    def remove(self, key):
+        """Drop a user from the index"""
+        score = self.scores.pop(key, None)
+        if score is None:
+            return
+        bucket = self.buckets[score]
+        bucket.add(self.ordinals[key], -1, self.ordinal_size)
+        if not bucket.size:
+            del self.buckets[score]
+        self._add(score, -1)
+        self.total -= 1
+
+    def rank(self, key):
+        """(rank, position) of a user: rank is shared by ties, position is unique"""
+        score = self.scores.get(key)
+        if score is None:
+            return None, None
+        greater = self.total - self._count_at_most(score)
+        return greater + 1, greater + self.buckets[score].before(self.ordinals[key]) + 1
+
+    def entries(self, position, count):
+        """Up to count (key, score, rank) entries starting at a 1-based position"""
+        results = []
+        position = max(1, position)
+        while len(results) < count and position <= self.total:
+            score = self._kth_smallest(self.total - position + 1)
+            bucket = self.buckets[score]
+            greater = self.total - self._count_at_most(score)
+            offset = position - greater - 1
+            for k in range(offset + 1, min(bucket.size, offset + count - len(results)) + 1):
+                results.append((self.keys[bucket.kth(k, self.ordinal_size)], score, greater + 1))
+            position = greater + bucket.size + 1
+        return results
+
+
+def week_key(moment=None):
+    """ISO week label (e.g. '2025-W07') for a UTC moment"""
+    year, week, _ = (moment or datetime.utcnow()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _week_range(key):
+    """UTC [start, end) datetimes of an ISO week label"""
+    start = datetime.strptime(key + '-1', '%G-W%V-%u')
+    return start, start + timedelta(days=7)
+
+
+class Leaderboards:
+    """Process-wide global and weekly boards, loaded once and updated as points are awarded"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.global_index = None
+        self.global_watermark = 0
+        self.versions = {}
+        self.weekly = {}
+
+    def ensure_loaded(self, conn=None):
+        """Build the global index from user_progress on first use"""
+        if self.global_index is not None:
+            return
+        with self._lock:
+            if self.global_index is not None:
+                return
+            own_conn = conn is None
+            conn = conn or get_db_connection()
+            try:
+                # One read snapshot so the ledger watermark matches the balances
+                conn.execute('BEGIN')
+                watermark = conn.execute('SELECT COALESCE(MAX(id), 0) FROM point_transactions').fetchone()[0]
+                # Ordinals are handed out in this order, so ties start out in user_id order
+                rows = conn.execute('SELECT user_id, points FROM user_progress ORDER BY user_id').fetchall()
+                conn.commit()
+            finally:
+                if own_conn:
+                    conn.close()
+
+            index = RankIndex(max((row[1] or 0 for row in rows), default=0) + 1)
+            for user_id, points in rows:
+                index.set(user_id, points or 0)
+            self.global_watermark = watermark
+            self.global_index = index
+            print(f"🏆 Leaderboard loaded with {index.total} users")
+
+    def _ensure_week(self, key, conn=None):
+        """Load one week's board from the ledger if it is not cached"""
+        index = self.weekly.get(key)
+        if index is not None:
+            return index
+        start, end = _week_range(key)
+        own_conn = conn is None
+        conn = conn or get_db_connection()
+        try:
+            conn.execute('BEGIN')
+            watermark = conn.execute('SELECT COALESCE(MAX(id), 0) FROM point_transactions').fetchone()[0]
+            # Older weeks may have been compacted into daily rollups
+            rows = conn.execute('''
+                SELECT user_id, SUM(points) FROM (
+                    SELECT user_id, points FROM point_transactions
+                    WHERE created_at >= ? AND created_at < ? AND id <= ?
+                    UNION ALL
+                    SELECT user_id, points FROM point_transaction_rollups
+                    WHERE day >= ? AND day < ?
+                )
+                GROUP BY user_id
+                ORDER BY user_id
+            ''', (start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S'), watermark,
+                  start.date().isoformat(), end.date().isoformat())).fetchall()
+            conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+
+        index = RankIndex(max((row[1] or 0 for row in rows), default=0) + 1)
+        for user_id, points in rows:
+            index.set(user_id, points or 0)
+        index.watermark = watermark
+        self.weekly[key] = index
+        while len(self.weekly) > WEEKS_CACHED:
+            self.weekly.pop(min(self.weekly))
+        return index
+
+    def record_award(self, user_id, total_points, points, ledger_id):
+        """Apply a committed award; ledger ids make late or repeated calls harmless"""
+        with self._lock:
+            if self.global_index is not None and ledger_id > self.versions.get(user_id, self.global_watermark):
+                self.global_index.set(user_id, total_points)
+                self.versions[user_id] = ledger_id
+            index = self.weekly.get(week_key())
+            if index is not None and ledger_id > index.watermark:
+                index.add(user_id, points)
+
+    def top(self, limit=10):
+        """Global top-K as (user_id, points, rank)"""
+        self.ensure_loaded()
+        with self._lock:
+            return self.global_index.entries(1, limit)
+
+    def user_rank(self, user_id):
+        """A user's global rank, points and the number of ranked users"""
+        self.ensure_loaded()
+        with self._lock:
+            rank, _ = self.global_index.rank(user_id)
+            return {
+                'rank': rank,
+                'points': self.global_index.scores.get(user_id, 0),
+                'total_users': self.global_index.total
+            }
+
+    def around(self, user_id, radius=2):
+        """Entries within radius positions of a user"""
+        self.ensure_loaded()
+        with self._lock:
+            _, position = self.global_index.rank(user_id)
+            if position is None:
+                return []
+            return self.global_index.entries(position - radius, 2 * radius + 1)
+
+    def weekly_top(self, limit=10, week=None):
+        """Top-K points earned within an ISO week (default: current week)"""
+        with self._lock:
+            return self._ensure_week(week or week_key()).entries(1, limit)
+
+    def reset(self):
+        """Drop in-memory boards so they reload from the database"""
+        with self._lock:
+            self.global_index = None
+            self.versions = {}
+            self.weekly = {}
+
+
+def get_display_names(conn, user_ids):
+    """First names for leaderboard rows (user ids double as login credentials, never expose them)"""
+    if not user_ids:
+        return {}
+    placeholders = ','.join('?' * len(user_ids))
+    rows = conn.execute(
+        f'SELECT user_id, full_name FROM users WHERE user_id IN ({placeholders})', list(user_ids)
+    ).fetchall()
+    return {row[0]: (row[1] or 'Anonymous').split()[0] for row in rows}
+
+
+# Shared by QuestSystem (updates) and the leaderboard API (reads)
+leaderboards = Leaderboards()
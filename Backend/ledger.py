@@ -0,0 +1,156 @@
+# ledger.py - Balance snapshots, compaction and audit for the points ledger
+from datetime import datetime, timedelta
+from database import get_db_connection
+
+RETENTION_DAYS = 90       # Raw point_transactions kept this long, older rows become daily rollups
+COMPACT_CHUNK = 5000      # Ledger rows folded per compaction transaction
+
+
+class PointsLedger:
+    def __init__(self, conn=None):
+        self.conn = conn or get_db_connection()
+        self._owns_conn = conn is None
+
+    def latest_checkpoint(self):
+        """Ledger id covered by the most recent balance snapshot (0 if none)"""
+        row = self.conn.execute('SELECT COALESCE(MAX(checkpoint_id), 0) FROM ledger_checkpoints').fetchone()
+        return row[0]
+
+    def snapshot_balances(self):
+        """Fold ledger rows since the last checkpoint into per-user balance snapshots"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            old_checkpoint = self.latest_checkpoint()
+            new_checkpoint = self.conn.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM point_transactions'
+            ).fetchone()[0]
+            if new_checkpoint <= old_checkpoint:
+                self.conn.rollback()
+                return {'checkpoint_id': old_checkpoint, 'users_updated': 0}
+
+            # Only the tail since the previous checkpoint is read, via the primary key range
+            cursor = self.conn.execute('''
+                INSERT INTO point_balance_snapshots (user_id, balance, checkpoint_id, snapshot_at)
+                SELECT user_id, SUM(points), ?, datetime('now')
+                FROM point_transactions
+                WHERE id > ? AND id <= ?
+                GROUP BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET
+                    balance = point_balance_snapshots.balance + excluded.balance,
+                    checkpoint_id = excluded.checkpoint_id,
+                    snapshot_at = excluded.snapshot_at
+            ''', (new_checkpoint, old_checkpoint, new_checkpoint))
+            users_updated = cursor.rowcount
+
+            self.conn.execute('''
+                INSERT INTO ledger_checkpoints (checkpoint_id, users_updated, created_at)
+                VALUES (?, ?, datetime('now'))
+            ''', (new_checkpoint, users_updated))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        print(f"📒 Ledger checkpoint {new_checkpoint}: {users_updated} balances snapshotted")
+        return {'checkpoint_id': new_checkpoint, 'users_updated': users_updated}
+
+    def compact(self, retention_days=RETENTION_DAYS, chunk_size=COMPACT_CHUNK):
+        """Roll transactions older than the retention horizon into daily per-user totals"""
+        horizon = (datetime.utcnow() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+        # Never compact past the checkpoint, so snapshot + tail always covers every point
+        checkpoint = self.latest_checkpoint()
+        compacted = 0
+
+        while True:
+            upper = self.conn.execute('''
+                SELECT MAX(id) FROM (
+                    SELECT id FROM point_transactions
+                    WHERE id <= ? AND created_at < ?
+                    ORDER BY id LIMIT ?
+                )
+            ''', (checkpoint, horizon, chunk_size)).fetchone()[0]
+            if upper is None:
+                break
+
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute('''
+                    INSERT INTO point_transaction_rollups
+                    (user_id, day, points, transactions, first_id, last_id)
+                    SELECT user_id, date(created_at), SUM(points), COUNT(*), MIN(id), MAX(id)
+                    FROM point_transactions
+                    WHERE id <= ? AND created_at < ?
+                    GROUP BY user_id, date(created_at)
+                    ON CONFLICT (user_id, day) DO UPDATE SET
+                        points = point_transaction_rollups.points + excluded.points,
+                        transactions = point_transaction_rollups.transactions + excluded.transactions,
+                        first_id = MIN(point_transaction_rollups.first_id, excluded.first_id),
+                        last_id = MAX(point_transaction_rollups.last_id, excluded.last_id)
+                ''', (upper, horizon))
+                # Dropping old refs is safe: their quests are already marked completed
+                deleted = self.conn.execute('''
+                    DELETE FROM point_transactions WHERE id <= ? AND created_at < ?
+                ''', (upper, horizon)).rowcount
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            compacted += deleted
+
+        print(f"📒 Compacted {compacted} ledger rows older than {retention_days} days")
+        return {'rows_compacted': compacted, 'horizon': horizon}
+
+    def verify_balances(self):
+        """Recompute balances as snapshot + tail and report users whose stored points drifted"""
+        # One read snapshot so the checkpoint, tail and balances agree
+        self.conn.execute('BEGIN')
+        try:
+            checkpoint = self.latest_checkpoint()
+            drift = self.conn.execute('''
+                SELECT p.user_id, p.points AS stored,
+                       COALESCE(s.balance, 0) + COALESCE(t.tail, 0) AS expected
+                FROM user_progress p
+                LEFT JOIN point_balance_snapshots s ON s.user_id = p.user_id
+                LEFT JOIN (
+                    SELECT user_id, SUM(points) AS tail
+                    FROM point_transactions
+                    WHERE id > ?
+                    GROUP BY user_id
+                ) t ON t.user_id = p.user_id
+                WHERE p.points != COALESCE(s.balance, 0) + COALESCE(t.tail, 0)
+            ''', (checkpoint,)).fetchall()
+            users_checked = self.conn.execute('SELECT COUNT(*) FROM user_progress').fetchone()[0]
+        finally:
+            self.conn.commit()
+
+        mismatches = [
+            {'user_id': row['user_id'], 'stored': row['stored'], 'expected': row['expected']}
+            for row in drift
+        ]
+        if mismatches:
+            print(f"❌ Ledger drift for {len(mismatches)} of {users_checked} users")
+        else:
+            print(f"✅ Ledger verified for {users_checked} users at checkpoint {checkpoint}")
+        return {'checkpoint_id': checkpoint, 'users_checked': users_checked, 'mismatches': mismatches}
+
+    def run_maintenance(self):
+        """Nightly job: snapshot, compact, then verify"""
+        return {
+            'snapshot': self.snapshot_balances(),
+            'compaction': self.compact(),
+            'verification': self.verify_balances()
+        }
+
+    def close(self):
+        """Close database connection"""
+        if self._owns_conn and self.conn:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    ledger = PointsLedger()
+    try:
+        result = ledger.run_maintenance()
+        print(f"📒 {len(result['verification']['mismatches'])} mismatches")
+    finally:
+        ledger.close()
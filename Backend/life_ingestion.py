@@ -0,0 +1,245 @@
+# life_ingestion.py - Bulk import of local sleep/calendar/activity exports into life_integrations
+import os
+import io
+import csv
+import json
+from datetime import date, datetime, timedelta
+from database import get_db_connection
+
+INTEGRATION_TYPES = ['sleep', 'calendar', 'weather', 'activity']
+
+# How samples within one day are combined into the daily value
+AGGREGATION = {'sleep': 'sum', 'calendar': 'sum', 'activity': 'sum', 'weather': 'mean'}
+
+# Shift sample timestamps before taking the date, so a night's sleep lands on the wake-up day
+DAY_OFFSET_HOURS = {'sleep': 6}
+
+# Candidate column names, checked in order, for date and value fields
+DATE_FIELDS = ['recorded_date', 'date', 'timestamp', 'datetime', 'time', 'start', 'startDate', 'dateTime']
+VALUE_FIELDS = ['value', 'hours', 'steps', 'count', 'minutes', 'duration', 'temperature', 'temp']
+
+CHUNK_SIZE = 500          # Rows per executemany transaction
+READ_SIZE = 64 * 1024     # Bytes per read when streaming JSON arrays
+
+
+def _parse_date(raw, offset_hours=0):
+    """Convert an ISO string, compact ICS date or epoch number to a YYYY-MM-DD string"""
+    raw = str(raw).strip()
+    if not raw:
+        return None
+    try:
+        # Fast path for ISO timestamps, which dominate per-minute exports
+        if len(raw) >= 10 and raw[4] == '-' and raw[7] == '-':
+            day = date.fromisoformat(raw[:10])
+            if offset_hours and len(raw) >= 13 and raw[11:13].isdigit():
+                day += timedelta(days=(int(raw[11:13]) + offset_hours) // 24)
+            return day.isoformat()
+        if raw.replace('.', '', 1).isdigit() and len(raw) >= 9:
+            stamp = float(raw)
+            moment = datetime.fromtimestamp(stamp / 1000 if stamp > 1e11 else stamp)
+        elif len(raw) >= 8 and raw[:8].isdigit():
+            # ICS style: 20250101 or 20250101T093000Z
+            moment = datetime.strptime(raw[:15] if 'T' in raw else raw[:8],
+                                       '%Y%m%dT%H%M%S' if 'T' in raw else '%Y%m%d')
+        else:
+            return None
+    except ValueError:
+        return None
+    if offset_hours:
+        moment += timedelta(hours=offset_hours)
+    return moment.date().isoformat()
+
+
+def iter_csv_records(stream, date_field=None, value_field=None):
+    """Yield (raw_date, value) pairs from a CSV stream, one row at a time"""
+    reader = csv.DictReader(stream)
+    fields = reader.fieldnames or []
+    date_field = date_field or next((f for f in DATE_FIELDS if f in fields), None)
+    value_field = value_field or next((f for f in VALUE_FIELDS if f in fields), None)
+    if not date_field:
+        raise ValueError(f"No date column found in CSV header: {fields}")
+
+    for row in reader:
+        raw_value = row.get(value_field) if value_field else 1
+        try:
+            yield row[date_field], float(raw_value)
+        except (TypeError, ValueError):
+            continue
+
+
+def iter_json_objects(stream):
+    """Yield objects from a JSON array or JSON Lines stream without reading it whole"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        # Skip whitespace and array punctuation between objects
+        buffer = buffer.lstrip().lstrip('[,').lstrip()
+        if buffer.startswith(']'):
+            return
+        if not buffer:
+            if eof:
+                return
+            chunk = stream.read(READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = stream.read(READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield obj
+
+
+def iter_json_records(stream, date_field=None, value_field=None):
+    """Yield (raw_date, value) pairs from a JSON/JSONL export"""
+    for obj in iter_json_objects(stream):
+        if not isinstance(obj, dict):
+            continue
+        d_field = date_field or next((f for f in DATE_FIELDS if f in obj), None)
+        v_field = value_field or next((f for f in VALUE_FIELDS if f in obj), None)
+        if not d_field:
+            continue
+        try:
+            yield obj[d_field], float(obj[v_field]) if v_field else 1.0
+        except (TypeError, ValueError):
+            continue
+
+
+def iter_ics_events(stream):
+    """Yield (DTSTART, 1.0) per VEVENT in an ICS stream, unfolding continuation lines"""
+    in_event = False
+    start = None
+    pending = None
+
+    def lines():
+        nonlocal pending
+        for raw in stream:
+            line = raw.rstrip('\r\n')
+            if line[:1] in (' ', '\t') and pending is not None:
+                pending += line[1:]
+                continue
+            if pending is not None:
+                yield pending
+            pending = line
+        if pending is not None:
+            yield pending
+
+    for line in lines():
+        if line == 'BEGIN:VEVENT':
+            in_event, start = True, None
+        elif line == 'END:VEVENT':
+            if in_event and start:
+                yield start, 1.0
+            in_event = False
+        elif in_event and line.startswith('DTSTART'):
+            start = line.split(':', 1)[-1]
+
+
+class LifeDataIngestor:
+    def __init__(self, conn=None):
+        self.conn = conn or get_db_connection()
+        self._owns_conn = conn is None
+
+    def ingest_file(self, user_id, path, integration_type, date_field=None, value_field=None, value_scale=1.0):
+        """Import a local export file (.csv, .json, .jsonl/.ndjson, .ics)"""
+        with open(path, 'r', encoding='utf-8', newline='') as stream:
+            return self.ingest_stream(user_id, stream, integration_type, os.path.splitext(path)[1],
+                                      date_field, value_field, value_scale, source=os.path.basename(path))
+
+    def ingest_stream(self, user_id, stream, integration_type, file_format, date_field=None,
+                      value_field=None, value_scale=1.0, source=None):
+        """Stream-parse an export, aggregate per day and upsert into life_integrations"""
+        if integration_type not in INTEGRATION_TYPES:
+            raise ValueError(f"Unknown integration type: {integration_type}")
+        if isinstance(stream.read(0), bytes):
+            stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+        file_format = file_format.lower().lstrip('.')
+        if file_format == 'csv':
+            records = iter_csv_records(stream, date_field, value_field)
+        elif file_format in ('json', 'jsonl', 'ndjson'):
+            records = iter_json_records(stream, date_field, value_field)
+        elif file_format == 'ics':
+            records = iter_ics_events(stream)
+        else:
+            raise ValueError(f"Unsupported file format: {file_format}")
+
+        # Per-day accumulators: memory grows with days covered, not with samples read
+        offset = DAY_OFFSET_HOURS.get(integration_type, 0)
+        daily = {}
+        samples = skipped = 0
+        for raw_date, value in records:
+            day = _parse_date(raw_date, offset)
+            if day is None:
+                skipped += 1
+                continue
+            total = daily.setdefault(day, [0.0, 0])
+            total[0] += value * value_scale
+            total[1] += 1
+            samples += 1
+
+        rows = []
+        written = 0
+        for day in sorted(daily):
+            total, count = daily[day]
+            value = total / count if AGGREGATION[integration_type] == 'mean' else total
+            data_point = json.dumps({'value': round(value, 3), 'samples': count, 'source': source})
+            rows.append((user_id, integration_type, data_point, day))
+            if len(rows) >= CHUNK_SIZE:
+                written += self._write_chunk(rows)
+                rows = []
+        if rows:
+            written += self._write_chunk(rows)
+
+        print(f"✅ Imported {samples} {integration_type} samples into {written} days for user {user_id}")
+        return {
+            'integration_type': integration_type,
+            'samples_read': samples,
+            'samples_skipped': skipped,
+            'days_written': written,
+            'first_date': min(daily) if daily else None,
+            'last_date': max(daily) if daily else None
+        }
+
+    def _write_chunk(self, rows):
+        """Upsert one chunk of daily rows in a single transaction"""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT INTO life_integrations (user_id, integration_type, data_point, recorded_date)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id, integration_type, recorded_date) DO UPDATE SET
+                    data_point = excluded.data_point
+            ''', rows)
+        return len(rows)
+
+    def close(self):
+        """Close database connection"""
+        if self._owns_conn and self.conn:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Import local life data exports into MindMirror")
+    parser.add_argument('user_id')
+    parser.add_argument('integration_type', choices=INTEGRATION_TYPES)
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--date-field')
+    parser.add_argument('--value-field')
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply values, e.g. 0.016667 for minutes to hours")
+    args = parser.parse_args()
+
+    ingestor = LifeDataIngestor()
+    try:
+        for path in args.paths:
+            print(ingestor.ingest_file(args.user_id, path, args.integration_type,
+                                       args.date_field, args.value_field, args.scale))
+    finally:
+        ingestor.close()
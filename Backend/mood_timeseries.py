@@ -0,0 +1,209 @@
+# mood_timeseries.py - Bucketed, downsampled mood series for the history charts
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, timedelta, timezone
+import numpy as np
+from database import get_entry_counter
+
+BUCKET_SIZES = ('day', 'week', 'month')
+# Bucket key (its first day, YYYY-MM-DD) computed in SQL; weeks start on Monday
+BUCKET_SQL = {
+    'day': "date(timestamp)",
+    'week': "date(timestamp, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m-01', timestamp)",
+}
+DEFAULT_POINTS = 120
+MAX_POINTS = 1000
+AUTO_DAY_SPAN = 180         # Up to ~6 months of history: daily buckets
+AUTO_WEEK_SPAN = 3 * 365    # Up to ~3 years: weekly, beyond that monthly
+MAX_CACHED_SERIES = 512     # (user, bucket size) pairs kept in memory
+NEUTRAL_MOOD = 50           # Stand-in for buckets without scores when choosing LTTB points
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket containing day (a date)"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets (Steinarsson, 2013): indices of threshold points that keep the shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)   # threshold - 2 inner bins
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bin (or the last point) is the triangle's third corner
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+class _Bucket:
+    __slots__ = ('entries', 'mood_sum', 'mood_count', 'emotions')
+
+    def __init__(self):
+        self.entries = 0
+        self.mood_sum = 0
+        self.mood_count = 0
+        self.emotions = {}
+
+    def add(self, emotion, entries, mood_sum, mood_count):
+        self.entries += entries
+        self.mood_sum += mood_sum or 0
+        self.mood_count += mood_count
+        emotion = emotion or 'unknown'
+        self.emotions[emotion] = self.emotions.get(emotion, 0) + entries
+
+    def merge(self, other):
+        self.entries += other.entries
+        self.mood_sum += other.mood_sum
+        self.mood_count += other.mood_count
+        for emotion, count in other.emotions.items():
+            self.emotions[emotion] = self.emotions.get(emotion, 0) + count
+
+    def point(self, key):
+        mood = round(self.mood_sum / self.mood_count, 1) if self.mood_count else None
+        dominant = max(self.emotions.items(), key=lambda item: item[1])[0] if self.emotions else None
+        return {'bucket': key, 'mood': mood, 'entries': self.entries,
+                'dominant_emotion': dominant, 'emotions': dict(self.emotions)}
+
+
+class MoodTimeseries:
+    """Per user and bucket size, caches every closed bucket; each request only aggregates the open one"""
+
+    def __init__(self, max_series=MAX_CACHED_SERIES):
+        self.max_series = max_series
+        self._series = OrderedDict()     # (user_id, bucket) -> (boundary, version, closed buckets, entries covered)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'rebuilds': 0}
+
+    def _aggregate(self, conn, user_id, bucket, since=None, before=None):
+        """{bucket key: _Bucket} from one GROUP BY over the (user_id, timestamp) index range"""
+        clauses, params = ['user_id = ?', 'timestamp IS NOT NULL'], [user_id]
+        if since:
+            clauses.append('timestamp >= ?')
+            params.append(since)
+        if before:
+            clauses.append('timestamp < ?')
+            params.append(before)
+        rows = conn.execute(f'''
+            SELECT {BUCKET_SQL[bucket]} AS bucket_key, final_emotion,
+                   COUNT(*), SUM(mood_score), COUNT(mood_score)
+            FROM mindmirror_entries
+            WHERE {' AND '.join(clauses)}
+            GROUP BY bucket_key, final_emotion
+        ''', params).fetchall()
+        buckets = {}
+        for key, emotion, entries, mood_sum, mood_count in rows:
+            if key is not None:
+                buckets.setdefault(key, _Bucket()).add(emotion, entries, mood_sum, mood_count)
+        return buckets
+
+    def buckets(self, conn, user_id, bucket):
+        """Sorted [(key, _Bucket)] for the user's whole history"""
+        # Entries are written at CURRENT_TIMESTAMP (UTC), so only the current bucket can still change
+        boundary = bucket_start(datetime.now(timezone.utc).date(), bucket).isoformat()
+        with self._lock:
+            cached = self._series.get((user_id, bucket))
+            if cached:
+                self._series.move_to_end((user_id, bucket))
+
+        # Read before aggregating: a change racing the rebuild leaves the cache one version behind
+        total, version = get_entry_counter(conn, user_id)
+        open_buckets = self._aggregate(conn, user_id, bucket, since=boundary)
+        open_entries = sum(b.entries for b in open_buckets.values())
+        # The version moves on edits, deletes and back-dated inserts; the count check is a cheap backstop
+        if cached and cached[:2] == (boundary, version) and cached[3] + open_entries == total:
+            self.stats['hits'] += 1
+            closed = cached[2]
+        else:
+            self.stats['rebuilds'] += 1
+            closed = self._aggregate(conn, user_id, bucket, before=boundary)
+            with self._lock:
+                self._series[(user_id, bucket)] = (boundary, version, closed,
+                                                   sum(b.entries for b in closed.values()))
+                self._series.move_to_end((user_id, bucket))
+                while len(self._series) > self.max_series:
+                    self._series.popitem(last=False)
+
+        merged = dict(closed)
+        for key, value in open_buckets.items():
+            if key in merged:
+                combined = _Bucket()
+                combined.merge(merged[key])
+                combined.merge(value)
+                value = combined
+            merged[key] = value
+        return sorted(merged.items())
+
+    def get_series(self, conn, user_id, bucket='auto', points=DEFAULT_POINTS, start_date=None, end_date=None):
+        """Chart-ready points; more buckets than points are reduced with LTTB, each point keeping its bin's totals"""
+        start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        points = max(3, min(int(points), MAX_POINTS))
+        if bucket == 'auto':
+            bucket = self._auto_bucket(conn, user_id, start, end)
+        if bucket not in BUCKET_SIZES:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKET_SIZES)} or auto")
+
+        series = self.buckets(conn, user_id, bucket)
+        if start:
+            first = bucket_start(start, bucket).isoformat()
+            series = [item for item in series if item[0] >= first]
+        if end:
+            series = [item for item in series if item[0] <= end.isoformat()]
+
+        downsampled = len(series) > points
+        if downsampled:
+            x = np.array([date.fromisoformat(key).toordinal() for key, _ in series], dtype=float)
+            y = np.array([b.mood_sum / b.mood_count if b.mood_count else NEUTRAL_MOOD for _, b in series])
+            keep = lttb(x, y, points)
+            reduced = []
+            # Each kept bucket stands for its bin: mood stays the kept value, counts cover the whole bin
+            bounds = list(keep[1:]) + [len(series)]
+            for index, stop in zip(keep, bounds):
+                key, kept = series[index]
+                folded = _Bucket()
+                folded.merge(kept)
+                for _, other in series[index + 1:stop]:
+                    folded.entries += other.entries
+                    for emotion, count in other.emotions.items():
+                        folded.emotions[emotion] = folded.emotions.get(emotion, 0) + count
+                folded.mood_sum, folded.mood_count = kept.mood_sum, kept.mood_count
+                reduced.append((key, folded))
+            series = reduced
+
+        return {'bucket': bucket, 'downsampled': downsampled, 'bucket_count': len(series),
+                'points': [value.point(key) for key, value in series]}
+
+    def _auto_bucket(self, conn, user_id, start, end):
+        """Daily for short spans, weekly up to a few years, monthly beyond"""
+        first, last = conn.execute('''
+            SELECT MIN(timestamp), MAX(timestamp) FROM mindmirror_entries WHERE user_id = ?
+        ''', (user_id,)).fetchone()
+        if not first:
+            return 'day'
+        first_day = max(start, date.fromisoformat(first[:10])) if start else date.fromisoformat(first[:10])
+        last_day = min(end, date.fromisoformat(last[:10])) if end else date.fromisoformat(last[:10])
+        span = (last_day - first_day).days
+        return 'day' if span <= AUTO_DAY_SPAN else 'week' if span <= AUTO_WEEK_SPAN else 'month'
+
+    def get_status(self):
+        with self._lock:
+            return dict(self.stats, cached_series=len(self._series))
+
+
+# Shared by the history chart route
+mood_timeseries = MoodTimeseries()
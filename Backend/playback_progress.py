@@ -0,0 +1,119 @@
+# playback_progress.py - Write-behind buffer for playback progress pings
+import atexit
+import threading
+from database import get_db_connection
+
+FLUSH_INTERVAL = 5.0      # Seconds between background flushes
+MAX_PENDING = 5000        # Sessions buffered before an early flush is triggered
+
+
+class ProgressBuffer:
+    """Keeps only the latest position per playback session row and writes them in batches"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}                  # (session row id, user_id) -> (progress_seconds, completed)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self.stats = {'pings': 0, 'rows_written': 0, 'flushes': 0}
+
+    def record(self, session_id, user_id, progress_seconds, completed=False):
+        """Buffer a progress ping for one session row; completions are written before returning"""
+        key = (session_id, user_id)     # A foreign session id cannot displace the owner's ping
+        with self._lock:
+            previous = self._pending.get(key)
+            # A completion stays recorded even if a late ping overtakes it
+            self._pending[key] = (progress_seconds, completed or (previous is not None and previous[1]))
+            self.stats['pings'] += 1
+            backlog = len(self._pending)
+        self._ensure_thread()
+
+        if completed:
+            self.flush()
+        elif backlog >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write every buffered position in one transaction; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            # By primary key, so each update touches exactly its own session row
+            progress_rows = [(progress, session_id, user_id)
+                             for (session_id, user_id), (progress, completed) in batch.items() if not completed]
+            completed_rows = [(progress, session_id, user_id)
+                              for (session_id, user_id), (progress, completed) in batch.items() if completed]
+            conn = get_db_connection()
+            try:
+                with conn:
+                    conn.executemany('''
+                        UPDATE user_playback_sessions
+                        SET progress_seconds = ?
+                        WHERE id = ? AND user_id = ? AND completed = 0
+                    ''', progress_rows)
+                    conn.executemany('''
+                        UPDATE user_playback_sessions
+                        SET completed = 1, progress_seconds = ?, ended_at = datetime('now')
+                        WHERE id = ? AND user_id = ? AND completed = 0
+                    ''', completed_rows)
+            except Exception as e:
+                print(f"❌ Playback progress flush failed, keeping {len(batch)} updates: {e}")
+                self._requeue(batch)
+                return 0
+            finally:
+                conn.close()
+
+            self.stats['rows_written'] += len(batch)
+            self.stats['flushes'] += 1
+            return len(batch)
+
+    def _requeue(self, batch):
+        """Put a failed batch back without overwriting newer pings"""
+        with self._lock:
+            for key, value in batch.items():
+                if key in self._pending:
+                    progress, completed = self._pending[key]
+                    self._pending[key] = (progress, completed or value[1])
+                else:
+                    self._pending[key] = value
+
+    def _ensure_thread(self):
+        """Start the flusher on first use, and flush once more at interpreter exit"""
+        if self._thread is not None or self._stopped:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._worker, name='progress-flusher', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _worker(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Playback progress flusher error: {e}")
+
+    def stop(self):
+        """Stop the flusher and write anything still buffered"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval)
+        written = self.flush()
+        if written:
+            print(f"💾 Flushed {written} buffered playback positions at shutdown")
+
+
+# Shared by the playback routes
+progress_buffer = ProgressBuffer()
@@ -0,0 +1,306 @@
+# provider_stub.py - Local stub of the external music/video APIs, with end-to-end client checks
+# Usage: python provider_stub.py
+import os
+import sys
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class StubState:
+    """What the stub has seen, plus knobs for the failure modes being checked"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.client_ports = set()
+        self.token_expires_in = 3600
+        self.rate_limit_next = 0      # Upcoming API calls answered with 429
+        self.retry_after = '1'
+        self.slow_seconds = 0
+        self.slow_prefix = ''         # Only paths under this prefix are slowed
+        self.fail_prefix = None       # Paths under this prefix answer 500
+        self.tokens_issued = 0
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'     # Keep-alive, so connection reuse is observable
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # Client gave up (timeout checks)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.state.client_ports.add(self.client_address[1])
+        if self.path == '/spotify/token':
+            self.state.count('token')
+            with self.state.lock:
+                self.state.tokens_issued += 1
+                token = f"token-{self.state.tokens_issued}"
+            return self._send(200, {'access_token': token, 'token_type': 'Bearer',
+                                    'expires_in': self.state.token_expires_in})
+        self._send(404, {'error': 'not found'})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.state.client_ports.add(self.client_address[1])
+        self.state.count(url.path)
+
+        with self.state.lock:
+            limited = self.state.rate_limit_next > 0
+            if limited:
+                self.state.rate_limit_next -= 1
+        if limited:
+            return self._send(429, {'error': 'rate limited'}, {'Retry-After': self.state.retry_after})
+        if self.state.fail_prefix and url.path.startswith(self.state.fail_prefix):
+            return self._send(500, {'error': 'provider down'})
+        if self.state.slow_seconds and url.path.startswith(self.state.slow_prefix):
+            time.sleep(self.state.slow_seconds)
+
+        if url.path.startswith('/youtube/v3/'):
+            return self._youtube(url.path[len('/youtube/v3/'):], query)
+        if url.path.startswith('/spotify/v1/'):
+            if not self.headers.get('Authorization', '').startswith('Bearer token-'):
+                return self._send(401, {'error': 'invalid token'})
+            return self._spotify(url.path[len('/spotify/v1/'):], query)
+        self._send(404, {'error': 'not found'})
+
+    def _spotify(self, endpoint, query):
+        if endpoint == 'search':
+            items = [{
+                'id': f"trk{i}", 'name': f"{query.get('q')} {i}", 'artists': [{'name': 'Stub Artist'}],
+                'album': {'name': 'Stub Album', 'images': [{'url': 'http://img/1'}]},
+                'preview_url': None, 'external_urls': {'spotify': f"http://open/trk{i}"},
+                'duration_ms': 180000 + i, 'popularity': 50
+            } for i in range(int(query.get('limit', 10)))]
+            return self._send(200, {'tracks': {'items': items}})
+        if endpoint == 'audio-features':
+            ids = query.get('ids', '').split(',')
+            if len(ids) > 100:
+                return self._send(400, {'error': 'too many ids'})
+            return self._send(200, {'audio_features': [{'id': i, 'valence': 0.5} for i in ids]})
+        if endpoint == 'recommendations':
+            return self._send(200, {'tracks': [{'id': seed} for seed in query.get('seed_tracks', '').split(',')]})
+        self._send(404, {'error': 'not found'})
+
+
+    def _youtube(self, endpoint, query):
+        if endpoint == 'search':
+            items = [{
+                'id': {'videoId': f"vid{i}"},
+                'snippet': {'title': f"{query.get('q')} {i}", 'description': '', 'channelTitle': 'Stub',
+                            'thumbnails': {'default': {'url': 'http://img/v'}}, 'publishedAt': '2025-01-01'}
+            } for i in range(int(query.get('maxResults', 5)))]
+            return self._send(200, {'items': items})
+        if endpoint == 'videos':
+            ids = query.get('id', '').split(',')
+            if len(ids) > 50:
+                return self._send(400, {'error': 'too many ids'})
+            # Durations derived from the id so results are checkable: vidN lasts N minutes 45 seconds
+            items = [{'id': i, 'contentDetails': {'duration': f"PT{i[3:]}M45S"}} for i in ids]
+            return self._send(200, {'items': items})
+        self._send(404, {'error': 'not found'})
+
+
+def start_stub():
+    """Serve the stub on a free local port in a background thread"""
+    state = StubState()
+    handler = type('Handler', (StubHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def check_spotify(state, base):
+    """Token caching, pooling, 429 backoff, timeouts and audio-feature batching"""
+    from spotify_integration import SpotifyIntegration
+    checks = {}
+
+    first, second = SpotifyIntegration(), SpotifyIntegration()
+    first.search_tracks('calm piano', 5)
+    second.search_tracks('rain sounds', 5)
+    checks['token shared across instances'] = state.calls.get('token') == 1
+
+    ids = [f"trk{i}" for i in range(250)]
+    before = state.calls.get('/spotify/v1/audio-features', 0)
+    features = first.get_audio_features(ids)
+    checks['audio features batched by 100'] = state.calls['/spotify/v1/audio-features'] - before == 3
+    checks['audio features keep input order'] = [f['id'] for f in features] == ids
+
+    state.rate_limit_next = 1
+    started = time.perf_counter()
+    tracks = first.search_tracks('focus', 3)
+    checks['429 retried after Retry-After'] = len(tracks) == 3 and time.perf_counter() - started >= 1.0
+
+    state.slow_seconds = 1.0
+    first.client.timeout = (1, 0.2)
+    first.client.max_retries = 1
+    started = time.perf_counter()
+    checks['slow API times out instead of hanging'] = (first.search_tracks('slow', 3) == []
+                                                        and time.perf_counter() - started < 1.5)
+    state.slow_seconds = 0
+
+    checks['connections pooled'] = len(state.client_ports) <= 4
+    return checks
+
+
+def check_token_refresh(state):
+    """A token inside the refresh margin is replaced before it expires"""
+    from spotify_integration import SpotifyIntegration, spotify_tokens, TOKEN_REFRESH_MARGIN
+    state.token_expires_in = TOKEN_REFRESH_MARGIN + 1
+    spotify_tokens._tokens.clear()
+    spotify = SpotifyIntegration()
+    issued = state.tokens_issued
+    spotify.search_tracks('one', 1)
+    spotify.search_tracks('two', 1)
+    fresh = state.tokens_issued - issued == 1
+    time.sleep(1.1)
+    spotify.search_tracks('three', 1)
+    state.token_expires_in = 3600
+    return {'token reused while fresh': fresh, 'token refreshed before expiry': state.tokens_issued - issued == 2}
+
+
+def check_youtube(state):
+    """Batched videos.list, persistent response cache and the duration parser"""
+    from youtube_integration import YouTubeIntegration, search_cache
+    youtube = YouTubeIntegration()
+    checks = {}
+
+    videos = youtube.search_videos('Calm  Breathing', 20, with_durations=True)
+    checks['one videos.list call for all results'] = state.calls.get('/youtube/v3/videos') == 1
+    checks['durations attached'] = [v['duration_minutes'] for v in videos] == [i + 1 for i in range(20)]
+
+    youtube.search_videos('calm breathing', 20, with_durations=True)
+    checks['normalized query served from cache'] = (state.calls.get('/youtube/v3/search') == 1
+                                                     and state.calls.get('/youtube/v3/videos') == 1)
+
+    search_cache._memory.clear()
+    YouTubeIntegration().search_videos('CALM breathing ', 20)
+    checks['cache survives the in-process layer (SQLite)'] = state.calls.get('/youtube/v3/search') == 1
+
+    durations = youtube.get_video_durations([f"vid{i}" for i in range(120)])
+    checks['videos.list batched by 50'] = state.calls['/youtube/v3/videos'] == 1 + 2 and len(durations) == 120
+
+    checks['duration parser'] = ([youtube.parse_duration(d) for d in ('PT1H30M15S', 'PT45S', 'PT10M31S', 'P1DT1M', 'P0D')]
+                                 == [90, 1, 11, 1441, 0])
+    return checks
+
+
+def check_aggregator(state):
+    """Concurrent fan-out: a slow provider yields partial results, a failing one opens its circuit"""
+    from content_providers import ContentAggregator
+    aggregator = ContentAggregator()
+    checks = {}
+
+    state.slow_prefix, state.slow_seconds = '/youtube/', 2.0
+    started = time.perf_counter()
+    content = aggregator.fetch('anxiety', 3, deadline=0.5)
+    elapsed = time.perf_counter() - started
+    state.slow_seconds, state.slow_prefix = 0, ''
+    checks['slow provider does not hold the response'] = elapsed < 1.0
+    checks['partial results returned'] = (content['partial'] and len(content['results']['spotify']) == 3
+                                          and content['providers']['youtube'] == 'timeout')
+
+    state.fail_prefix = '/spotify/v1/'
+    aggregator.spotify.client.max_retries = 0    # Fail fast so each fetch counts one failure
+    statuses = [aggregator.fetch('joy', 2, deadline=2.0)['providers']['spotify'] for _ in range(4)]
+    state.fail_prefix = None
+    checks['failing provider opens its circuit'] = statuses == ['error'] * 3 + ['circuit_open']
+
+    stats = aggregator.get_stats()
+    checks['provider stats reported'] = (stats['spotify']['circuit'] == 'open' and stats['spotify']['errors'] == 3
+                                         and stats['youtube']['timeouts'] == 1
+                                         and stats['youtube']['latency_p50_ms'] is not None)
+    return checks
+
+
+def check_catalog(state):
+    """Offline catalog: dump ingestion, live refresh, incremental updates and local search"""
+    from catalog import Catalog
+    directory = os.path.join(os.path.dirname(state.db_path), 'catalog')
+    catalog = Catalog(directory)
+    checks = {}
+
+    os.makedirs(catalog.import_dir)
+    dump = {'tracks': [{'track_id': f"dump{i}", 'name': f"Rain Piano {i}", 'artist': 'Quiet Keys',
+                        'album': 'Dump', 'preview_url': None, 'external_url': '', 'duration_ms': 200000,
+                        'popularity': i, 'album_image': None, 'moods': ['calm'], 'valence': i / 100}
+                       for i in range(100)]}
+    with open(os.path.join(catalog.import_dir, 'tracks.json'), 'w') as handle:
+        json.dump(dump, handle)
+
+    searches = state.calls.get('/spotify/v1/search', 0)
+    checks['refresh ingests dumps and seed searches'] = catalog.refresh() > 100
+    checks['seed searches went to the providers'] = state.calls['/spotify/v1/search'] - searches == 5
+    checks['unchanged refresh writes nothing'] = catalog.refresh() == 0
+
+    results = catalog.search_tracks('rain piano', 3)
+    checks['tokens ANDed, ranked by popularity'] = [t['track_id'] for t in results] == ['dump99', 'dump98', 'dump97']
+    checks['mood tags searchable'] = len(catalog.search_tracks('calm', 200)) == 100
+    checks['feature range filter'] = [t['track_id'] for t in catalog.search_tracks('calm', 5, valence=(0.1, 0.12))] \
+        == ['dump12', 'dump11', 'dump10']
+    checks['videos carry durations'] = all('duration_minutes' in v for v in catalog.search_videos('meditation', 5))
+
+    version = catalog.snapshot.version
+    catalog.upsert([('track', dict(dump['tracks'][0], name='Rain Piano Encore', popularity=500), ['calm'], {})])
+    top = catalog.search_tracks('rain piano', 1)[0]
+    checks['incremental update re-ranks'] = top['track_id'] == 'dump0' and catalog.snapshot.version == version + 1
+    checks['update keeps known features'] = top.get('valence') == 0.0
+    checks['encore token indexed'] = catalog.search_tracks('encore', 5)[0]['track_id'] == 'dump0'
+
+    reloaded = Catalog(directory)
+    checks['snapshot reloads from disk'] = reloaded.get_status() == catalog.get_status()
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        reloaded.search_tracks('rain piano', 10)
+    checks['search under a millisecond'] = (time.perf_counter() - started) / 1000 < 0.001
+    return checks
+
+
+if __name__ == "__main__":
+    import tempfile
+    import database
+    database.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix='mindmirror_stub_'), 'stub.db')
+    database.init_db()
+
+    server, state, base = start_stub()
+    state.db_path = database.DATABASE_PATH
+    # Point the integrations at the stub before they are imported
+    os.environ['SPOTIFY_API_URL'] = f"{base}/spotify/v1"
+    os.environ['SPOTIFY_AUTH_URL'] = f"{base}/spotify/token"
+    os.environ['YOUTUBE_API_URL'] = f"{base}/youtube/v3"
+
+    results = {}
+    results.update(check_spotify(state, base))
+    results.update(check_token_refresh(state))
+    results.update(check_youtube(state))
+    results.update(check_aggregator(state))
+    results.update(check_catalog(state))
+    server.shutdown()
+
+    for name, passed in results.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+    sys.exit(0 if all(results.values()) else 1)
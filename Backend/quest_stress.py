@@ -0,0 +1,85 @@
+# quest_stress.py - Concurrency stress check for atomic quest completion
+# Usage: python quest_stress.py [--users 200] [--threads 16] [--duplicates 3]
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+import threading
+
+import database
+from database import init_db, get_db_connection
+
+
+def run_stress(num_users, num_threads, duplicates):
+    """Hammer complete_quest from many threads and verify no lost or duplicate awards"""
+    db_dir = tempfile.mkdtemp(prefix='mindmirror_stress_')
+    database.DATABASE_PATH = os.path.join(db_dir, 'stress.db')
+    init_db()
+
+    from quest_system import QuestSystem
+    quest_system = QuestSystem()
+    users = [f"STRESS{i:05d}" for i in range(num_users)]
+    for user_id in users:
+        quest_system.generate_daily_quests(user_id)
+    quests = [(row[0], row[1]) for row in quest_system.conn.execute(
+        'SELECT user_id, quest_id FROM user_quests')]
+    quest_system.close()
+
+    # Every quest is attempted several times, shuffled across threads (double clicks, retries)
+    attempts = quests * duplicates
+    random.shuffle(attempts)
+    results = {'success': 0, 'rejected': 0}
+    results_lock = threading.Lock()
+
+    def worker(batch):
+        qs = QuestSystem()
+        try:
+            for user_id, quest_id in batch:
+                outcome = qs.complete_quest(user_id, quest_id)
+                with results_lock:
+                    results['success' if outcome['success'] else 'rejected'] += 1
+        finally:
+            qs.close()
+
+    threads = [threading.Thread(target=worker, args=(attempts[i::num_threads],)) for i in range(num_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    conn = get_db_connection()
+    expected_points = conn.execute('SELECT COALESCE(SUM(points), 0) FROM user_quests WHERE completed = 1').fetchone()[0]
+    completed_count = conn.execute('SELECT COUNT(*) FROM user_quests WHERE completed = 1').fetchone()[0]
+    ledger_points, ledger_rows = conn.execute('SELECT COALESCE(SUM(points), 0), COUNT(*) FROM point_transactions').fetchone()
+    balance_points = conn.execute('SELECT COALESCE(SUM(points), 0) FROM user_progress').fetchone()[0]
+    counted = conn.execute('SELECT COALESCE(SUM(total_quests_completed), 0) FROM user_progress').fetchone()[0]
+    bad_levels = conn.execute('SELECT COUNT(*) FROM user_progress WHERE level != points / 100 + 1').fetchone()[0]
+    conn.close()
+
+    checks = {
+        'every quest completed exactly once': completed_count == len(quests) == results['success'],
+        'one ledger row per completion': ledger_rows == completed_count,
+        'ledger matches completed quest points': ledger_points == expected_points,
+        'balances match ledger': balance_points == ledger_points,
+        'levels consistent with points': bad_levels == 0,
+        'completion counters match quests': counted == completed_count
+    }
+
+    print(f"⚡ {len(attempts)} attempts on {len(quests)} quests with {num_threads} threads in {elapsed:.2f}s "
+          f"({results['success'] / elapsed:.0f} completions/s, {len(attempts) / elapsed:.0f} attempts/s)")
+    for name, passed in checks.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+    return all(checks.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress test concurrent quest completion")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duplicates', type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(0 if run_stress(args.users, args.threads, args.duplicates) else 1)
@@ -2,182 +2,276 @@
 import json
 import random
 from datetime import datetime, timedelta
-from database import get_db_connection
+from database import get_db_connection, record_activity_day, seed_streaks
+from leaderboard import leaderboards
+
+# Quest templates for different emotions
+QUEST_TEMPLATES = {
+    'sadness': [
+        {
+            'title': 'Gratitude Hunt',
+            'description': 'Find and write down 3 things you\'re grateful for today',
+            'type': 'mindfulness',
+            'difficulty': 'easy',
+            'points': 10,
+            'emoji': '🙏',
+            'action': 'journal'
+        },
+        {
+            'title': 'Sunlight Seeker',
+            'description': 'Spend 15 minutes outside in sunlight',
+            'type': 'physical',
+            'difficulty': 'easy',
+            'points': 15,
+            'emoji': '☀️',
+            'action': 'outdoor'
+        },
+        {
+            'title': 'Connection Call',
+            'description': 'Call or message someone you care about',
+            'type': 'social',
+            'difficulty': 'medium',
+            'points': 20,
+            'emoji': '📞',
+            'action': 'social'
+        }
+    ],
+    'anxiety': [
+        {
+            'title': 'Breathing Break',
+            'description': 'Practice 5 minutes of deep breathing exercises',
+            'type': 'mindfulness',
+            'difficulty': 'easy',
+            'points': 10,
+            'emoji': '🌬️',
+            'action': 'breathing'
+        },
+        {
+            'title': 'Grounding Exercise',
+            'description': 'Name 5 things you can see, 4 you can touch, 3 you can hear, 2 you can smell, 1 you can taste',
+            'type': 'mindfulness',
+            'difficulty': 'easy',
+            'points': 15,
+            'emoji': '🌍',
+            'action': 'grounding'
+        },
+        {
+            'title': 'Digital Detox',
+            'description': 'Take a 30-minute break from all screens',
+            'type': 'lifestyle',
+            'difficulty': 'medium',
+            'points': 25,
+            'emoji': '📵',
+            'action': 'detox'
+        }
+    ],
+    'anger': [
+        {
+            'title': 'Energy Release',
+            'description': 'Do 10 minutes of vigorous exercise',
+            'type': 'physical',
+            'difficulty': 'medium',
+            'points': 20,
+            'emoji': '💪',
+            'action': 'exercise'
+        },
+        {
+            'title': 'Cool Down',
+            'description': 'Practice progressive muscle relaxation',
+            'type': 'mindfulness',
+            'difficulty': 'easy',
+            'points': 15,
+            'emoji': '❄️',
+            'action': 'relaxation'
+        },
+        {
+            'title': 'Perspective Shift',
+            'description': 'Write about the situation from someone else\'s viewpoint',
+            'type': 'cognitive',
+            'difficulty': 'hard',
+            'points': 30,
+            'emoji': '👁️',
+            'action': 'journal'
+        }
+    ],
+    'joy': [
+        {
+            'title': 'Joy Multiplier',
+            'description': 'Share something positive with 3 people',
+            'type': 'social',
+            'difficulty': 'easy',
+            'points': 15,
+            'emoji': '✨',
+            'action': 'sharing'
+        },
+        {
+            'title': 'Celebration Dance',
+            'description': 'Dance to your favorite upbeat song',
+            'type': 'physical',
+            'difficulty': 'easy',
+            'points': 10,
+            'emoji': '💃',
+            'action': 'dance'
+        },
+        {
+            'title': 'Future Planning',
+            'description': 'Plan one fun activity for the upcoming week',
+            'type': 'cognitive',
+            'difficulty': 'medium',
+            'points': 20,
+            'emoji': '📅',
+            'action': 'planning'
+        }
+    ],
+    'neutral': [
+        {
+            'title': 'Mindful Moment',
+            'description': 'Spend 5 minutes in silent meditation',
+            'type': 'mindfulness',
+            'difficulty': 'easy',
+            'points': 10,
+            'emoji': '🧘',
+            'action': 'meditation'
+        },
+        {
+            'title': 'Learning Spark',
+            'description': 'Learn something new for 15 minutes',
+            'type': 'cognitive',
+            'difficulty': 'medium',
+            'points': 20,
+            'emoji': '🎓',
+            'action': 'learning'
+        },
+        {
+            'title': 'Random Act of Kindness',
+            'description': 'Do something nice for someone unexpectedly',
+            'type': 'social',
+            'difficulty': 'medium',
+            'points': 25,
+            'emoji': '🤝',
+            'action': 'kindness'
+        }
+    ]
+}
+
+VALID_EMOTIONS = ['sadness', 'anxiety', 'anger', 'joy', 'neutral']
+QUESTS_PER_DAY = 3
+ACTIVE_USER_DAYS = 14       # Users with activity in this window get quests pre-generated
+BATCH_CHUNK_USERS = 500     # Users per bulk insert transaction
+
+
+def _compile_catalog(templates):
+    """Flatten templates once into per-emotion tuples of insert-ready fields"""
+    return {
+        emotion: tuple(
+            (q['title'], q['description'], q['type'], q['difficulty'], q['points'], q['emoji'], q['action'])
+            for q in quests
+        )
+        for emotion, quests in templates.items()
+    }
+
+QUEST_CATALOG = _compile_catalog(QUEST_TEMPLATES)
+
+
+def _normalize_emotion(emotion):
+    """Map a stored emotion label onto one of the quest catalog emotions"""
+    emotion = emotion.lower() if emotion else 'neutral'
+    return emotion if emotion in VALID_EMOTIONS else 'neutral'
+
 
 class QuestSystem:
     def __init__(self):
         self.conn = get_db_connection()
     
-    def generate_daily_quests(self, user_id):
+    def get_daily_quests(self, user_id, quest_date=None):
+        """Read the user's quests for the day (generated once if the nightly batch missed them)"""
+        quest_date = quest_date or datetime.now().date().isoformat()
+        
+        quests = self._get_quests_for_day(user_id, quest_date)
+        if not quests:
+            self.generate_daily_quests(user_id, quest_date)
+            quests = self._get_quests_for_day(user_id, quest_date)
+        
+        return quests
+    
+    def generate_daily_quests(self, user_id, quest_date=None):
         """Generate daily therapeutic quests based on user's emotional patterns"""
-        print(f"🎯 Generating daily quests for user {user_id}")
+        quest_date = quest_date or datetime.now().date().isoformat()
+        print(f"🎯 Generating daily quests for user {user_id} ({quest_date})")
         
-        # Get user's recent emotional state
         recent_emotion = self._get_recent_emotion(user_id)
+        rows = self._build_quest_rows(user_id, recent_emotion, quest_date)
+        self._save_quests_to_db(rows)
         
-        # Define quest templates for different emotions
-        quest_templates = {
-            'sadness': [
-                {
-                    'title': 'Gratitude Hunt',
-                    'description': 'Find and write down 3 things you\'re grateful for today',
-                    'type': 'mindfulness',
-                    'difficulty': 'easy',
-                    'points': 10,
-                    'emoji': '🙏',
-                    'action': 'journal'
-                },
-                {
-                    'title': 'Sunlight Seeker',
-                    'description': 'Spend 15 minutes outside in sunlight',
-                    'type': 'physical',
-                    'difficulty': 'easy',
-                    'points': 15,
-                    'emoji': '☀️',
-                    'action': 'outdoor'
-                },
-                {
-                    'title': 'Connection Call',
-                    'description': 'Call or message someone you care about',
-                    'type': 'social',
-                    'difficulty': 'medium',
-                    'points': 20,
-                    'emoji': '📞',
-                    'action': 'social'
-                }
-            ],
-            'anxiety': [
-                {
-                    'title': 'Breathing Break',
-                    'description': 'Practice 5 minutes of deep breathing exercises',
-                    'type': 'mindfulness',
-                    'difficulty': 'easy',
-                    'points': 10,
-                    'emoji': '🌬️',
-                    'action': 'breathing'
-                },
-                {
-                    'title': 'Grounding Exercise',
-                    'description': 'Name 5 things you can see, 4 you can touch, 3 you can hear, 2 you can smell, 1 you can taste',
-                    'type': 'mindfulness',
-                    'difficulty': 'easy',
-                    'points': 15,
-                    'emoji': '🌍',
-                    'action': 'grounding'
-                },
-                {
-                    'title': 'Digital Detox',
-                    'description': 'Take a 30-minute break from all screens',
-                    'type': 'lifestyle',
-                    'difficulty': 'medium',
-                    'points': 25,
-                    'emoji': '📵',
-                    'action': 'detox'
-                }
-            ],
-            'anger': [
-                {
-                    'title': 'Energy Release',
-                    'description': 'Do 10 minutes of vigorous exercise',
-                    'type': 'physical',
-                    'difficulty': 'medium',
-                    'points': 20,
-                    'emoji': '💪',
-                    'action': 'exercise'
-                },
-                {
-                    'title': 'Cool Down',
-                    'description': 'Practice progressive muscle relaxation',
-                    'type': 'mindfulness',
-                    'difficulty': 'easy',
-                    'points': 15,
-                    'emoji': '❄️',
-                    'action': 'relaxation'
-                },
-                {
-                    'title': 'Perspective Shift',
-                    'description': 'Write about the situation from someone else\'s viewpoint',
-                    'type': 'cognitive',
-                    'difficulty': 'hard',
-                    'points': 30,
-                    'emoji': '👁️',
-                    'action': 'journal'
-                }
-            ],
-            'joy': [
-                {
-                    'title': 'Joy Multiplier',
-                    'description': 'Share something positive with 3 people',
-                    'type': 'social',
-                    'difficulty': 'easy',
-                    'points': 15,
-                    'emoji': '✨',
-                    'action': 'sharing'
-                },
-                {
-                    'title': 'Celebration Dance',
-                    'description': 'Dance to your favorite upbeat song',
-                    'type': 'physical',
-                    'difficulty': 'easy',
-                    'points': 10,
-                    'emoji': '💃',
-                    'action': 'dance'
-                },
-                {
-                    'title': 'Future Planning',
-                    'description': 'Plan one fun activity for the upcoming week',
-                    'type': 'cognitive',
-                    'difficulty': 'medium',
-                    'points': 20,
-                    'emoji': '📅',
-                    'action': 'planning'
-                }
-            ],
-            'neutral': [
-                {
-                    'title': 'Mindful Moment',
-                    'description': 'Spend 5 minutes in silent meditation',
-                    'type': 'mindfulness',
-                    'difficulty': 'easy',
-                    'points': 10,
-                    'emoji': '🧘',
-                    'action': 'meditation'
-                },
-                {
-                    'title': 'Learning Spark',
-                    'description': 'Learn something new for 15 minutes',
-                    'type': 'cognitive',
-                    'difficulty': 'medium',
-                    'points': 20,
-                    'emoji': '🎓',
-                    'action': 'learning'
-                },
-                {
-                    'title': 'Random Act of Kindness',
-                    'description': 'Do something nice for someone unexpectedly',
-                    'type': 'social',
-                    'difficulty': 'medium',
-                    'points': 25,
-                    'emoji': '🤝',
-                    'action': 'kindness'
-                }
-            ]
+        return self._get_quests_for_day(user_id, quest_date)
+    
+    def pregenerate_daily_quests(self, quest_date=None, active_days=ACTIVE_USER_DAYS):
+        """Nightly batch: generate quests for every active user with one bulk insert per chunk"""
+        if quest_date is None:
+            quest_date = (datetime.now().date() + timedelta(days=1)).isoformat()
+        cutoff = (datetime.strptime(quest_date, '%Y-%m-%d').date() - timedelta(days=active_days)).isoformat()
+        
+        # Latest emotion per recently active user (SQLite returns the row holding MAX)
+        emotions = {
+            row[0]: _normalize_emotion(row[1])
+            for row in self.conn.execute('''
+                SELECT user_id, final_emotion, MAX(timestamp) FROM mindmirror_entries
+                WHERE timestamp >= ?
+                GROUP BY user_id
+            ''', (cutoff,))
         }
+        active_users = set(emotions)
+        active_users.update(row[0] for row in self.conn.execute('''
+            SELECT DISTINCT user_id FROM user_quests WHERE quest_date >= ?
+        ''', (cutoff,)))
         
-        # Select 3 quests based on current emotion
-        emotion_quests = quest_templates.get(recent_emotion, quest_templates['neutral'])
-        selected_quests = random.sample(emotion_quests, min(3, len(emotion_quests)))
+        users = sorted(active_users)
+        for i in range(0, len(users), BATCH_CHUNK_USERS):
+            rows = []
+            for user_id in users[i:i + BATCH_CHUNK_USERS]:
+                rows.extend(self._build_quest_rows(user_id, emotions.get(user_id, 'neutral'), quest_date))
+            self._save_quests_to_db(rows)
         
-        # Add quest IDs and status
-        for i, quest in enumerate(selected_quests):
-            quest['id'] = f"quest_{user_id}_{datetime.now().strftime('%Y%m%d')}_{i}"
-            quest['completed'] = False
-            quest['created_at'] = datetime.now().isoformat()
+        print(f"✅ Pre-generated {quest_date} quests for {len(users)} active users")
+        return len(users)
+    
+    def _build_quest_rows(self, user_id, emotion, quest_date):
+        """Pick the day's quests from the compiled catalog (deterministic per user and day)"""
+        emotion_quests = QUEST_CATALOG.get(emotion, QUEST_CATALOG['neutral'])
+        rng = random.Random(f"{user_id}:{quest_date}")
+        selected = rng.sample(emotion_quests, min(QUESTS_PER_DAY, len(emotion_quests)))
+        day_key = quest_date.replace('-', '')
         
-        # Save quests to database
-        self._save_quests_to_db(user_id, selected_quests)
+        return [
+            (user_id, f"quest_{user_id}_{day_key}_{i}") + quest + (quest_date,)
+            for i, quest in enumerate(selected)
+        ]
+    
+    def _get_quests_for_day(self, user_id, quest_date):
+        """Read the user's quests for one day"""
+        cursor = self.conn.execute('''
+            SELECT quest_id, title, description, quest_type, difficulty, points, emoji,
+                   action_type, completed, created_at
+            FROM user_quests
+            WHERE user_id = ? AND quest_date = ?
+            ORDER BY quest_id
+        ''', (user_id, quest_date))
         
-        return selected_quests
+        return [
+            {
+                'id': row[0],
+                'title': row[1],
+                'description': row[2],
+                'type': row[3],
+                'difficulty': row[4],
+                'points': row[5],
+                'emoji': row[6],
+                'action': row[7],
+                'completed': bool(row[8]),
+                'created_at': row[9]
+            }
+            for row in cursor.fetchall()
+        ]
     
     def _get_recent_emotion(self, user_id):
         """Get user's most recent emotion from database"""
@@ -185,167 +279,114 @@ class QuestSystem:
             cursor = self.conn.execute('''
                 SELECT final_emotion FROM mindmirror_entries 
                 WHERE user_id = ? 
-                ORDER BY created_at DESC 
+                ORDER BY timestamp DESC 
                 LIMIT 1
             ''', (user_id,))
             
             result = cursor.fetchone()
-            if result:
-                emotion = result[0].lower() if result[0] else 'neutral'
-                valid_emotions = ['sadness', 'anxiety', 'anger', 'joy', 'neutral']
-                return emotion if emotion in valid_emotions else 'neutral'
-            
-            return 'neutral'
+            return _normalize_emotion(result[0]) if result else 'neutral'
         except Exception as e:
             print(f"Error getting recent emotion: {e}")
             return 'neutral'
     
-    def _save_quests_to_db(self, user_id, quests):
-        """Save generated quests to database"""
+    def _save_quests_to_db(self, rows):
+        """Bulk insert quest rows; existing quests for the same day are kept as-is"""
         try:
-            # Clear previous day's quests
-            self.conn.execute('''
-                DELETE FROM user_quests 
-                WHERE user_id = ? AND date(created_at) = date('now')
-            ''', (user_id,))
-            
-            # Insert new quests
-            for quest in quests:
-                self.conn.execute('''
-                    INSERT INTO user_quests 
-                    (user_id, quest_id, title, description, quest_type, difficulty, points, emoji, action_type, completed)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    user_id, quest['id'], quest['title'], quest['description'],
-                    quest['type'], quest['difficulty'], quest['points'],
-                    quest['emoji'], quest['action'], False
-                ))
-            
+            self.conn.executemany('''
+                INSERT OR IGNORE INTO user_quests 
+                (user_id, quest_id, title, description, quest_type, difficulty, points, emoji, action_type, quest_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
             self.conn.commit()
-            print(f"✅ Saved {len(quests)} quests to database for user {user_id}")
             
         except Exception as e:
             print(f"Error saving quests to database: {e}")
     
     def complete_quest(self, user_id, quest_id):
-        """Mark a quest as completed and award points"""
+        """Mark a quest as completed and award points in a single transaction"""
         try:
-            # Get quest details
-            cursor = self.conn.execute('''
-                SELECT * FROM user_quests 
-                WHERE user_id = ? AND quest_id = ? AND completed = 0
-            ''', (user_id, quest_id))
-            
-            quest = cursor.fetchone()
-            if not quest:
-                return {'success': False, 'message': 'Quest not found or already completed'}
+            # IMMEDIATE takes the write lock up front so concurrent completions serialize
+            self.conn.execute('BEGIN IMMEDIATE')
             
-            # Mark as completed
-            self.conn.execute('''
+            # Conditional update: only the first completion of an open quest matches
+            completed = self.conn.execute('''
                 UPDATE user_quests 
                 SET completed = 1, completed_at = datetime('now')
-                WHERE user_id = ? AND quest_id = ?
-            ''', (user_id, quest_id))
+                WHERE user_id = ? AND quest_id = ? AND completed = 0
+                RETURNING points, title
+            ''', (user_id, quest_id)).fetchall()
             
-            # Award points
-            points = quest[7]  # points column
-            self._award_points(user_id, points, f"Completed quest: {quest[3]}")  # quest[3] is title
+            if not completed:
+                self.conn.rollback()
+                return {'success': False, 'message': 'Quest not found or already completed'}
             
-            # Check for level up
-            level_up = self._check_level_up(user_id)
+            points, title = completed[0]
+            record_activity_day(self.conn, user_id)
+            progress = self._award_points(user_id, points, f"Completed quest: {title}",
+                                          ref=f"quest:{user_id}:{quest_id}", quests_completed=1)
             
             self.conn.commit()
             
+            # Rank index is updated only after commit, so it never reflects a rolled-back award
+            leaderboards.record_award(user_id, progress['points'], points, progress['ledger_id'])
+            
             return {
                 'success': True,
                 'message': f'Quest completed! +{points} points!',
                 'points_earned': points,
-                'level_up': level_up
+                'level_up': progress['level_up']
             }
             
         except Exception as e:
+            self.conn.rollback()
             print(f"Error completing quest: {e}")
             return {'success': False, 'message': 'Could not complete quest'}
     
-    def _award_points(self, user_id, points, reason):
-        """Award points to user"""
-        try:
-            # Get current points
-            cursor = self.conn.execute('''
-                SELECT points, level FROM user_progress 
-                WHERE user_id = ?
-            ''', (user_id,))
-            
-            result = cursor.fetchone()
-            if result:
-                current_points = result[0] + points
-                current_level = result[1]
-                
-                # Update points
-                self.conn.execute('''
-                    UPDATE user_progress 
-                    SET points = ?, updated_at = datetime('now')
-                    WHERE user_id = ?
-                ''', (current_points, user_id))
-            else:
-                # First time - create progress record
-                current_points = points
-                current_level = 1
-                self.conn.execute('''
-                    INSERT INTO user_progress 
-                    (user_id, points, level, streak_days, updated_at)
-                    VALUES (?, ?, ?, ?, datetime('now'))
-                ''', (user_id, points, 1, 1))
-            
-            # Log point transaction
-            self.conn.execute('''
-                INSERT INTO point_transactions 
-                (user_id, points, reason, created_at)
-                VALUES (?, ?, ?, datetime('now'))
-            ''', (user_id, points, reason))
-            
-            print(f"✅ Awarded {points} points to user {user_id} for: {reason}")
-            
-        except Exception as e:
-            print(f"Error awarding points: {e}")
-    
-    def _check_level_up(self, user_id):
-        """Check if user should level up based on points"""
-        try:
-            cursor = self.conn.execute('''
-                SELECT points, level FROM user_progress WHERE user_id = ?
-            ''', (user_id,))
-            
-            result = cursor.fetchone()
-            if not result:
-                return False
-            
-            current_points, current_level = result
-            points_needed = current_level * 100  # 100 points per level
-            
-            if current_points >= points_needed:
-                new_level = current_level + 1
-                self.conn.execute('''
-                    UPDATE user_progress 
-                    SET level = ?, updated_at = datetime('now')
-                    WHERE user_id = ?
-                ''', (new_level, user_id))
-                
-                print(f"🎉 User {user_id} leveled up to level {new_level}!")
-                return True
-            
-            return False
-            
-        except Exception as e:
-            print(f"Error checking level up: {e}")
-            return False
+    def _award_points(self, user_id, points, reason, ref=None, quests_completed=0):
+        """Append to the points ledger and apply points/level/counters in SQL (caller commits)"""
+        # A unique ref makes a replayed award fail instead of double-counting
+        ledger_id = self.conn.execute('''
+            INSERT INTO point_transactions 
+            (user_id, points, reason, ref, created_at)
+            VALUES (?, ?, ?, ?, datetime('now'))
+        ''', (user_id, points, reason, ref)).lastrowid
+        
+        # 100 points per level; level never moves backwards; today's counter rolls over by date
+        today = datetime.now().date().isoformat()
+        new_points, new_level = self.conn.execute('''
+            INSERT INTO user_progress 
+            (user_id, points, level, streak_days, total_quests_completed,
+             quests_completed_today, completed_today_date, updated_at)
+            VALUES (?, ?, ? / 100 + 1, 0, ?, ?, ?, datetime('now'))
+            ON CONFLICT (user_id) DO UPDATE SET
+                points = user_progress.points + excluded.points,
+                level = MAX(user_progress.level, (user_progress.points + excluded.points) / 100 + 1),
+                total_quests_completed = user_progress.total_quests_completed + excluded.total_quests_completed,
+                quests_completed_today = CASE
+                    WHEN user_progress.completed_today_date = excluded.completed_today_date
+                    THEN user_progress.quests_completed_today + excluded.quests_completed_today
+                    ELSE excluded.quests_completed_today
+                END,
+                completed_today_date = excluded.completed_today_date,
+                updated_at = excluded.updated_at
+            RETURNING points, level
+        ''', (user_id, points, points, quests_completed, quests_completed, today)).fetchall()[0]
+        
+        level_up = new_level > (new_points - points) // 100 + 1
+        if level_up:
+            print(f"🎉 User {user_id} leveled up to level {new_level}!")
+        print(f"✅ Awarded {points} points to user {user_id} for: {reason}")
+        
+        return {'points': new_points, 'level': new_level, 'level_up': level_up, 'ledger_id': ledger_id}
     
     def get_user_progress(self, user_id):
         """Get user's quest progress and statistics"""
         try:
-            # Get basic progress
+            # Counters are maintained on completion, so this is a single point lookup
             cursor = self.conn.execute('''
-                SELECT points, level, streak_days FROM user_progress 
+                SELECT points, level, streak_days, total_quests_completed,
+                       quests_completed_today, completed_today_date
+                FROM user_progress 
                 WHERE user_id = ?
             ''', (user_id,))
             
@@ -361,41 +402,15 @@ class QuestSystem:
                     'today_quests': []
                 }
             
-            points, level, streak_days = progress
+            points, level, streak_days, total_quests_completed, completed_today, completed_today_date = progress
+            streak_days = self.get_streak(user_id)
+            today = datetime.now().date().isoformat()
             
-            # Get today's quests
-            cursor = self.conn.execute('''
-                SELECT quest_id, title, description, quest_type, difficulty, points, emoji, completed
-                FROM user_quests 
-                WHERE user_id = ? AND date(created_at) = date('now')
-                ORDER BY created_at
-            ''', (user_id,))
+            # Day rollover: yesterday's counter reads as zero until the next completion resets it
+            quests_completed_today = completed_today if completed_today_date == today else 0
             
-            today_quests = []
-            quests_completed_today = 0
-            
-            for row in cursor.fetchall():
-                quest = {
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'type': row[3],
-                    'difficulty': row[4],
-                    'points': row[5],
-                    'emoji': row[6],
-                    'completed': bool(row[7])
-                }
-                today_quests.append(quest)
-                if quest['completed']:
-                    quests_completed_today += 1
-            
-            # Get total quests completed
-            cursor = self.conn.execute('''
-                SELECT COUNT(*) FROM user_quests 
-                WHERE user_id = ? AND completed = 1
-            ''', (user_id,))
-            
-            total_quests_completed = cursor.fetchone()[0]
+            # Today's quests via the (user_id, quest_date) index
+            today_quests = self._get_quests_for_day(user_id, today)
             
             # Calculate next level progress
             points_needed = level * 100
@@ -427,52 +442,97 @@ class QuestSystem:
                 'points_to_next_level': 100
             }
     
-    def update_streak(self, user_id):
-        """Update user's daily streak"""
+    def get_streak(self, user_id):
+        """Current streak: days through the last rollover plus today if already active"""
+        today = datetime.now().date()
+        yesterday = today - timedelta(days=1)
+        row = self.conn.execute('''
+            SELECT streak_days, streak_through FROM user_progress WHERE user_id = ?
+        ''', (user_id,)).fetchone()
+        if not row:
+            return 0
+        
+        streak_days, streak_through = row[0] or 0, row[1]
+        if streak_through and streak_through >= today.isoformat():
+            return streak_days
+        
+        # Days the rollover has not folded in yet: just after midnight, or the job missed nights
+        active = {r[0] for r in self.conn.execute('''
+            SELECT activity_date FROM user_activity_days
+            WHERE user_id = ? AND activity_date > ? AND activity_date <= ?
+        ''', (user_id, streak_through or '', today.isoformat()))}
+        day = yesterday
+        while day.isoformat() in active:
+            day -= timedelta(days=1)
+        pending = (yesterday - day).days
+        if streak_through is None or day.isoformat() > streak_through:
+            streak_days = pending       # A missed day since the rollover broke the stored streak
+        else:
+            streak_days += pending      # Active every day since: extend it
+        return streak_days + (1 if today.isoformat() in active else 0)
+    
+    def rollover_streaks(self, through_date=None, max_catch_up_days=31):
+        """Nightly job: extend or reset every user's streak in one set-based pass per day"""
+        through = datetime.strptime(through_date, '%Y-%m-%d').date() if through_date else \
+            datetime.now().date() - timedelta(days=1)
+        
         try:
-            cursor = self.conn.execute('''
-                SELECT streak_days, updated_at FROM user_progress 
-                WHERE user_id = ?
-            ''', (user_id,))
+            self.conn.execute('BEGIN IMMEDIATE')
             
-            result = cursor.fetchone()
-            if not result:
-                return 1
-            
-            streak_days, last_updated = result
-            
-            # Check if last update was yesterday
-            if last_updated:
-                last_date = datetime.strptime(last_updated, '%Y-%m-%d %H:%M:%S').date()
-                today = datetime.now().date()
-                
-                if (today - last_date).days == 1:
-                    # Consecutive day - increment streak
-                    new_streak = streak_days + 1
-                elif (today - last_date).days == 0:
-                    # Same day - keep streak
-                    new_streak = streak_days
-                else:
-                    # Broken streak - reset to 1
-                    new_streak = 1
-            else:
-                new_streak = 1
-            
-            # Update streak
+            # Users active without a progress row yet (journal-only users)
             self.conn.execute('''
-                UPDATE user_progress 
-                SET streak_days = ?, updated_at = datetime('now')
-                WHERE user_id = ?
-            ''', (new_streak, user_id))
+                INSERT OR IGNORE INTO user_progress
+                (user_id, points, level, streak_days, total_quests_completed, quests_completed_today)
+                SELECT DISTINCT user_id, 0, 1, 0, 0, 0 FROM user_activity_days
+                WHERE activity_date > ? AND activity_date <= ?
+            ''', ((through - timedelta(days=max_catch_up_days)).isoformat(), through.isoformat()))
+            
+            # Streaks older than the catch-up window (or never rolled over) are rebuilt up to its
+            # start from the full activity history, so a long outage does not cap them
+            window_start = through - timedelta(days=max_catch_up_days - 1)
+            seed_streaks(self.conn, (window_start - timedelta(days=1)).isoformat())
+            
+            # Catch up on any nights the job did not run, oldest first
+            last = self.conn.execute('SELECT MIN(streak_through) FROM user_progress').fetchone()[0]
+            day = datetime.strptime(last, '%Y-%m-%d').date() + timedelta(days=1) if last else window_start
+            
+            days_processed = 0
+            while day <= through:
+                self.conn.execute('''
+                    UPDATE user_progress SET
+                        streak_days = CASE
+                            WHEN EXISTS (SELECT 1 FROM user_activity_days a
+                                         WHERE a.user_id = user_progress.user_id AND a.activity_date = :day)
+                            THEN (CASE WHEN streak_through = date(:day, '-1 day') THEN streak_days ELSE 0 END) + 1
+                            ELSE 0
+                        END,
+                        streak_through = :day
+                    WHERE streak_through IS NULL OR streak_through < :day
+                ''', {'day': day.isoformat()})
+                days_processed += 1
+                day += timedelta(days=1)
             
             self.conn.commit()
-            return new_streak
-            
-        except Exception as e:
-            print(f"Error updating streak: {e}")
-            return 1
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        print(f"🔥 Streaks rolled over through {through.isoformat()} ({days_processed} day(s))")
+        return days_processed
     
     def close(self):
         """Close database connection"""
         if self.conn:
-            self.conn.close()
\ No newline at end of file
+            self.conn.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Pre-generate daily quests for all active users")
+    parser.add_argument('--date', help="Quest date (YYYY-MM-DD), defaults to tomorrow")
+    args = parser.parse_args()
+    
+    quest_system = QuestSystem()
+    try:
+        quest_system.pregenerate_daily_quests(args.date)
+    finally:
+        quest_system.close()
\ No newline at end of file
@@ -0,0 +1,267 @@
+# rule_miner.py - Data-driven digital twin rules from life integration signals
+import json
+import math
+from datetime import datetime, timedelta
+from statistics import NormalDist
+import numpy as np
+from database import get_db_connection, upsert_digital_twin_rules
+
+# Signal types mined from life_integrations (data_point holds a numeric daily value)
+SIGNAL_TYPES = ['sleep', 'calendar', 'weather', 'activity']
+
+# Threshold used for conditional "if signal < X then mood ..." rules
+SIGNAL_THRESHOLDS = {'sleep': 6.0, 'calendar': 5.0, 'weather': 10.0, 'activity': 5000.0}
+
+# Human-readable label, unit and the step size used to phrase correlation rules
+SIGNAL_LABELS = {
+    'sleep': ('sleep', 'hours', 1),
+    'calendar': ('calendar load', 'events', 1),
+    'weather': ('temperature', '°C', 5),
+    'activity': ('daily steps', 'steps', 1000)
+}
+
+MAX_LAG_DAYS = 3          # Signal on day t-k vs mood on day t, k = 0..MAX_LAG_DAYS
+MIN_SAMPLES = 8           # Minimum paired days before a correlation is considered
+MIN_GROUP_SAMPLES = 4     # Minimum days on each side of a threshold
+SIGNIFICANCE_ALPHA = 0.05
+
+CORR_KEYS = ['n', 'sx', 'sy', 'sxx', 'syy', 'sxy']
+COND_KEYS = ['n_low', 'sy_low', 'syy_low', 'n_high', 'sy_high', 'syy_high']
+
+
+def _parse_signal_value(data_point):
+    """Extract the numeric value from a life_integrations data_point"""
+    try:
+        return float(data_point)
+    except (TypeError, ValueError):
+        pass
+    try:
+        value = json.loads(data_point).get('value')
+        return float(value) if value is not None else None
+    except Exception:
+        return None
+
+
+class RuleMiner:
+    def __init__(self, conn=None):
+        self.conn = conn or get_db_connection()
+        self._owns_conn = conn is None
+        self.z_critical = NormalDist().inv_cdf(1 - SIGNIFICANCE_ALPHA / 2)
+        self.thresholds = np.array([SIGNAL_THRESHOLDS[s] for s in SIGNAL_TYPES])
+
+    def mine_rules(self, user_id, full_rebuild=False):
+        """Update running statistics with new days and upsert significant rules"""
+        state = None if full_rebuild else self._load_state(user_id)
+        # Signals written for days already folded in (late imports, overwrites) cannot be
+        # patched into the running sums, so those users are recounted from full history
+        change = self.conn.execute(
+            'SELECT version, earliest_date FROM life_signal_changes WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        if state and change and state['last_mood_date'] and change['earliest_date'][:10] <= state['last_mood_date']:
+            print(f"🔄 Life signals changed since {change['earliest_date'][:10] or 'the start'}, recounting rules for user {user_id}")
+            state = None
+        if state is None:
+            state = self._empty_state()
+
+        # Only fully elapsed days are folded in, so today's later entries are not lost
+        today = datetime.now().date()
+        start_day = (datetime.strptime(state['last_mood_date'], '%Y-%m-%d').date() + timedelta(days=1)
+                     if state['last_mood_date'] else None)
+
+        mood_rows = self.conn.execute('''
+            SELECT date(timestamp) AS day, AVG(mood_score) AS mood
+            FROM mindmirror_entries
+            WHERE user_id = ? AND mood_score IS NOT NULL
+              AND timestamp >= ? AND timestamp < ?
+            GROUP BY day
+            ORDER BY day
+        ''', (user_id, start_day.isoformat() if start_day else '', today.isoformat())).fetchall()
+
+        if mood_rows:
+            self._accumulate(user_id, state, mood_rows)
+            state['last_mood_date'] = mood_rows[-1]['day']
+            self._save_state(user_id, state)
+        if change:
+            # The sums now reflect every signal read above; a write racing this run bumps version and stays marked
+            self.conn.execute('DELETE FROM life_signal_changes WHERE user_id = ? AND version = ?',
+                              (user_id, change['version']))
+            self.conn.commit()
+
+        rules, stale_types = self._extract_rules(state)
+        if rules:
+            upsert_digital_twin_rules(self.conn, user_id, rules)
+        if stale_types:
+            self.conn.executemany(
+                'DELETE FROM digital_twin_rules WHERE user_id = ? AND rule_type = ?',
+                [(user_id, rule_type) for rule_type in stale_types]
+            )
+            self.conn.commit()
+
+        days_analyzed = int(np.max(np.array(state['corr']['n']))) if state['corr']['n'] else 0
+        print(f"✅ Mined {len(rules)} rules for user {user_id} ({len(mood_rows)} new mood days)")
+        return rules, days_analyzed
+
+    def _accumulate(self, user_id, state, mood_rows):
+        """Fold new mood days and their lagged signals into the sufficient statistics"""
+        first_day = datetime.strptime(mood_rows[0]['day'], '%Y-%m-%d').date()
+        last_day = datetime.strptime(mood_rows[-1]['day'], '%Y-%m-%d').date()
+        window_start = first_day - timedelta(days=MAX_LAG_DAYS)
+        num_days = (last_day - window_start).days + 1
+        num_signals = len(SIGNAL_TYPES)
+        signal_index = {s: i for i, s in enumerate(SIGNAL_TYPES)}
+
+        mood = np.full(num_days, np.nan)
+        for row in mood_rows:
+            day = datetime.strptime(row['day'], '%Y-%m-%d').date()
+            mood[(day - window_start).days] = row['mood']
+
+        sums = np.zeros((num_days, num_signals))
+        counts = np.zeros((num_days, num_signals))
+        signal_rows = self.conn.execute('''
+            SELECT integration_type, recorded_date, data_point
+            FROM life_integrations
+            WHERE user_id = ? AND recorded_date BETWEEN ? AND ?
+        ''', (user_id, window_start.isoformat(), last_day.isoformat()))
+        for row in signal_rows:
+            idx = signal_index.get(row['integration_type'])
+            value = _parse_signal_value(row['data_point'])
+            if idx is None or value is None:
+                continue
+            day = datetime.strptime(row['recorded_date'][:10], '%Y-%m-%d').date()
+            sums[(day - window_start).days, idx] += value
+            counts[(day - window_start).days, idx] += 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            signals = np.where(counts > 0, sums / counts, np.nan)
+
+        # lagged[k, t, s] = signal s on day t - k
+        lagged = np.full((MAX_LAG_DAYS + 1, num_days, num_signals), np.nan)
+        for k in range(MAX_LAG_DAYS + 1):
+            lagged[k, k:, :] = signals[:num_days - k]
+
+        mask = ~np.isnan(lagged) & ~np.isnan(mood)[None, :, None]
+        x = np.where(mask, lagged, 0.0)
+        y = np.where(mask, mood[None, :, None], 0.0)
+
+        corr = {
+            'n': mask.sum(axis=1), 'sx': x.sum(axis=1), 'sy': y.sum(axis=1),
+            'sxx': (x * x).sum(axis=1), 'syy': (y * y).sum(axis=1), 'sxy': (x * y).sum(axis=1)
+        }
+        low = mask & (lagged < self.thresholds[None, None, :])
+        high = mask & ~low
+        cond = {
+            'n_low': low.sum(axis=1), 'sy_low': np.where(low, y, 0.0).sum(axis=1),
+            'syy_low': np.where(low, y * y, 0.0).sum(axis=1),
+            'n_high': high.sum(axis=1), 'sy_high': np.where(high, y, 0.0).sum(axis=1),
+            'syy_high': np.where(high, y * y, 0.0).sum(axis=1)
+        }
+        for key in CORR_KEYS:
+            state['corr'][key] = (np.array(state['corr'][key]) + corr[key]).tolist()
+        for key in COND_KEYS:
+            state['cond'][key] = (np.array(state['cond'][key]) + cond[key]).tolist()
+
+    def _extract_rules(self, state):
+        """Turn accumulated statistics into significant rules (one per rule_type)"""
+        c = {key: np.array(state['corr'][key], dtype=float) for key in CORR_KEYS}
+        d = {key: np.array(state['cond'][key], dtype=float) for key in COND_KEYS}
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = c['n']
+            cov = c['sxy'] - c['sx'] * c['sy'] / n
+            var_x = c['sxx'] - c['sx'] ** 2 / n
+            var_y = c['syy'] - c['sy'] ** 2 / n
+            r = cov / np.sqrt(var_x * var_y)
+            slope = cov / var_x
+            valid = (n >= MIN_SAMPLES) & (var_x > 0) & (var_y > 0)
+            z = np.where(valid, np.arctanh(np.clip(r, -0.999999, 0.999999)) * np.sqrt(np.maximum(n - 3, 0)), 0.0)
+
+            mean_low = d['sy_low'] / d['n_low']
+            mean_high = d['sy_high'] / d['n_high']
+            var_low = (d['syy_low'] - d['sy_low'] ** 2 / d['n_low']) / (d['n_low'] - 1)
+            var_high = (d['syy_high'] - d['sy_high'] ** 2 / d['n_high']) / (d['n_high'] - 1)
+            effect = mean_low - mean_high
+            se = np.sqrt(var_low / d['n_low'] + var_high / d['n_high'])
+            cond_valid = (d['n_low'] >= MIN_GROUP_SAMPLES) & (d['n_high'] >= MIN_GROUP_SAMPLES) & (se > 0)
+            t = np.where(cond_valid, effect / se, 0.0)
+
+        rules = []
+        stale_types = []
+        for s, signal in enumerate(SIGNAL_TYPES):
+            label, unit, step = SIGNAL_LABELS[signal]
+
+            lag = int(np.argmax(np.abs(z[:, s])))
+            if abs(z[lag, s]) >= self.z_critical:
+                direction = 'rises' if slope[lag, s] > 0 else 'drops'
+                rules.append({
+                    'type': f'{signal}_mood',
+                    'condition': f'if {label} +{step:g} {unit}{self._lag_text(lag)}',
+                    'outcome': f'then mood {direction} {abs(slope[lag, s]) * step:.1f} points (r={r[lag, s]:.2f}, n={int(n[lag, s])})',
+                    'confidence': self._confidence(z[lag, s])
+                })
+            else:
+                stale_types.append(f'{signal}_mood')
+
+            lag = int(np.argmax(np.abs(t[:, s])))
+            if abs(t[lag, s]) >= self.z_critical:
+                direction = 'drops' if effect[lag, s] < 0 else 'rises'
+                rules.append({
+                    'type': f'{signal}_threshold',
+                    'condition': f'if {label} < {SIGNAL_THRESHOLDS[signal]:g} {unit}{self._lag_text(lag)}',
+                    'outcome': f'then mood {direction} {abs(effect[lag, s]):.0f} points',
+                    'confidence': self._confidence(t[lag, s])
+                })
+            else:
+                stale_types.append(f'{signal}_threshold')
+
+        rules.sort(key=lambda rule: rule['confidence'], reverse=True)
+        return rules, stale_types
+
+    def _confidence(self, z):
+        """Two-sided significance of a z statistic as a 0-1 confidence"""
+        return round(1 - math.erfc(abs(float(z)) / math.sqrt(2)), 3)
+
+    def _lag_text(self, lag):
+        """Describe the lag between signal and mood"""
+        if lag == 0:
+            return ' (same day)'
+        return f' ({lag} day{"s" if lag > 1 else ""} before)'
+
+    def _empty_state(self):
+        """Zeroed statistics for a user with no processed history"""
+        shape = (MAX_LAG_DAYS + 1, len(SIGNAL_TYPES))
+        return {
+            'signals': SIGNAL_TYPES,
+            'max_lag': MAX_LAG_DAYS,
+            'last_mood_date': None,
+            'corr': {key: np.zeros(shape).tolist() for key in CORR_KEYS},
+            'cond': {key: np.zeros(shape).tolist() for key in COND_KEYS}
+        }
+
+    def _load_state(self, user_id):
+        """Load a user's running statistics, or None if missing or outdated"""
+        row = self.conn.execute(
+            'SELECT last_mood_date, stats FROM digital_twin_state WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        if not row:
+            return None
+        state = json.loads(row['stats'])
+        if state.get('signals') != SIGNAL_TYPES or state.get('max_lag') != MAX_LAG_DAYS:
+            return None  # Signal set changed, rebuild from full history
+        state['last_mood_date'] = row['last_mood_date']
+        return state
+
+    def _save_state(self, user_id, state):
+        """Persist a user's running statistics"""
+        self.conn.execute('''
+            INSERT INTO digital_twin_state (user_id, last_mood_date, stats, updated_at)
+            VALUES (?, ?, ?, datetime('now'))
+            ON CONFLICT (user_id) DO UPDATE SET
+                last_mood_date = excluded.last_mood_date,
+                stats = excluded.stats,
+                updated_at = excluded.updated_at
+        ''', (user_id, state['last_mood_date'], json.dumps(state)))
+        self.conn.commit()
+
+    def close(self):
+        """Close database connection"""
+        if self._owns_conn and self.conn:
+            self.conn.close()
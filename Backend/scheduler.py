@@ -0,0 +1,115 @@
+# scheduler.py - Lightweight in-process scheduler for nightly batch jobs
+import os
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None        # No cross-process lock (Windows): run a single server process
+
+# Held by the one process per host that runs the jobs, so multi-worker servers do not repeat them
+LOCK_FILE = os.environ.get('NIGHTLY_JOBS_LOCK', 'nightly_jobs.lock')
+
+
+class NightlyScheduler:
+    def __init__(self):
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._lock_handle = None
+
+    def register(self, name, func, hour=0, minute=0):
+        """Run func() every day at hour:minute local time"""
+        with self._lock:
+            self.jobs[name] = {'func': func, 'hour': hour, 'minute': minute,
+                               'next_run': self._next_run(hour, minute), 'last_run': None}
+        self._wakeup.set()
+
+    def start(self):
+        """Start the background scheduler thread (idempotent); False if another process already runs it"""
+        if self._thread and self._thread.is_alive():
+            return True
+        if not self._acquire_process_lock():
+            print("🕛 Nightly jobs already run by another process")
+            return False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._worker, name='nightly-jobs', daemon=True)
+        self._thread.start()
+        print(f"🕛 Nightly scheduler started with jobs: {', '.join(self.jobs) or 'none'}")
+        return True
+
+    def _acquire_process_lock(self):
+        if fcntl is None or self._lock_handle is not None:
+            return True
+        handle = open(LOCK_FILE, 'w')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_handle = handle      # Released by the OS when this process exits
+        return True
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        self._stopped = True
+        self._wakeup.set()
+
+    def run_now(self, name):
+        """Run a registered job immediately in the calling thread"""
+        job = self.jobs[name]
+        self._run_job(name, job)
+
+    def get_status(self):
+        """Next and last run time per job"""
+        with self._lock:
+            return {
+                name: {'next_run': job['next_run'].isoformat(),
+                       'last_run': job['last_run'].isoformat() if job['last_run'] else None}
+                for name, job in self.jobs.items()
+            }
+
+    def _next_run(self, hour, minute, after=None):
+        """Next occurrence of hour:minute strictly after the given time"""
+        after = after or datetime.now()
+        candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= after:
+            candidate += timedelta(days=1)
+        return candidate
+
+    def _worker(self):
+        """Sleep until the earliest due job, run it, reschedule"""
+        while not self._stopped:
+            with self._lock:
+                due = min((job['next_run'] for job in self.jobs.values()), default=None)
+            timeout = (due - datetime.now()).total_seconds() if due else None
+            self._wakeup.clear()
+            if timeout is None or timeout > 0:
+                self._wakeup.wait(timeout)
+                continue
+
+            now = datetime.now()
+            with self._lock:
+                ready = [(name, job) for name, job in self.jobs.items() if job['next_run'] <= now]
+            for name, job in ready:
+                self._run_job(name, job)
+
+    def _run_job(self, name, job):
+        """Execute one job, never letting an error kill the scheduler"""
+        started = datetime.now()
+        try:
+            print(f"🕛 Running nightly job: {name}")
+            job['func']()
+        except Exception as e:
+            print(f"❌ Nightly job {name} failed: {e}")
+        finally:
+            with self._lock:
+                job['last_run'] = started
+                job['next_run'] = self._next_run(job['hour'], job['minute'], after=started)
+
+
+# Process-wide scheduler shared by the app's batch jobs
+nightly_jobs = NightlyScheduler()
@@ -0,0 +1,534 @@
+# soundscape_renderer.py - Render SoundscapeGenerator plans to PCM audio with NumPy
+import os
+import re
+import json
+import math
+import wave
+import struct
+import time
+import hashlib
+import numpy as np
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCK_SECONDS = 2         # Audio rendered per step, so memory stays flat for any duration
+FILTER_CHUNK = 64         # Samples per matrix step in the vectorized one-pole filter
+MASTER_HEADROOM = 0.8     # Peak target before the soft limiter
+NOISE_BED_LEVEL = 0.2     # Plain noise elements are scaled to sit level with the textures
+WAV_HEADER_BYTES = 44
+MAX_WAV_DATA_BYTES = 2**32 - 1 - 36     # RIFF sizes are unsigned 32-bit (~405 minutes at 44.1 kHz stereo)
+MAX_DURATION_MINUTES = 120              # Longest soundscape the API will plan
+RENDER_VERSION = 1        # Part of the audio ETag; bump when synthesis or mixing changes
+SOUNDSCAPE_DIR = os.path.join('uploads', 'soundscapes')
+PLAN_TTL_DAYS = 7         # Stored plans (and so their audio URLs) older than this are pruned nightly
+
+# Pole/gain pairs of Paul Kellet's economy pink noise filter (tuned for 44.1 kHz)
+PINK_POLES = [(0.99765, 0.0990460), (0.96300, 0.2965164), (0.57000, 1.0526913)]
+PINK_DIRECT = 0.1848
+PINK_NORM = 0.33          # Brings the filter output to roughly unit RMS
+
+# Pentatonic scale (Hz) shared by the melodic layers
+PENTATONIC = [261.63, 293.66, 329.63, 392.00, 440.00, 523.25, 587.33, 659.25]
+
+# One period of a soft sawtooth (first five harmonics), indexed by phase for sustained string voices
+WAVETABLE_SIZE = 4096
+_table_phase = 2 * np.pi * np.arange(WAVETABLE_SIZE) / WAVETABLE_SIZE
+STRING_WAVETABLE = sum(np.sin(k * _table_phase) / k for k in range(1, 6))
+
+
+def one_pole(x, a, state=0.0):
+    """y[n] = a * y[n-1] + x[n] without a Python loop; returns (y, last_y)"""
+    n = len(x)
+    if n == 0:
+        return x, state
+    chunk = min(FILTER_CHUNK, n)
+    m = -(-n // chunk)
+    padded = np.zeros(m * chunk)
+    padded[:n] = x
+    blocks = padded.reshape(m, chunk)
+
+    # Within each chunk the filter is a lower-triangular Toeplitz matrix of powers of a
+    powers = a ** np.arange(chunk + 1)
+    lags = np.arange(chunk)[None, :] - np.arange(chunk)[:, None]
+    toeplitz = np.where(lags >= 0, powers[np.clip(lags, 0, chunk)], 0.0)
+    local = blocks @ toeplitz
+
+    # Carries between chunks follow the same recurrence with coefficient a**chunk
+    if m > 1:
+        carries, _ = one_pole(local[:, -1], powers[chunk], state)
+        incoming = np.concatenate(([state], carries[:-1]))
+    else:
+        incoming = np.array([state])
+    y = (local + incoming[:, None] * powers[1:][None, :]).reshape(-1)[:n]
+    return y, float(y[-1])
+
+
+def _lowpass_coefficient(cutoff_hz, sample_rate):
+    """One-pole coefficient for a cutoff frequency"""
+    return math.exp(-2 * math.pi * cutoff_hz / sample_rate)
+
+
+class NoiseSource:
+    """White, pink or brown noise with filter state carried across blocks"""
+
+    def __init__(self, color, rng, sample_rate):
+        self.color = color
+        self.rng = rng
+        self.states = [0.0] * len(PINK_POLES)
+        self.brown_pole = _lowpass_coefficient(20, sample_rate)
+
+    def render(self, n):
+        white = self.rng.standard_normal(n)
+        if self.color == 'white':
+            return white
+        if self.color == 'brown':
+            # Leaky integrator keeps brown noise from drifting off to DC
+            y, self.states[0] = one_pole(white, self.brown_pole, self.states[0])
+            return y * math.sqrt(1 - self.brown_pole ** 2)
+        pink = white * PINK_DIRECT
+        for i, (pole, gain) in enumerate(PINK_POLES):
+            y, self.states[i] = one_pole(white * gain, pole, self.states[i])
+            pink += y
+        return pink * PINK_NORM
+
+
+class Lowpass:
+    """Stateful one-pole lowpass (highpass is the input minus this)"""
+
+    def __init__(self, cutoff_hz, sample_rate):
+        self.a = _lowpass_coefficient(cutoff_hz, sample_rate)
+        self.state = 0.0
+
+    def __call__(self, x):
+        y, self.state = one_pole(x * (1 - self.a), self.a, self.state)
+        return y
+
+
+class EventLayer:
+    """Sparse one-shot sounds (chirps, plucks, bowl strikes) with tails carried across blocks"""
+
+    def __init__(self, rng, sample_rate, rate_per_second, make_event, max_seconds):
+        self.rng = rng
+        self.sample_rate = sample_rate
+        self.rate = rate_per_second
+        self.make_event = make_event
+        self.max_len = int(max_seconds * sample_rate)
+        self.carry = np.zeros(0)
+
+    def render(self, n, t):
+        out = np.zeros(n + self.max_len)
+        out[:len(self.carry)] += self.carry
+        count = self.rng.poisson(self.rate * n / self.sample_rate)
+        for start in self.rng.integers(0, n, count):
+            event = self.make_event(self.rng, self.sample_rate)[:self.max_len]
+            out[start:start + len(event)] += event
+        self.carry = out[n:]
+        return out[:n]
+
+
+def _decaying_partials(t, f0, ratios, amps, decays, attack=0.005):
+    """Sum of exponentially decaying sine partials with a short linear attack"""
+    y = np.zeros_like(t)
+    for ratio, amp, decay in zip(ratios, amps, decays):
+        y += amp * np.sin(2 * np.pi * f0 * ratio * t) * np.exp(-decay * t)
+    return y * np.minimum(1.0, t / attack)
+
+
+def bird_chirp(rng, sr):
+    """Short rising or falling whistle"""
+    duration = rng.uniform(0.06, 0.2)
+    t = np.arange(int(duration * sr)) / sr
+    f_start = rng.uniform(2500, 4500)
+    f_end = f_start * rng.uniform(0.7, 1.4)
+    # Phase of a linear sweep from f_start to f_end
+    phase = 2 * np.pi * (f_start * t + (f_end - f_start) * t ** 2 / (2 * duration))
+    return 0.5 * np.sin(phase) * np.sin(np.pi * t / duration) ** 2
+
+
+def droplet(rng, sr):
+    """Single rain drop: fast-decaying high sine"""
+    t = np.arange(int(0.04 * sr)) / sr
+    return rng.uniform(0.1, 0.4) * np.sin(2 * np.pi * rng.uniform(1500, 4000) * t) * np.exp(-t * 120)
+
+
+def piano_note(rng, sr):
+    """Soft struck note with slightly stretched partials"""
+    t = np.arange(int(3.0 * sr)) / sr
+    ratios = [k * (1 + 0.0004 * k * k) for k in range(1, 7)]
+    amps = [0.6 / k ** 1.5 for k in range(1, 7)]
+    decays = [1.2 + 0.5 * k for k in range(1, 7)]
+    return _decaying_partials(t, rng.choice(PENTATONIC), ratios, amps, decays)
+
+
+def harp_pluck(rng, sr):
+    """Bright pluck, an octave above the piano register"""
+    t = np.arange(int(2.0 * sr)) / sr
+    ratios = list(range(1, 6))
+    amps = [0.5 / k for k in ratios]
+    decays = [2.0 + 1.2 * k for k in ratios]
+    return _decaying_partials(t, rng.choice(PENTATONIC) * 2, ratios, amps, decays, attack=0.002)
+
+
+def bowl_strike(rng, sr):
+    """Singing bowl: inharmonic partials, long decay and slow beating"""
+    t = np.arange(int(10.0 * sr)) / sr
+    strike = _decaying_partials(t, rng.uniform(180, 260), [1.0, 2.71, 5.15, 8.43],
+                                [0.6, 0.3, 0.12, 0.05], [0.3, 0.5, 0.9, 1.5], attack=0.01)
+    return strike * (1 + 0.3 * np.sin(2 * np.pi * rng.uniform(0.8, 2.0) * t))
+
+
+def flute_note(rng, sr):
+    """Breathy sustained note with vibrato"""
+    duration = rng.uniform(2.0, 4.0)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = rng.choice(PENTATONIC) * 2
+    phase = 2 * np.pi * f0 * t + 0.5 * np.sin(2 * np.pi * 5 * t)
+    tone = np.sin(phase) + 0.4 * np.sin(2 * phase) + 0.15 * np.sin(3 * phase)
+    envelope = np.minimum(1.0, t / 0.3) * np.minimum(1.0, (duration - t) / 0.6)
+    return 0.25 * tone * envelope
+
+
+class ElementSynth:
+    """One soundscape element rendered block by block (noise beds, textures, tones, events)"""
+
+    def __init__(self, name, rng, sample_rate, intensity=0.5):
+        self.name = name
+        self.rng = rng
+        self.sr = sample_rate
+        self.intensity = intensity
+        self.noise = NoiseSource(ELEMENT_NOISE.get(name, 'pink'), rng, sample_rate)
+        self.filters = [Lowpass(cutoff, sample_rate) for cutoff in ELEMENT_FILTERS.get(name, [])]
+        self.events = None
+        if name in ELEMENT_EVENTS:
+            rate, make_event, max_seconds = ELEMENT_EVENTS[name]
+            self.events = EventLayer(rng, sample_rate, rate * (0.5 + intensity), make_event, max_seconds)
+        # Random phases and rates so layers of the same element do not move in lockstep
+        self.lfo = rng.uniform(0, 2 * np.pi, 4)
+        self.root = rng.choice(PENTATONIC[:4])
+
+    def render(self, t):
+        """Mono samples for absolute times t (seconds)"""
+        n = len(t)
+        render = getattr(self, '_render_' + self.name, None)
+        y = render(t) if render else self.noise.render(n) * NOISE_BED_LEVEL
+        if self.events is not None:
+            y = y + self.events.render(n, t)
+        return y
+
+    # Nature textures
+    def _render_rain(self, t):
+        hiss = self.noise.render(len(t))
+        hiss = hiss - self.filters[0](hiss)
+        return 0.35 * hiss * (0.85 + 0.15 * np.sin(2 * np.pi * 0.13 * t + self.lfo[0]))
+
+    def _render_ocean(self, t):
+        surf = self.filters[0](self.noise.render(len(t))) * 0.33
+        period = 9.0 + 2.0 * np.sin(2 * np.pi * 0.01 * t + self.lfo[0])
+        swell = (0.5 - 0.5 * np.cos(2 * np.pi * t / period + self.lfo[1])) ** 1.5
+        return surf * (0.25 + 0.75 * swell)
+
+    def _render_stream(self, t):
+        white = self.noise.render(len(t))
+        band = self.filters[0](white) - self.filters[1](white)
+        flutter = 0.7 + 0.1 * (np.sin(2 * np.pi * 3.1 * t + self.lfo[0]) +
+                               np.sin(2 * np.pi * 5.7 * t + self.lfo[1]) +
+                               np.sin(2 * np.pi * 10.9 * t + self.lfo[2]))
+        return 0.75 * band * flutter
+
+    def _render_forest(self, t):
+        wind = self.filters[0](self.noise.render(len(t))) * 0.35
+        gusts = 0.5 + 0.25 * (np.sin(2 * np.pi * 0.05 * t + self.lfo[0]) + np.sin(2 * np.pi * 0.17 * t + self.lfo[1]))
+        return wind * gusts
+
+    def _render_birds(self, t):
+        return 0.2 * self.filters[0](self.noise.render(len(t)))
+
+    # Tonal beds
+    def _render_crystal(self, t):
+        y = np.zeros_like(t)
+        for k, ratio in enumerate([4, 6, 9, 12]):
+            shimmer = 0.5 + 0.5 * np.sin(2 * np.pi * (0.07 + 0.03 * k) * t + self.lfo[k])
+            y += np.sin(2 * np.pi * self.root * ratio * t) * shimmer / (k + 2)
+        return 0.5 * y
+
+    def _render_space(self, t):
+        root = self.root / 4
+        drone = sum(np.sin(2 * np.pi * root * ratio * (1 + detune) * t)
+                    for ratio in (1, 1.5, 2) for detune in (-0.003, 0.003))
+        swell = 0.6 + 0.4 * np.sin(2 * np.pi * 0.02 * t + self.lfo[0])
+        rumble = self.filters[0](self.noise.render(len(t)))
+        return 0.08 * drone * swell + 0.15 * rumble
+
+    def _render_strings(self, t):
+        y = np.zeros_like(t)
+        vibrato = 0.004 * np.sin(2 * np.pi * 5.2 * t + self.lfo[0])
+        for interval in (1, 1.5, 2, 2.5):
+            for detune in (-0.002, 0.002):
+                # Cycles elapsed, looked up in a one-period wavetable of the bowed timbre
+                cycles = self.root * interval * (1 + detune) * t + vibrato * 8
+                y += STRING_WAVETABLE[((cycles % 1.0) * WAVETABLE_SIZE).astype(np.intp)]
+        swell = 0.6 + 0.4 * np.sin(2 * np.pi * 0.03 * t + self.lfo[1])
+        return 0.1 * y * swell
+
+    def _render_piano(self, t):
+        return np.zeros_like(t)
+
+    _render_harp = _render_flute = _render_piano
+
+    def _render_singing_bowl(self, t):
+        # A faint sustained hum under the strikes
+        return 0.05 * np.sin(2 * np.pi * self.root * t)
+
+
+# Noise color feeding each element (elements not listed render pink noise)
+ELEMENT_NOISE = {'white_noise': 'white', 'brown_noise': 'brown', 'ocean': 'brown', 'forest': 'brown',
+                 'space': 'brown', 'stream': 'white', 'rain': 'pink', 'birds': 'pink'}
+
+# Lowpass cutoffs (Hz) used by each element's texture
+ELEMENT_FILTERS = {'rain': [400], 'ocean': [900], 'stream': [3000, 400], 'forest': [600],
+                   'birds': [1500], 'space': [200]}
+
+# (events per second at medium intensity, event factory, longest event in seconds)
+ELEMENT_EVENTS = {
+    'rain': (12.0, droplet, 0.05),
+    'birds': (1.5, bird_chirp, 0.25),
+    'forest': (0.3, bird_chirp, 0.25),
+    'piano': (0.4, piano_note, 3.0),
+    'harp': (0.7, harp_pluck, 2.0),
+    'flute': (0.35, flute_note, 4.0),
+    'singing_bowl': (0.11, bowl_strike, 10.0)
+}
+
+
+def plan_seed(plan):
+    """Stable seed from a plan's audible content, so the same plan always renders the same audio"""
+    audible = {key: plan.get(key) for key in ('layers', 'transition_points', 'duration_minutes')}
+    digest = hashlib.sha256(json.dumps(audible, sort_keys=True).encode()).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
+def save_plan(plan, directory=SOUNDSCAPE_DIR):
+    """Store a plan under its content address so its audio can be requested later"""
+    soundscape_id = f"{plan_seed(plan):016x}"
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{soundscape_id}.json")
+    if os.path.exists(path):
+        os.utime(path)      # Same plan requested again: keep it clear of the nightly prune
+    else:
+        with open(path, 'w') as f:
+            json.dump(plan, f)
+    return soundscape_id
+
+
+def load_plan(soundscape_id, directory=SOUNDSCAPE_DIR):
+    """(plan, path) for a stored soundscape id, or (None, None)"""
+    if not re.fullmatch(r'[0-9a-f]{16}', soundscape_id or ''):
+        return None, None
+    path = os.path.join(directory, f"{soundscape_id}.json")
+    if not os.path.isfile(path):
+        return None, None
+    with open(path) as f:
+        return json.load(f), path
+
+
+def prune_plans(directory=SOUNDSCAPE_DIR, max_age_days=PLAN_TTL_DAYS):
+    """Delete stored plans not written in max_age_days; returns how many were removed"""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                print(f"⚠️ Could not prune soundscape plan {entry.name}: {e}")
+    print(f"🧹 Pruned {removed} soundscape plans older than {max_age_days} days")
+    return removed
+
+
+def equal_power(progress):
+    """Equal-power fade curve for progress in [0, 1]"""
+    return np.sin(0.5 * np.pi * np.clip(progress, 0.0, 1.0))
+
+
+class SoundscapeRenderer:
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=CHANNELS, block_seconds=BLOCK_SECONDS, stem_cache=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_frames = int(block_seconds * sample_rate)
+        self.stem_cache = stem_cache      # Optional StemCache: mix pre-rendered loops instead of synthesizing
+
+    def total_frames(self, plan):
+        """Length of the rendered soundscape in frames"""
+        return int(plan.get('duration_minutes', 15) * 60 * self.sample_rate)
+
+    def layer_gain(self, layer, t, total_seconds):
+        """Volume envelope of one layer: staggered start, fade in, fade out"""
+        start = layer.get('start_time', 0)
+        end = min(start + layer.get('duration', total_seconds), total_seconds)
+        fade_in = max(layer.get('fade_in', 0), 1e-3)
+        fade_out = max(layer.get('fade_out', 0), 1e-3)
+        volume = layer.get('volume', 0.5)
+        # Most blocks sit wholly inside or outside a layer, so skip the curve math there
+        if t[-1] <= start or t[0] >= end:
+            return np.zeros_like(t)
+        if t[0] >= start + fade_in and t[-1] <= end - fade_out:
+            return np.full_like(t, volume)
+        return volume * equal_power((t - start) / fade_in) * equal_power((end - t) / fade_out)
+
+    def transition_gains(self, transitions, t, num_layers):
+        """Per-layer multipliers for the plan's transition points, shape (num_layers, len(t))"""
+        gains = np.ones((num_layers, len(t)))
+        emphasis = np.zeros_like(t)
+        level_db = np.zeros_like(t)
+        direction = 1.0
+        for i, transition in enumerate(transitions):
+            start = transition.get('time_seconds', 0)
+            progress = np.clip((t - start) / max(transition.get('duration', 1), 1e-3), 0.0, 1.0)
+            kind = transition.get('type')
+            if kind == 'crossfade':
+                # Alternate the focus between even and odd layers
+                emphasis += direction * progress
+                direction = -direction
+            elif kind == 'fade':
+                gains *= 1 - 0.5 * np.sin(np.pi * progress)
+            elif kind == 'intensity_change':
+                level_db += (3.0 if i % 2 == 0 else -3.0) * progress
+        if num_layers > 1 and any(tr.get('type') == 'crossfade' for tr in transitions):
+            angle = 0.5 * np.pi * np.clip(emphasis, 0.0, 1.0)
+            gains[0::2] *= 0.4 + 0.6 * np.cos(angle)
+            gains[1::2] *= 0.4 + 0.6 * np.sin(angle)
+        return gains * 10 ** (level_db / 20)
+
+    def _layer_source(self, element, intensity, seed, index):
+        """Something with render(t) for one layer: a cached stem loop or a live synth"""
+        rng = np.random.default_rng([seed, index])
+        if self.stem_cache is not None:
+            # Random loop offset so two layers of the same element are not in phase
+            return self.stem_cache.loop(element, intensity, offset=int(rng.integers(0, 1 << 31)))
+        return ElementSynth(element, rng, self.sample_rate, intensity)
+
+    def iter_blocks(self, plan, dtype='int16', start_frame=0):
+        """Yield (frames, channels) arrays from start_frame to the end of the soundscape"""
+        seed = plan_seed(plan)
+        sr = self.sample_rate
+        layers = plan.get('layers', [])
+        transitions = plan.get('transition_points', [])
+        intensities = {elem['name']: elem.get('intensity', 0.5) for elem in plan.get('elements', [])}
+        synths = [self._layer_source(layer['element'], intensities.get(layer['element'], 0.5), seed, i)
+                  for i, layer in enumerate(layers)]
+
+        # Constant-power pan positions spread across the stereo field
+        pans = np.linspace(-0.5, 0.5, len(layers)) if len(layers) > 1 else np.zeros(1)
+        pan_gains = np.stack([np.cos((pans + 1) * np.pi / 4), np.sin((pans + 1) * np.pi / 4)], axis=1)
+        master = MASTER_HEADROOM / math.sqrt(max(1, len(layers)))
+
+        total = self.total_frames(plan)
+        total_seconds = total / sr
+        for position in range(0, total, self.block_frames):
+            n = min(self.block_frames, total - position)
+            skipped = position + n <= start_frame
+            # Stem loops are pure functions of time, so a seek jumps straight to the block;
+            # live synths carry state and must still run through the skipped blocks
+            if skipped and self.stem_cache is not None:
+                continue
+            t = (position + np.arange(n)) / sr
+            mix = np.zeros((n, self.channels))
+            moves = self.transition_gains(transitions, t, len(layers))
+            for i, (layer, synth) in enumerate(zip(layers, synths)):
+                gain = self.layer_gain(layer, t, total_seconds) * moves[i]
+                if not gain.any():
+                    continue
+                mono = synth.render(t) * gain
+                if self.channels == 1:
+                    mix[:, 0] += mono
+                else:
+                    mix[:, 0] += mono * pan_gains[i, 0]
+                    mix[:, 1] += mono * pan_gains[i, 1]
+            # Soft limiter: transparent at normal levels, rounds off rare peaks
+            block = np.tanh(mix * master)
+            if skipped:
+                continue
+            if position < start_frame:
+                block = block[start_frame - position:]
+            if dtype == 'int16':
+                yield (block * 32767).astype('<i2')
+            else:
+                yield block.astype(np.float32)
+
+    def iter_pcm(self, plan, start_frame=0):
+        """Yield little-endian 16-bit PCM bytes block by block"""
+        for block in self.iter_blocks(plan, start_frame=start_frame):
+            yield block.tobytes()
+
+    def wav_header(self, plan):
+        """44-byte WAV header for the full rendered length, for streaming without seeking"""
+        data_size = self.total_frames(plan) * self.channels * 2
+        if data_size > MAX_WAV_DATA_BYTES:
+            raise ValueError(f"Soundscape too long for a WAV file ({data_size} data bytes)")
+        return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1,
+                           self.channels, self.sample_rate, self.sample_rate * self.channels * 2,
+                           self.channels * 2, 16, b'data', data_size)
+
+    def iter_wav(self, plan):
+        """Yield a complete WAV file as header plus PCM blocks"""
+        yield self.wav_header(plan)
+        yield from self.iter_pcm(plan)
+
+    def wav_length(self, plan):
+        """Size in bytes of the complete WAV file"""
+        return WAV_HEADER_BYTES + self.total_frames(plan) * self.channels * 2
+
+    def iter_wav_range(self, plan, start, end):
+        """Yield bytes [start, end] (inclusive) of the WAV file, rendering only from the seek point"""
+        if start < WAV_HEADER_BYTES:
+            yield self.wav_header(plan)[start:end + 1]
+        if end < WAV_HEADER_BYTES:
+            return
+        frame_bytes = self.channels * 2
+        offset = max(start, WAV_HEADER_BYTES) - WAV_HEADER_BYTES
+        remaining = end + 1 - WAV_HEADER_BYTES - offset
+        skip = offset % frame_bytes
+        for pcm in self.iter_pcm(plan, start_frame=offset // frame_bytes):
+            chunk = pcm[skip:skip + remaining]
+            skip = 0
+            remaining -= len(chunk)
+            yield chunk
+            if remaining <= 0:
+                return
+
+    def render_to_file(self, plan, path):
+        """Render a plan to a 16-bit WAV file"""
+        with wave.open(path, 'wb') as wav:
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            for pcm in self.iter_pcm(plan):
+                wav.writeframes(pcm)
+        return path
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+    from soundscape_generator import SoundscapeGenerator
+
+    parser = argparse.ArgumentParser(description="Render a generated soundscape to a WAV file")
+    parser.add_argument('emotion', nargs='?', default='anxiety')
+    parser.add_argument('--intensity', default='medium', choices=['gentle', 'medium', 'intense'])
+    parser.add_argument('--minutes', type=int, default=5)
+    parser.add_argument('--output', default='soundscape.wav')
+    parser.add_argument('--stems', action='store_true', help="Mix cached loopable stems instead of synthesizing")
+    args = parser.parse_args()
+
+    plan = SoundscapeGenerator().generate_soundscape(args.emotion, args.intensity, args.minutes)
+    cache = None
+    if args.stems:
+        from stem_cache import stem_cache as cache
+    started = time.perf_counter()
+    SoundscapeRenderer(stem_cache=cache).render_to_file(plan, args.output)
+    elapsed = time.perf_counter() - started
+    print(f"🎵 Rendered {args.minutes} min of {', '.join(l['element'] for l in plan['layers'])} "
+          f"in {elapsed:.1f}s ({args.minutes * 60 / elapsed:.0f}x real time) -> {args.output}")
@@ -1,56 +1,102 @@
 # spotify_integration.py - Spotify API integration for music
 import os
-import requests
+import time
 import base64
+import threading
+import requests
+from api_client import ApiClient
+from catalog import content_catalog
+
+SPOTIFY_API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
+SPOTIFY_AUTH_URL = os.getenv('SPOTIFY_AUTH_URL', 'https://accounts.spotify.com/api/token')
+TOKEN_REFRESH_MARGIN = 60     # Refresh this many seconds before the token expires
+AUDIO_FEATURES_BATCH = 100    # Spotify's limit on ids per audio-features call
+OFFLINE_CATALOG = os.getenv('OFFLINE_CATALOG', '0') == '1'    # Serve searches from the local catalog only
+
+
+class TokenCache:
+    """Process-wide client-credentials tokens, refreshed by one thread shortly before expiry"""
+
+    def __init__(self):
+        self._tokens = {}             # client_id -> (token, monotonic expiry)
+        self._lock = threading.Lock()
+
+    def get(self, client_id, fetch):
+        """Cached token for client_id, calling fetch() -> (token, expires_in) when missing or stale"""
+        with self._lock:
+            token, expires_at = self._tokens.get(client_id, (None, 0))
+            if token and time.monotonic() < expires_at - TOKEN_REFRESH_MARGIN:
+                return token
+            token, expires_in = fetch()
+            if token:
+                self._tokens[client_id] = (token, time.monotonic() + expires_in)
+            return token
+
+    def invalidate(self, client_id, token):
+        """Drop a token the API rejected (unless another thread already replaced it)"""
+        with self._lock:
+            if self._tokens.get(client_id, (None, 0))[0] == token:
+                del self._tokens[client_id]
+
+
+spotify_tokens = TokenCache()
+
 
 class SpotifyIntegration:
     def __init__(self):
         self.client_id = os.getenv('SPOTIFY_CLIENT_ID', 'YOUR_SPOTIFY_CLIENT_ID')
         self.client_secret = os.getenv('SPOTIFY_CLIENT_SECRET', 'YOUR_SPOTIFY_CLIENT_SECRET')
         self.access_token = None
-        self.base_url = "https://api.spotify.com/v1"
-    
+        self.base_url = SPOTIFY_API_URL
+        self.auth_url = SPOTIFY_AUTH_URL
+        self.client = ApiClient('spotify')
+
     def get_access_token(self):
-        """Get Spotify access token"""
+        """Get Spotify access token (shared across instances until shortly before expiry)"""
         try:
-            auth_string = f"{self.client_id}:{self.client_secret}"
-            auth_bytes = auth_string.encode('utf-8')
-            auth_base64 = base64.b64encode(auth_bytes).decode('utf-8')
-            
-            url = "https://accounts.spotify.com/api/token"
-            headers = {
-                'Authorization': f'Basic {auth_base64}',
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-            data = {'grant_type': 'client_credentials'}
-            
-            response = requests.post(url, headers=headers, data=data)
-            result = response.json()
-            
-            self.access_token = result.get('access_token')
+            self.access_token = spotify_tokens.get(self.client_id, self._request_token)
             return self.access_token
         except Exception as e:
             print(f"Spotify auth error: {e}")
             return None
-    
-    def search_tracks(self, query, max_results=10):
-        """Search Spotify tracks by query"""
+
+    def _request_token(self):
+        """Client-credentials grant: returns (token, expires_in seconds)"""
+        auth_string = f"{self.client_id}:{self.client_secret}"
+        auth_base64 = base64.b64encode(auth_string.encode('utf-8')).decode('utf-8')
+        headers = {
+            'Authorization': f'Basic {auth_base64}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        response = self.client.post(self.auth_url, headers=headers, data={'grant_type': 'client_credentials'})
+        result = response.json()
+        return result.get('access_token'), result.get('expires_in', 3600)
+
+    def _get(self, path, params):
+        """Authorized GET; a 401 means the token was revoked early, so refresh once and retry"""
+        for attempt in range(2):
+            token = self.get_access_token()
+            try:
+                response = self.client.get(f"{self.base_url}/{path}",
+                                           headers={'Authorization': f'Bearer {token}'}, params=params)
+                return response.json()
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 401 or attempt:
+                    raise
+                spotify_tokens.invalidate(self.client_id, token)
+
+    def search_tracks(self, query, max_results=10, strict=False):
+        """Search Spotify tracks by query (strict=True raises; otherwise falls back to the offline catalog)"""
+        if OFFLINE_CATALOG:
+            return content_catalog.search_tracks(query, max_results)
         try:
-            if not self.access_token:
-                self.get_access_token()
-            
-            url = f"{self.base_url}/search"
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            params = {
+            data = self._get('search', {
                 'q': query,
                 'type': 'track',
                 'limit': max_results,
                 'market': 'US'
-            }
-            
-            response = requests.get(url, headers=headers, params=params)
-            data = response.json()
-            
+            })
+
             tracks = []
             for item in data.get('tracks', {}).get('items', []):
                 track = {
@@ -65,48 +111,38 @@ class SpotifyIntegration:
                     'album_image': item['album']['images'][0]['url'] if item['album']['images'] else None
                 }
                 tracks.append(track)
-            
+
             return tracks
         except Exception as e:
+            if strict:
+                raise
             print(f"Spotify search error: {e}")
-            return []
-    
+            return content_catalog.search_tracks(query, max_results)
+
     def get_audio_features(self, track_ids):
-        """Get audio features for tracks"""
+        """Get audio features for tracks, in input order (None for unknown ids)"""
         try:
-            if not self.access_token:
-                self.get_access_token()
-            
-            url = f"{self.base_url}/audio-features"
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            params = {'ids': ','.join(track_ids)}
-            
-            response = requests.get(url, headers=headers, params=params)
-            data = response.json()
-            
-            return data.get('audio_features', [])
+            track_ids = list(track_ids)
+            features = []
+            for start in range(0, len(track_ids), AUDIO_FEATURES_BATCH):
+                batch = track_ids[start:start + AUDIO_FEATURES_BATCH]
+                data = self._get('audio-features', {'ids': ','.join(batch)})
+                features.extend(data.get('audio_features') or [None] * len(batch))
+            return features
         except Exception as e:
             print(f"Audio features error: {e}")
             return []
-    
+
     def get_recommendations(self, seed_tracks, max_results=10):
         """Get track recommendations based on seed tracks"""
         try:
-            if not self.access_token:
-                self.get_access_token()
-            
-            url = f"{self.base_url}/recommendations"
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            params = {
+            data = self._get('recommendations', {
                 'seed_tracks': ','.join(seed_tracks),
                 'limit': max_results,
                 'market': 'US'
-            }
-            
-            response = requests.get(url, headers=headers, params=params)
-            data = response.json()
-            
+            })
+
             return data.get('tracks', [])
         except Exception as e:
             print(f"Recommendations error: {e}")
-            return []
\ No newline at end of file
+            return []
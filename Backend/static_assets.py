@@ -0,0 +1,183 @@
+# static_assets.py - In-memory pages and assets with precompressed variants, strong ETags and fingerprinted URLs
+import os
+import re
+import gzip
+import time
+import hashlib
+import mimetypes
+import threading
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None       # gzip only
+
+STATIC_DIR = os.environ.get('STATIC_DIR', '.')
+STATIC_EXTENSIONS = ('.html', '.css', '.js', '.ico', '.svg', '.png')     # Never .json or .db: the cwd holds state files
+COMPRESSIBLE = ('.html', '.css', '.js', '.svg')
+MIN_COMPRESS_BYTES = 512            # Smaller bodies are not worth a Content-Encoding
+WATCH_INTERVAL = 1.0                # Seconds between mtime polls in dev
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+ASSET_CACHE = 'no-cache'            # Unversioned URL: reuse, but revalidate with the ETag
+PAGE_CACHE = 'private, no-cache'    # Pages sit behind the login redirect
+
+# href="style.css" / src="/auth.js" in pages, rewritten to the fingerprinted URL
+ASSET_REFERENCE = re.compile(r'''(?P<attr>(?:href|src)=["'])(?P<slash>/?)(?P<name>[\w.-]+\.(?:css|js))(?=["'])''')
+
+
+class Asset:
+    """One file's bytes plus every encoding we can send, each with its own strong ETag"""
+
+    __slots__ = ('name', 'mimetype', 'mtime', 'fingerprint', 'variants')
+
+    def __init__(self, name, body, mtime):
+        self.name = name
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if self.mimetype.startswith('text/') or self.mimetype in ('application/javascript', 'text/javascript'):
+            self.mimetype += '; charset=utf-8'
+        self.mtime = mtime
+        digest = hashlib.sha256(body).hexdigest()
+        self.fingerprint = digest[:12]
+        # encoding -> (body, etag); representations differ, so their strong ETags must too
+        self.variants = {'identity': (body, digest[:32])}
+        if name.endswith(COMPRESSIBLE) and len(body) >= MIN_COMPRESS_BYTES:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = (compressed, digest[:32] + '-gz')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants['br'] = (compressed, digest[:32] + '-br')
+
+
+class StaticAssets:
+    """Loads every page and asset once; in dev a watcher thread reloads files whose mtime changes"""
+
+    def __init__(self, directory=STATIC_DIR):
+        self.directory = directory
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.stats = {'loads': 0, 'hits': 0, 'not_modified': 0}
+
+    def _files(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return {}
+        files = {}
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.endswith(STATIC_EXTENSIONS) and os.path.isfile(path):
+                files[name] = os.stat(path).st_mtime_ns
+        return files
+
+    def load(self):
+        """(Re)load every file; pages are rendered after assets so they link the current fingerprints"""
+        files = self._files()
+        raw = {}
+        for name, mtime in files.items():
+            with open(os.path.join(self.directory, name), 'rb') as handle:
+                raw[name] = (handle.read(), mtime)
+        assets = {name: Asset(name, body, mtime) for name, (body, mtime) in raw.items()
+                  if not name.endswith('.html')}
+        for name, (body, mtime) in raw.items():
+            if name.endswith('.html'):
+                assets[name] = Asset(name, self._link_fingerprints(body, assets), mtime)
+        with self._lock:
+            self._assets = assets
+        self.stats['loads'] += 1
+        return len(assets)
+
+    def _link_fingerprints(self, body, assets):
+        """Point page references at ?v=<fingerprint> URLs, which are cached as immutable"""
+        def replace(match):
+            asset = assets.get(match.group('name'))
+            if asset is None:
+                return match.group(0)
+            return f"{match.group('attr')}{match.group('slash')}{asset.name}?v={asset.fingerprint}"
+        return ASSET_REFERENCE.sub(replace, body.decode('utf-8')).encode('utf-8')
+
+    def get(self, name):
+        """Cached asset by file name; the first call loads the directory"""
+        if not self.stats['loads']:
+            self.load()
+        with self._lock:
+            return self._assets.get(name)
+
+    def asset_url(self, name):
+        asset = self.get(name)
+        return f"/{name}?v={asset.fingerprint}" if asset else f"/{name}"
+
+    def response(self, name, not_found_message=None):
+        """Serve a cached file, honouring If-None-Match and Accept-Encoding"""
+        asset = self.get(name)
+        if asset is None:
+            return not_found_message or f"{name} not found", 404
+
+        if name.endswith('.html'):
+            cache_control = PAGE_CACHE
+        elif request.args.get('v') == asset.fingerprint:
+            cache_control = IMMUTABLE_CACHE
+        else:
+            cache_control = ASSET_CACHE
+
+        encoding = self._choose_encoding(asset)
+        body, etag = asset.variants[encoding]
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+
+        # Weak comparison (RFC 9110): any representation of the same bytes is still current
+        if request.if_none_match and (request.if_none_match.star_tag or any(
+                request.if_none_match.contains_weak(tag) for _, tag in asset.variants.values())):
+            self.stats['not_modified'] += 1
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        self.stats['hits'] += 1
+        headers['Content-Type'] = asset.mimetype
+        return Response(body, status=200, headers=headers)     # Werkzeug drops the body for HEAD
+
+    def _choose_encoding(self, asset):
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.variants and accepted[encoding] > 0:
+                return encoding
+        return 'identity'
+
+    # Dev reload
+    def start_watching(self, interval=WATCH_INTERVAL):
+        """Poll mtimes and reload when any page or asset is added, changed or removed"""
+        if self._watcher is not None:
+            return
+        if not self.stats['loads']:
+            self.load()
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    files = self._files()
+                    with self._lock:
+                        current = {name: asset.mtime for name, asset in self._assets.items()}
+                    if files != current:
+                        count = self.load()
+                        print(f"♻️ Static assets reloaded ({count} files)")
+                except Exception as e:
+                    print(f"⚠️ Static asset watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name='static-asset-watcher', daemon=True)
+        self._watcher.start()
+
+    def get_status(self):
+        with self._lock:
+            assets = list(self._assets.values())
+        return dict(self.stats, files=len(assets),
+                    bytes=sum(len(asset.variants['identity'][0]) for asset in assets),
+                    compressed_variants=sum(len(asset.variants) - 1 for asset in assets))
+
+
+# Shared by the page and asset routes
+static_assets = StaticAssets()
@@ -0,0 +1,219 @@
+# stem_cache.py - Content-addressed, memory-mapped cache of loopable soundscape stems
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from soundscape_renderer import ElementSynth, SAMPLE_RATE
+
+STEM_DIR = os.environ.get('STEM_CACHE_DIR', os.path.join('uploads', 'stems'))
+STEM_SECONDS = 30             # Loop length; long enough that event patterns do not sound repetitive
+LOOP_CROSSFADE = 2.0          # Seconds of the tail blended into the head so the loop point is seamless
+PREROLL_SECONDS = 1.0         # Rendered and discarded so filters start settled
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+INT16_FULL_SCALE = 2.0        # Sample value stored as 32767 in int16 stems (peaks stay under it)
+STEM_VERSION = 1              # Bump when the synthesis changes, so old stems are never reused
+
+FORMATS = {'f32': np.float32, 'i16': np.int16}
+
+
+def _quantize_intensity(intensity):
+    """Stems are shared across plans at 0.1 intensity steps"""
+    return round(float(intensity), 1)
+
+
+def stem_key(element, intensity, sample_rate=SAMPLE_RATE, fmt='i16'):
+    """Content address of a stem: every parameter that changes its samples"""
+    spec = {'element': element, 'intensity': _quantize_intensity(intensity), 'sample_rate': sample_rate,
+            'seconds': STEM_SECONDS, 'crossfade': LOOP_CROSSFADE, 'format': fmt, 'version': STEM_VERSION}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:24]
+
+
+def render_loop(element, intensity, sample_rate=SAMPLE_RATE):
+    """Synthesize one loopable mono stem whose last sample flows into its first"""
+    length = int(STEM_SECONDS * sample_rate)
+    fade = int(LOOP_CROSSFADE * sample_rate)
+    preroll = int(PREROLL_SECONDS * sample_rate)
+    seed = int(hashlib.sha256(f"{element}:{_quantize_intensity(intensity)}".encode()).hexdigest()[:8], 16)
+    synth = ElementSynth(element, np.random.default_rng(seed), sample_rate, intensity)
+
+    # Render preroll + loop + crossfade tail in block-sized pieces
+    total = preroll + length + fade
+    block = 2 * sample_rate
+    audio = np.concatenate([synth.render((start + np.arange(min(block, total - start))) / sample_rate)
+                            for start in range(0, total, block)])[preroll:]
+
+    # The tail past the loop end continues where the head takes over: blend it in, equal power
+    loop = audio[:length].copy()
+    ramp = np.sin(0.5 * np.pi * np.arange(fade) / fade)
+    loop[:fade] = audio[:fade] * ramp + audio[length:length + fade] * np.cos(0.5 * np.pi * np.arange(fade) / fade)
+    return loop
+
+
+def loop_slice(stem, start, count):
+    """count samples of a looped stem starting at any absolute position"""
+    length = len(stem)
+    start %= length
+    if start + count <= length:
+        return np.asarray(stem[start:start + count])
+    pieces = []
+    while count > 0:
+        take = min(count, length - start)
+        pieces.append(np.asarray(stem[start:start + take]))
+        count -= take
+        start = 0
+    return np.concatenate(pieces)
+
+
+class StemLoop:
+    """Layer source for SoundscapeRenderer that slices a mapped stem instead of synthesizing"""
+
+    def __init__(self, stem, scale, sample_rate, offset=0):
+        self.stem = stem
+        self.scale = scale
+        self.sample_rate = sample_rate
+        self.offset = offset
+
+    def render(self, t):
+        start = int(round(t[0] * self.sample_rate)) + self.offset
+        return loop_slice(self.stem, start, len(t)) * self.scale
+
+
+class StemCache:
+    def __init__(self, directory=STEM_DIR, max_bytes=MAX_CACHE_BYTES, fmt='i16', sample_rate=SAMPLE_RATE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown stem format: {fmt}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._maps = {}
+        self._entries = OrderedDict()     # key -> file size, least recently used first
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.{self.fmt}")
+
+    def _scan(self):
+        """Rebuild the LRU order from files left by earlier runs (mtime is the last use)"""
+        files = []
+        for name in os.listdir(self.directory):
+            key, _, ext = name.partition('.')
+            if ext != self.fmt:
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+
+    @property
+    def scale(self):
+        """Multiplier from stored sample values back to float audio"""
+        return INT16_FULL_SCALE / 32767 if self.fmt == 'i16' else 1.0
+
+    def get(self, element, intensity):
+        """Memory-mapped stem for an element, rendering and storing it on a miss"""
+        key = stem_key(element, intensity, self.sample_rate, self.fmt)
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    return self._open(key)
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = threading.Event()
+                    break
+            # Another thread is rendering this stem: wait for it rather than render twice
+            pending.wait()
+
+        try:
+            self._store(key, render_loop(element, intensity, self.sample_rate))
+            with self._lock:
+                return self._open(key)
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def loop(self, element, intensity, offset=0):
+        """Renderer layer source for an element, starting offset samples into the loop"""
+        return StemLoop(self.get(element, intensity), self.scale, self.sample_rate, offset)
+
+    def _open(self, key):
+        """Map a cached stem read-only and mark it most recently used (caller holds the lock)"""
+        stem = self._maps.get(key)
+        if stem is None:
+            stem = np.memmap(self._path(key), dtype=FORMATS[self.fmt], mode='r')
+            self._maps[key] = stem
+        self._entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return stem
+
+    def _store(self, key, audio):
+        """Write a stem atomically, then evict least recently used stems over the size limit"""
+        if self.fmt == 'i16':
+            data = np.round(np.clip(audio / INT16_FULL_SCALE, -1, 1) * 32767).astype(np.int16)
+        else:
+            data = audio.astype(np.float32)
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        data.tofile(temp_path)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._entries[key] = data.nbytes
+            self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        """Delete least recently used stems until the cache fits (caller holds the lock)"""
+        total = sum(self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key)
+            # Open maps stay valid after unlink, so renders in progress are unaffected
+            self._maps.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def warm_up(self, elements=None):
+        """Render any missing stems for the given (element, intensity) pairs"""
+        if elements is None:
+            from soundscape_generator import SoundscapeGenerator
+            elements = [(name, data['intensity'])
+                        for group in SoundscapeGenerator().sound_elements.values()
+                        for name, data in group.items()]
+        rendered = 0
+        for element, intensity in elements:
+            key = stem_key(element, intensity, self.sample_rate, self.fmt)
+            if key not in self._entries:
+                self.get(element, intensity)
+                rendered += 1
+        print(f"🎼 Stem cache warm: {len(elements)} stems ({rendered} rendered), "
+              f"{sum(self._entries.values()) / 1e6:.0f} MB in {self.directory}")
+        return rendered
+
+    def warm_up_async(self, elements=None):
+        """Warm the cache in a background thread so startup is not delayed"""
+        thread = threading.Thread(target=self.warm_up, args=(elements,), name='stem-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def get_status(self):
+        """Cached stem count and size"""
+        with self._lock:
+            return {'stems': len(self._entries), 'bytes': sum(self._entries.values()),
+                    'max_bytes': self.max_bytes, 'format': self.fmt}
+
+
+# Shared by the soundscape routes and startup warm-up
+stem_cache = StemCache()
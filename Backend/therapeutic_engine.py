@@ -1,97 +1,190 @@
 # therapeutic_engine.py - Main therapy recommendation system
-from content_library import ContentLibrary
-from database import get_db_connection, create_therapy_session
+import random
+import threading
+from collections import deque
 from datetime import datetime
+import numpy as np
+from content_index import content_index
+from content_ranker import content_ranker
+from therapy_session_log import therapy_session_log
+
+IMMEDIATE_TYPES = ['exercise', 'video', 'music']     # Priority order for immediate relief
+DAILY_TYPES = ['music', 'exercise']
+# More intense moods get shorter immediate interventions
+RELIEF_MAX_MINUTES = {'low': 20, 'medium': 15, 'high': 10}
+RECENT_PER_USER = 12          # Items remembered per user so consecutive plans vary
+RECENT_USERS = 10000          # Users tracked before the oldest are forgotten
+
+THERAPEUTIC_INSIGHTS = {
+    'sadness': {
+        'title': 'Understanding Sadness',
+        'message': 'Sadness often signals that something matters to us deeply. It can be a catalyst for meaningful change and self-reflection.',
+        'action': 'Allow yourself to feel this fully, then gently engage in comforting activities.'
+    },
+    'anxiety': {
+        'title': 'Working with Anxiety',
+        'message': 'Anxiety is your body\'s way of saying "I care about what happens next." It becomes problematic when it runs without brakes.',
+        'action': 'Ground yourself in the present moment through breathing and sensory awareness.'
+    },
+    'anger': {
+        'title': 'Transforming Anger',
+        'message': 'Anger often points to violated boundaries or unmet needs. It carries tremendous energy for change.',
+        'action': 'Channel this energy constructively through physical movement or clear communication.'
+    },
+    'joy': {
+        'title': 'Amplifying Joy',
+        'message': 'Joy connects us to what truly matters. These moments are precious resources for resilience.',
+        'action': 'Savor this feeling and consider sharing it with others to multiply its impact.'
+    },
+    'neutral': {
+        'title': 'Embracing Neutrality',
+        'message': 'Neutral states provide the foundation from which all other emotions emerge. They offer valuable rest and integration time.',
+        'action': 'Use this space for reflection and gentle exploration of what you truly need.'
+    }
+}
+
+
+class PlanTemplate:
+    """Everything in a therapy plan that does not depend on the user, for one (emotion, intensity)"""
+
+    def __init__(self, snapshot, emotion, intensity):
+        max_minutes = RELIEF_MAX_MINUTES.get(intensity, RELIEF_MAX_MINUTES['medium'])
+        self.relief_pools = [self._pool(snapshot.content_candidates(emotion, content_type, 'immediate_relief',
+                                                                    max_minutes))
+                             for content_type in IMMEDIATE_TYPES]
+        self.fallback_pool = self._pool(snapshot.content_candidates(emotion, 'exercise'))
+        self.daily_pools = [self._pool(snapshot.content_candidates(emotion, content_type, 'daily_practice'))
+                            for content_type in DAILY_TYPES]
+        self.lifestyle_pool = [row for rows, count in snapshot.lifestyle_candidates(emotion) for row in rows[:count]]
+        self.insight = THERAPEUTIC_INSIGHTS.get(emotion, THERAPEUTIC_INSIGHTS['neutral'])
+
+    def _pool(self, segments):
+        """(rows, content ids as an array) so the ranker can score a whole pool at once"""
+        rows = [row for rows, count in segments for row in rows[:count]]
+        return rows, np.array([row['id'] for row in rows], dtype=np.int64)
+
+
+class PlanTemplates:
+    """Templates for every (emotion, intensity), rebuilt whenever the content snapshot changes"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def get(self, emotion, intensity):
+        snapshot = content_index.snapshot()
+        if snapshot is not self._snapshot:
+            with self._lock:
+                if snapshot is not self._snapshot:
+                    emotions = set(snapshot.content_buckets) | set(snapshot.lifestyle_buckets) | set(THERAPEUTIC_INSIGHTS)
+                    self._templates = {(name, level): PlanTemplate(snapshot, name, level)
+                                       for name in emotions for level in RELIEF_MAX_MINUTES}
+                    self._snapshot = snapshot
+        # Request input never adds keys: unknown intensities are 'medium', unknown emotions 'neutral'
+        intensity = normalize_intensity(intensity)
+        return self._templates.get((emotion, intensity)) or self._templates[('neutral', intensity)]
+
+
+def normalize_intensity(intensity):
+    """A RELIEF_MAX_MINUTES key for whatever the client sent"""
+    if isinstance(intensity, str) and intensity.lower() in RELIEF_MAX_MINUTES:
+        return intensity.lower()
+    return 'medium'
+
+
+plan_templates = PlanTemplates()
+
+
+class RecentItems:
+    """Content recently shown to each user, so a new plan prefers items they have not just seen"""
 
-class TherapeuticEngine:
     def __init__(self):
-        self.content_lib = ContentLibrary()
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            return set(self._recent.get(user_id, ()))
+
+    def add(self, user_id, content_ids):
+        with self._lock:
+            recent = self._recent.pop(user_id, None) or deque(maxlen=RECENT_PER_USER)
+            recent.extend(content_ids)
+            self._recent[user_id] = recent     # Re-inserted last, so the oldest users are dropped first
+            while len(self._recent) > RECENT_USERS:
+                self._recent.pop(next(iter(self._recent)))
+
+
+recent_items = RecentItems()
+
+
+def _pick(pool, count, avoid, rng=random):
+    """Up to count items from a pool in O(count), preferring ids not in avoid"""
+    if count <= 0 or not pool:
+        return []
+    drawn = rng.sample(pool, min(len(pool), count + len(avoid)))
+    fresh = [row for row in drawn if row.get('id') not in avoid]
+    return (fresh + [row for row in drawn if row.get('id') in avoid])[:count]
+
+
+class TherapeuticEngine:
+    """Per-request facade over the shared plan templates (no connection of its own)"""
 
     def generate_therapy_plan(self, user_id, current_emotion, mood_intensity='medium'):
         """Generate complete therapeutic intervention plan"""
-        print(f"🎯 Generating therapy plan for {current_emotion} (intensity: {mood_intensity})")
-        
-        # Get personalized recommendations
-        recommendations = self.content_lib.get_therapeutic_recommendations(current_emotion)
-        
-        # Create therapy session record
-        conn = get_db_connection()
-        create_therapy_session(conn, user_id, current_emotion)
-        conn.close()
-
-        # Structure the response
-        therapy_plan = {
+        emotion = current_emotion.lower() if isinstance(current_emotion, str) else ''
+        mood_intensity = normalize_intensity(mood_intensity)
+        template = plan_templates.get(emotion, mood_intensity)
+        avoid = recent_items.get(user_id)
+        content_ranker.ensure_loaded()
+
+        immediate_relief = self._get_immediate_relief(user_id, template, avoid)
+        daily_practices = self._get_daily_practices(user_id, template, avoid)
+        recent_items.add(user_id, [item['id'] for item in immediate_relief + daily_practices])
+
+        # One open session per recommended item, so any of them can be completed and rated later;
+        # logged by the background writer, not inside the request
+        for item in immediate_relief:
+            therapy_session_log.record(user_id, emotion, item['id'], 'immediate_relief')
+        for item in daily_practices:
+            therapy_session_log.record(user_id, emotion, item['id'], 'daily_boost')
+        if not immediate_relief and not daily_practices:
+            therapy_session_log.record(user_id, emotion)
+
+        return {
             'emotion_detected': current_emotion,
             'intensity_level': mood_intensity,
             'generated_at': datetime.now().isoformat(),
-            'immediate_relief': self._get_immediate_relief(recommendations),
-            'daily_practices': self._get_daily_practices(recommendations),
-            'lifestyle_recommendations': recommendations.get('lifestyle', []),
-            'therapeutic_insight': self._get_therapeutic_insight(current_emotion)
+            'immediate_relief': immediate_relief,
+            'daily_practices': daily_practices,
+            'lifestyle_recommendations': [dict(row) for row in _pick(template.lifestyle_pool, 3, ())],
+            'therapeutic_insight': dict(template.insight)
         }
-        
-        return therapy_plan
 
-    def _get_immediate_relief(self, recommendations):
-        """Get immediate relief interventions (5-15 min)"""
+    def _rank(self, user_id, pool, count, avoid):
+        """Best count items of a pool for this user by the effectiveness bandit (one vector pass)"""
+        rows, ids = pool
+        return [rows[index] for index in content_ranker.top(user_id, ids, count, avoid)]
+
+    def _get_immediate_relief(self, user_id, template, avoid=()):
+        """Get immediate relief interventions (short, by content type priority)"""
         immediate = []
-        
-        # Prioritize short, effective content
-        for content_type in ['exercise', 'video', 'music']:
-            if content_type in recommendations:
-                for item in recommendations[content_type]:
-                    if item.get('duration_minutes', 30) <= 15:  # Short interventions
-                        if item.get('content_category') == 'immediate_relief':
-                            immediate.append(item)
-        
-        # If no immediate relief found, use shortest available
-        if not immediate and 'exercise' in recommendations:
-            immediate = recommendations['exercise'][:1]
-            
-        return immediate[:2]  # Max 2 immediate interventions
-
-    def _get_daily_practices(self, recommendations):
+        for pool in template.relief_pools:
+            immediate.extend(self._rank(user_id, pool, 2 - len(immediate), avoid))
+
+        # If no immediate relief found, use any exercise
+        if not immediate:
+            immediate = self._rank(user_id, template.fallback_pool, 1, avoid)
+
+        return [dict(row) for row in immediate]  # Max 2 immediate interventions
+
+    def _get_daily_practices(self, user_id, template, avoid=()):
         """Get daily practice recommendations"""
         daily = []
-        for content_type in ['music', 'exercise']:
-            if content_type in recommendations:
-                for item in recommendations[content_type]:
-                    if item.get('content_category') == 'daily_practice':
-                        daily.append(item)
-        return daily[:3]  # Max 3 daily practices
-
-    def _get_therapeutic_insight(self, emotion):
-        """Provide psychological insight about the emotion"""
-        insights = {
-            'sadness': {
-                'title': 'Understanding Sadness',
-                'message': 'Sadness often signals that something matters to us deeply. It can be a catalyst for meaningful change and self-reflection.',
-                'action': 'Allow yourself to feel this fully, then gently engage in comforting activities.'
-            },
-            'anxiety': {
-                'title': 'Working with Anxiety',
-                'message': 'Anxiety is your body\'s way of saying "I care about what happens next." It becomes problematic when it runs without brakes.',
-                'action': 'Ground yourself in the present moment through breathing and sensory awareness.'
-            },
-            'anger': {
-                'title': 'Transforming Anger',
-                'message': 'Anger often points to violated boundaries or unmet needs. It carries tremendous energy for change.',
-                'action': 'Channel this energy constructively through physical movement or clear communication.'
-            },
-            'joy': {
-                'title': 'Amplifying Joy',
-                'message': 'Joy connects us to what truly matters. These moments are precious resources for resilience.',
-                'action': 'Savor this feeling and consider sharing it with others to multiply its impact.'
-            },
-            'neutral': {
-                'title': 'Embracing Neutrality',
-                'message': 'Neutral states provide the foundation from which all other emotions emerge. They offer valuable rest and integration time.',
-                'action': 'Use this space for reflection and gentle exploration of what you truly need.'
-            }
-        }
-        
-        return insights.get(emotion.lower(), insights['neutral'])
+        for pool in template.daily_pools:
+            daily.extend(self._rank(user_id, pool, 3 - len(daily), avoid))
+        return [dict(row) for row in daily]  # Max 3 daily practices
 
     def close(self):
-        """Close resources"""
-        self.content_lib.close()
\ No newline at end of file
+        """Nothing to release: sessions go through the shared background writer"""
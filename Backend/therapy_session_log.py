@@ -0,0 +1,112 @@
+# therapy_session_log.py - Asynchronous batched writer for user_therapy_sessions rows
+import atexit
+import threading
+from datetime import datetime, timezone
+from database import get_db_connection
+
+FLUSH_INTERVAL = 2.0      # Seconds between background flushes
+MAX_PENDING = 2000        # Rows buffered before an early flush is triggered
+OPEN_SESSION_TTL_DAYS = 7  # Sessions never completed within this are abandoned
+
+
+class TherapySessionLog:
+    """Queues therapy session rows from request handlers and inserts them in batches"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self.stats = {'queued': 0, 'rows_written': 0, 'flushes': 0}
+
+    def record(self, user_id, emotion_detected, content_id=None, session_type='immediate_relief'):
+        """Queue one session row; started_at is taken now, not when the batch is written"""
+        started_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')    # Same format as CURRENT_TIMESTAMP
+        with self._lock:
+            self._pending.append((user_id, emotion_detected, content_id, session_type, started_at))
+            self.stats['queued'] += 1
+            backlog = len(self._pending)
+        self._ensure_thread()
+        if backlog >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self):
+        """Insert every queued row in one transaction; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            conn = get_db_connection()
+            try:
+                with conn:
+                    conn.executemany('''
+                        INSERT INTO user_therapy_sessions
+                        (user_id, emotion_detected, content_id, session_type, started_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', batch)
+            except Exception as e:
+                print(f"❌ Therapy session flush failed, keeping {len(batch)} rows: {e}")
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            finally:
+                conn.close()
+
+            self.stats['rows_written'] += len(batch)
+            self.stats['flushes'] += 1
+            return len(batch)
+
+    def _ensure_thread(self):
+        """Start the flusher on first use, and flush once more at interpreter exit"""
+        if self._thread is not None or self._stopped:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._worker, name='therapy-session-flusher', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _worker(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Therapy session flusher error: {e}")
+
+    def stop(self):
+        """Stop the flusher and write anything still queued"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval)
+        written = self.flush()
+        if written:
+            print(f"💾 Flushed {written} queued therapy sessions at shutdown")
+
+
+def purge_stale_sessions(max_age_days=OPEN_SESSION_TTL_DAYS):
+    """Delete sessions left open past max_age_days (nightly job); they never get an outcome"""
+    conn = get_db_connection()
+    try:
+        with conn:
+            deleted = conn.execute('''
+                DELETE FROM user_therapy_sessions
+                WHERE completed = 0 AND started_at < datetime('now', ?)
+            ''', (f'-{int(max_age_days)} days',)).rowcount
+    finally:
+        conn.close()
+    print(f"🧹 Purged {deleted} abandoned therapy sessions")
+    return deleted
+
+
+# Shared by the therapy routes
+therapy_session_log = TherapySessionLog()
@@ -1,83 +1,109 @@
 # youtube_integration.py - YouTube API integration for content
 import os
-import requests
-from datetime import datetime
+import re
+from api_client import ApiClient, ResponseCache, normalize_query
+from catalog import content_catalog
+
+YOUTUBE_API_URL = os.getenv('YOUTUBE_API_URL', 'https://www.googleapis.com/youtube/v3')
+VIDEOS_BATCH = 50                 # videos.list accepts at most 50 ids per call
+SEARCH_TTL = 6 * 60 * 60          # Search results go stale as new videos are published
+METADATA_TTL = 7 * 24 * 60 * 60   # A video's duration never changes
+OFFLINE_CATALOG = os.getenv('OFFLINE_CATALOG', '0') == '1'    # Serve searches from the local catalog only
+
+# ISO 8601 duration as returned by contentDetails, e.g. PT1H30M15S or P1DT2H
+DURATION_PATTERN = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+search_cache = ResponseCache('youtube:search', SEARCH_TTL)
+duration_cache = ResponseCache('youtube:duration', METADATA_TTL)
+
 
 class YouTubeIntegration:
     def __init__(self):
         self.api_key = os.getenv('YOUTUBE_API_KEY', 'YOUR_YOUTUBE_API_KEY')
-        self.base_url = "https://www.googleapis.com/youtube/v3"
-    
-    def search_videos(self, query, max_results=5):
-        """Search YouTube videos by query"""
+        self.base_url = YOUTUBE_API_URL
+        self.client = ApiClient('youtube')
+
+    def search_videos(self, query, max_results=5, with_durations=False, strict=False):
+        """Search YouTube videos by query (cached per normalized query; strict=True raises on errors)"""
+        if OFFLINE_CATALOG:
+            # Catalog videos already carry duration_minutes
+            return content_catalog.search_videos(query, max_results)
         try:
-            url = f"{self.base_url}/search"
-            params = {
-                'part': 'snippet',
-                'q': query,
-                'type': 'video',
-                'maxResults': max_results,
-                'key': self.api_key
-            }
-            
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            videos = []
-            for item in data.get('items', []):
-                video = {
-                    'video_id': item['id']['videoId'],
-                    'title': item['snippet']['title'],
-                    'description': item['snippet']['description'],
-                    'thumbnail': item['snippet']['thumbnails']['default']['url'],
-                    'url': f"https://www.youtube.com/watch?v={item['id']['videoId']}",
-                    'channel': item['snippet']['channelTitle'],
-                    'published_at': item['snippet']['publishedAt']
-                }
-                videos.append(video)
-            
+            cache_key = f"{normalize_query(query)}|{max_results}"
+            videos = search_cache.get(cache_key)
+            if videos is None:
+                response = self.client.get(f"{self.base_url}/search", params={
+                    'part': 'snippet',
+                    'q': query,
+                    'type': 'video',
+                    'maxResults': max_results,
+                    'key': self.api_key
+                })
+                data = response.json()
+
+                videos = []
+                for item in data.get('items', []):
+                    video = {
+                        'video_id': item['id']['videoId'],
+                        'title': item['snippet']['title'],
+                        'description': item['snippet']['description'],
+                        'thumbnail': item['snippet']['thumbnails']['default']['url'],
+                        'url': f"https://www.youtube.com/watch?v={item['id']['videoId']}",
+                        'channel': item['snippet']['channelTitle'],
+                        'published_at': item['snippet']['publishedAt']
+                    }
+                    videos.append(video)
+                search_cache.set(cache_key, videos)
+
+            if with_durations:
+                # One batched videos.list call instead of one per result
+                videos = [dict(video) for video in videos]
+                durations = self.get_video_durations([video['video_id'] for video in videos])
+                for video in videos:
+                    video['duration_minutes'] = durations.get(video['video_id'], 0)
+
             return videos
         except Exception as e:
+            if strict:
+                raise
             print(f"YouTube API Error: {e}")
-            return []
-    
+            return content_catalog.search_videos(query, max_results)
+
+    def get_video_durations(self, video_ids):
+        """Durations in minutes for many videos, fetched 50 ids per call and cached"""
+        video_ids = list(dict.fromkeys(video_ids))
+        durations = duration_cache.get_many(video_ids)
+        missing = [video_id for video_id in video_ids if video_id not in durations]
+
+        fetched = {}
+        for start in range(0, len(missing), VIDEOS_BATCH):
+            batch = missing[start:start + VIDEOS_BATCH]
+            response = self.client.get(f"{self.base_url}/videos", params={
+                'part': 'contentDetails',
+                'id': ','.join(batch),
+                'key': self.api_key
+            })
+            for item in response.json().get('items', []):
+                fetched[item['id']] = self.parse_duration(item['contentDetails']['duration'])
+
+        duration_cache.set_many(fetched)
+        durations.update(fetched)
+        return durations
+
     def get_video_duration(self, video_id):
         """Get video duration"""
         try:
-            url = f"{self.base_url}/videos"
-            params = {
-                'part': 'contentDetails',
-                'id': video_id,
-                'key': self.api_key
-            }
-            
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            if data.get('items'):
-                duration_str = data['items'][0]['contentDetails']['duration']
-                return self.parse_duration(duration_str)
-            
-            return 0
+            return self.get_video_durations([video_id]).get(video_id, 0)
         except Exception as e:
             print(f"Duration fetch error: {e}")
             return 0
-    
+
     def parse_duration(self, duration_str):
         """Parse YouTube duration format (PT1H30M15S) to minutes"""
-        import re
-        hours = minutes = seconds = 0
-        
-        hour_match = re.search(r'(\d+)H', duration_str)
-        minute_match = re.search(r'(\d+)M', duration_str)
-        second_match = re.search(r'(\d+)S', duration_str)
-        
-        if hour_match:
-            hours = int(hour_match.group(1))
-        if minute_match:
-            minutes = int(minute_match.group(1))
-        if second_match:
-            seconds = int(second_match.group(1))
-        
-        total_minutes = hours * 60 + minutes + (1 if seconds > 30 else 0)
-        return total_minutes
\ No newline at end of file
+        match = DURATION_PATTERN.match(duration_str or '')
+        if not match:
+            return 0
+        days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+
+        total_minutes = days * 24 * 60 + hours * 60 + minutes + (1 if seconds > 30 else 0)
+        return total_minutes
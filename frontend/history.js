@@ -1,9 +1,61 @@
 // history.js - Load and display user's analysis history
 
+const HISTORY_PAGE_SIZE = 20;
+let loadedEntries = [];     // Every page fetched so far, latest first
+let nextCursor = null;      // Keyset cursor for the next (older) page
+let totalCount = 0;
+let moodChart = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     loadUserHistory();
 });
 
+async function fetchEntriesPage(cursor) {
+    const params = new URLSearchParams({ limit: HISTORY_PAGE_SIZE });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`/api/get_entries?${params}`);
+    return response.json();
+}
+
+function showHistoryPage(data) {
+    loadedEntries = loadedEntries.concat(data.entries);
+    nextCursor = data.next_cursor;
+    totalCount = data.total_count;
+
+    document.getElementById('historyInfo').textContent = `Showing latest ${loadedEntries.length} of ${totalCount} records`;
+    document.getElementById('loadMoreBtn').classList.toggle('hidden', !data.has_more);
+    displayHistoryTable(loadedEntries);
+}
+
+// ✅ Mood timeline: server-side buckets, downsampled to a fixed number of points
+async function loadMoodTimeline() {
+    try {
+        const response = await fetch('/api/mood_timeseries?points=120');
+        const data = await response.json();
+        if (!data.success) throw new Error(data.message || 'Could not fetch mood timeline');
+        createMoodChart(data.points, data.bucket);
+    } catch (error) {
+        console.error('Error loading mood timeline:', error);
+        document.getElementById('chartsSection').classList.add('hidden');
+    }
+}
+
+// ✅ Load the next (older) page of entries
+async function loadMoreEntries() {
+    const button = document.getElementById('loadMoreBtn');
+    button.disabled = true;
+    try {
+        const data = await fetchEntriesPage(nextCursor);
+        if (!data.success) throw new Error(data.message || 'Could not fetch history');
+        showHistoryPage(data);
+    } catch (error) {
+        console.error('Error loading more history:', error);
+        alert('Could not load older entries. Please try again.');
+    } finally {
+        button.disabled = false;
+    }
+}
+
 async function loadUserHistory() {
     // Show loading spinner, hide error and table
     document.getElementById('historyLoading').classList.remove('hidden');
@@ -13,8 +65,7 @@ async function loadUserHistory() {
     document.getElementById('historyInfo').classList.add('hidden');
 
     try {
-        const response = await fetch('/api/get_entries'); // ✅ This gets LATEST 5 only
-        const data = await response.json();
+        const data = await fetchEntriesPage(null); // ✅ First page; older pages load on demand
 
         if (data.success) {
             if (data.entries && data.entries.length > 0) {
@@ -23,19 +74,13 @@ async function loadUserHistory() {
                 downloadBtn.disabled = false;
                 downloadBtn.textContent = `📥 Download Full History (${data.total_count} records)`;
                 
-                // ✅ SHOW RECORD COUNT INFO
-                const infoText = `Showing latest ${data.entries.length} of ${data.total_count} records`;
-                document.getElementById('historyInfo').textContent = infoText;
+                // ✅ SHOW RECORD COUNT INFO, TABLE AND MOOD CHART
+                loadedEntries = [];
+                showHistoryPage(data);
                 document.getElementById('historyInfo').classList.remove('hidden');
-                
-                // Display the data in the table
-                displayHistoryTable(data.entries);
-                // Show the table container
                 document.getElementById('historyTableContainer').classList.remove('hidden');
-                
-                // Create the mood chart
-                createMoodChart(data.entries);
                 document.getElementById('chartsSection').classList.remove('hidden');
+                loadMoodTimeline();
             } else {
                 // No entries found
                 document.getElementById('historyError').textContent = 'No journal entries found. Start by analyzing your mood!';
@@ -107,22 +152,23 @@ function displayHistoryTable(entries) {
     });
 }
 // ✅ Function to create the mood timeline chart
-function createMoodChart(entries) {
+function createMoodChart(points, bucket) {
     const ctx = document.getElementById('moodTimelineChart').getContext('2d');
     
-    // Prepare data for the chart
-    const sortedEntries = entries.sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
-    
-    const dates = sortedEntries.map(entry => {
-        const date = new Date(entry.timestamp);
-        return date.toLocaleDateString(); // Format as MM/DD/YYYY
+    // Prepare data for the chart (points arrive oldest first, one per day/week/month bucket)
+    const dates = points.map(point => {
+        const date = new Date(`${point.bucket}T00:00:00`); // Bucket start, local midnight
+        if (bucket === 'month') return date.toLocaleDateString(undefined, { month: 'short', year: 'numeric' });
+        return bucket === 'week' ? `Week of ${date.toLocaleDateString()}` : date.toLocaleDateString();
     });
     
-    const moodScores = sortedEntries.map(entry => entry.mood_score || 50);
-    const emotions = sortedEntries.map(entry => entry.final_emotion || 'Unknown');
+    const moodScores = points.map(point => point.mood ?? 50);
+    const emotions = points.map(point => point.dominant_emotion || 'Unknown');
+    const entryCounts = points.map(point => point.entries);
     
-    // Create the chart
-    const moodChart = new Chart(ctx, {
+    // Create the chart (replacing any previous one)
+    if (moodChart) moodChart.destroy();
+    moodChart = new Chart(ctx, {
         type: 'line',
         data: {
             labels: dates,
@@ -142,7 +188,7 @@ function createMoodChart(entries) {
                     return colors[emotion.toLowerCase()] || colors['default'];
                 }),
                 pointBorderColor: '#ffffff',
-                pointRadius: 6,
+                pointRadius: points.length > 60 ? 3 : 6,
                 pointHoverRadius: 8,
                 fill: true,
                 tension: 0.3 // Smooth lines
@@ -186,7 +232,8 @@ function createMoodChart(entries) {
                     callbacks: {
                         label: function(context) {
                             const index = context.dataIndex;
-                            return `Mood: ${moodScores[index]} (${emotions[index]})`;
+                            const entries = entryCounts[index] === 1 ? '1 entry' : `${entryCounts[index]} entries`;
+                            return `Mood: ${moodScores[index]} (${emotions[index]}, ${entries})`;
                         }
                     }
                 }
@@ -196,42 +243,20 @@ function createMoodChart(entries) {
     });
 }
 // ✅ CSV Download Function (GETS ALL RECORDS)
-async function downloadCSV() {
-    try {
-        // ✅ USE all=true PARAMETER TO GET ALL RECORDS
-        const response = await fetch('/api/get_entries?all=true');
-        const data = await response.json();
-        
-        if (data.success && data.entries.length > 0) {
-            // Create CSV content
-            let csvContent = "Date,Journal Text,Final Emotion,Text Confidence,Audio Confidence,Mood Score,Audio File\n";
-            
-            data.entries.forEach(entry => {
-                const date = new Date(entry.timestamp).toLocaleString();
-                const journal = entry.journal_text ? `"${entry.journal_text.replace(/"/g, '""')}"` : '';
-                const textConf = entry.text_confidence ? (entry.text_confidence * 100) + '%' : '';
-                const audioConf = entry.audio_confidence ? (entry.audio_confidence * 100) + '%' : '';
-                
-                csvContent += `${date},${journal},${entry.final_emotion || ''},${textConf},${audioConf},${entry.mood_score || ''},${entry.audio_file_path || ''}\n`;
-            });
-            
-            // Create download link
-            const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-            const url = URL.createObjectURL(blob);
-            const link = document.createElement('a');
-            link.href = url;
-            link.setAttribute('download', `mindmirror_full_history_${new Date().toISOString().split('T')[0]}.csv`);
-            document.body.appendChild(link);
-            link.click();
-            document.body.removeChild(link);
-        } else {
-            alert('No records available to download.');
-        }
-    } catch (error) {
-        console.error('Error downloading CSV:', error);
-        alert('Could not download history. Please try again.');
+function downloadCSV() {
+    if (!totalCount) {
+        alert('No records available to download.');
+        return;
     }
+    // The server streams the file, so the browser saves it as it arrives instead of building it in memory
+    const link = document.createElement('a');
+    link.href = '/api/export_entries?format=csv';
+    link.setAttribute('download', `mindmirror_full_history_${new Date().toISOString().split('T')[0]}.csv`);
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
 }
 
 // ✅ Add event listener to download button
-document.getElementById('downloadCsvBtn').addEventListener('click', downloadCSV);
\ No newline at end of file
+document.getElementById('downloadCsvBtn').addEventListener('click', downloadCSV);
+document.getElementById('loadMoreBtn').addEventListener('click', loadMoreEntries);
\ No newline at end of file